@@ -12,18 +12,29 @@ from celery import Celery
 db = SQLAlchemy()
 migrate = Migrate()
 mail = Mail()
-celery = Celery(__name__, broker=Config.CELERY_BROKER_URL)
+celery = Celery(__name__, broker=Config.CELERY_BROKER_URL, backend=getattr(Config, 'CELERY_RESULT_BACKEND', None))
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
     app.config.from_object(config_class)
 
+    from app.utils.database import configure_engine_options, init_sqlite_profile
+    configure_engine_options(app)
     db.init_app(app)
+    with app.app_context():
+        init_sqlite_profile(app, db.engine)
     migrate.init_app(app, db)
     mail.init_app(app)
 
     celery.conf.update(app.config)
+    if app.config.get('GATHER_INTERVAL', 900):
+        celery.conf.update(CELERYBEAT_SCHEDULE={
+            'incremental-gather': {
+                'task': 'app.tasks.incremental_gather_task',
+                'schedule': app.config.get('GATHER_INTERVAL', 900)
+            }
+        })
 
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
@@ -35,7 +46,16 @@ def create_app(config_class=Config):
     from app.api import api as api_blueprint
     app.register_blueprint(api_blueprint, url_prefix='/api/v1')
 
-    if not app.debug:
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+
+    from app.cli import create_tables, rebuild_search_index_command, rebuild_similarity_index_command, rebuild_user_stats_command
+    app.cli.add_command(create_tables)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rebuild_user_stats_command)
+    app.cli.add_command(rebuild_similarity_index_command)
+
+    if not app.debug and not app.testing:
         if not os.path.exists('logs'):
             os.mkdir('logs')
         file_handler = RotatingFileHandler('logs/codebase.log', maxBytes=10240, backupCount=10)
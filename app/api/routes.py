@@ -1,23 +1,43 @@
 from datetime import datetime
 from functools import wraps
+import json
 import celery
-from flask import current_app, jsonify, request, url_for
-from app import db, mail
+from flask import Response, current_app, jsonify, request, stream_with_context, url_for
+from app import celery as celery_app, db
 from app.models.code_snippet import CodeSnippet
 from app.models.documentation import Documentation, Project, Correction
 from app.models.user import User
 from app.models.api_key import APIKey
+from app.models.gather import GatherSubscription, GatherWatermark
+from app.models.upload import ArchiveUpload
 from app.api import api
-from app.services.github_service import gather_data_from_github
-from app.services.stackoverflow_service import gather_data_from_stackoverflow
-from app.services.ai_service import fetch_repository_content, generate_documentation
-from app.services.auth_service import create_user, generate_tokens, verify_token, verify_user
-from app.tasks import generate_documentation_task
+from app.services.gather_service import gather_all
+from app.services.archive_service import InvalidArchive, get_archive_progress, queue_archive_documentation, store_archive
+from app.services.ai_service import build_documentation_prompt, is_error_documentation, stream_documentation_from_prompt
+from app.services.email_service import send_verification_email
+from app.services.password_service import PasswordHashingBusy
+from app.services.rate_limit_service import get_limiter_stats
+from app.services.stats_service import get_user_stats
+from app.services.documentation_service import (
+    DocumentationUnavailable, document_snippet, document_submission, save_snippet_documentation, save_submission,
+    snippet_documentation_data, submission_documentation_data
+)
+from app.services.auth_service import authenticate_api_key, authenticate_user, create_user, generate_tokens, revoke_api_key, verify_token, verify_user
+from app.services.snippet_service import store_gathered_snippets
+from app.services.transfer_service import InvalidImport, export_user_data, import_user_data, iter_ndjson
+from app.services.search_service import build_fts_query, fts_match_clause, is_fts_available, search_snippets
+from app.services.similarity_service import is_similarity_available, similar_snippets
+from app.tasks import generate_documentation_batch_task, generate_snippet_documentation_task, submit_code_task
 from app.utils.helpers import clean_data, generate_api_key
+from app.utils.http_client import get_http_stats
+from app.utils.pagination import InvalidCursor, get_per_page, is_cursor_request, keyset_paginate, wants_total
+from app.utils.serialization import InvalidFields, json_response, parse_fields
 from config.config import Config
-from flask_mail import Message
+from flask_sqlalchemy import Pagination
 from sqlalchemy.exc import OperationalError
+import random
 import time
+import uuid
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
@@ -29,10 +49,7 @@ def require_api_key(view_function):
         provided_key = request.headers.get('X-API-Key')
         if not provided_key:
             return jsonify({"error": "API Key is missing"}), 401
-        api_key = APIKey.query.filter_by(key=provided_key).first()
-        if api_key:
-            api_key.last_used = datetime.utcnow()
-            db.session.commit()
+        if authenticate_api_key(provided_key):
             return view_function(*args, **kwargs)
         else:
             return jsonify({"error": "Invalid API Key"}), 403
@@ -52,24 +69,27 @@ def require_auth(view_function):
         return view_function(user_id, *args, **kwargs)
     return decorated_function
 
+def password_hashing_busy(error):
+    current_app.logger.warning(f"Password hashing overloaded: {str(error)}")
+    response = jsonify({'message': 'The server is busy, please try again shortly.'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def documentation_unavailable(error):
+    current_app.logger.warning(f"Documentation generation failed: {str(error)}")
+    return jsonify({"error": str(error)}), 503
+
 @api.route('/signup', methods=['POST'])
 @limiter.limit("5 per minute")
 def signup():
     data = request.json
     try:
         user = create_user(data['name'], data['email'], data['password'])
-        
-        msg = Message('Verify Your Email',
-                      sender='noreply@codebase.com',
-                      recipients=[user.email])
-        msg.body = f'''To verify your email, please click on the following link:
-    {url_for('api.verify', user_id=user.id, _external=True)}
-
-    If you did not make this request then simply ignore this email and no changes will be made.
-    '''
-        mail.send(msg)
+        send_verification_email(user)
         
         return jsonify({'message': 'User created. Please check your email for verification.'}), 201
+    except PasswordHashingBusy as e:
+        return password_hashing_busy(e)
     except Exception as e:
         current_app.logger.error(f"Error in signup: {str(e)}")
         return jsonify({'message': 'An error occurred during signup.'}), 500
@@ -84,8 +104,11 @@ def verify(user_id):
 @limiter.limit("10 per minute")
 def login():
     data = request.json
-    user = User.query.filter_by(email=data['email']).first()
-    if user and user.check_password(data['password']):
+    try:
+        user = authenticate_user(data['email'], data['password'])
+    except PasswordHashingBusy as e:
+        return password_hashing_busy(e)
+    if user:
         if not user.is_verified:
             return jsonify({'message': 'Please verify your email first.'}), 401
         access_token, refresh_token = generate_tokens(user.id)
@@ -119,22 +142,57 @@ def generate_api_key_route(user_id):
         current_app.logger.error(f"Error generating API key: {str(e)}")
         return jsonify({"error": "An error occurred while generating the API key"}), 500
 
+@api.route('/api-keys/<int:key_id>', methods=['DELETE'])
+@require_auth
+def revoke_api_key_route(user_id, key_id):
+    try:
+        if not revoke_api_key(user_id, key_id):
+            return jsonify({"error": "API key not found"}), 404
+        return jsonify({"message": "API key revoked."}), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error revoking API key: {str(e)}")
+        return jsonify({"error": "An error occurred while revoking the API key"}), 500
+
 def retry_on_db_lock(func):
+    # SQLite already waits up to SQLITE_BUSY_TIMEOUT for the lock, so this is a last resort
     @wraps(func)
     def wrapper(*args, **kwargs):
         max_retries = 3
-        retry_delay = 1  # seconds
         for attempt in range(max_retries):
             try:
                 return func(*args, **kwargs)
             except OperationalError as e:
                 if "database is locked" in str(e) and attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+                    db.session.rollback()
+                    time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
                     continue
                 raise
     return wrapper
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
+
+def snippet_fields():
+    return parse_fields(request.args, CodeSnippet.FIELDS, CodeSnippet.SUMMARY_FIELDS)
+
+def project_snippets(query, fields):
+    # `code` is deferred; load it with the page instead of one query per row
+    if 'code' in fields:
+        query = query.options(undefer(CodeSnippet.code))
+    return query
+
+def snippet_cursor_page(query, per_page, fields):
+    snippets, next_cursor, total = keyset_paginate(
+        project_snippets(query, fields), CodeSnippet, request.args.get('cursor'), per_page,
+        include_total=wants_total(request.args)
+    )
+    page = {
+        'items': [snippet.to_dict(fields) for snippet in snippets],
+        'next_cursor': next_cursor
+    }
+    if total is not None:
+        page['total'] = total
+    return page
 
 @api.route('/gather', methods=['POST'])
 @require_auth
@@ -142,65 +200,61 @@ from sqlalchemy.orm import Session
 @limiter.limit("5 per hour")
 def api_gather_data(user_id):
     try:
-        github_data = gather_data_from_github(Config.GITHUB_API_URL)
-        stackoverflow_data = gather_data_from_stackoverflow(Config.STACKOVERFLOW_API_URL)
-        
-        combined_data = github_data + stackoverflow_data
+        combined_data = gather_all()
         cleaned_data = clean_data(combined_data)
         
-        new_snippetList = []
-        with Session(db.engine) as session:
-            for item in cleaned_data:
-                existing_snippet = session.query(CodeSnippet).filter_by(url=item['url']).first()
-                if not existing_snippet:
-                    is_repo = 'github.com' in item.get('url', '')
-                    snippet = CodeSnippet(
-                        user_id=user_id,
-                        url=item.get('url', ''),
-                        name_or_title=item.get('name_or_title', 'Untitled'),
-                        language=item.get('language', 'Unknown'),
-                        code=item['url'] if is_repo else item.get('code', ''),
-                        stars=item.get('stars', 0),
-                        source=item.get('source', 'Unknown'),
-                        is_user_submitted=False,
-                        has_documentation=False,
-                        is_repo=is_repo
-                    )
-                    new_snippetList.append(snippet)
-            
-            if new_snippetList:
-                session.bulk_save_objects(new_snippetList)
-                session.commit()
+        stored = store_gathered_snippets(user_id, cleaned_data)
         
-        current_app.logger.info(f"Successfully gathered and stored {len(new_snippetList)} new code snippets for user {user_id}")
-        return jsonify({"message": f"Successfully gathered {len(new_snippetList)} new items", "count": len(new_snippetList)}), 200
+        current_app.logger.info(f"Successfully gathered and stored {stored} new code snippets for user {user_id}")
+        return jsonify({"message": f"Successfully gathered {stored} new items", "count": stored}), 200
     except Exception as e:
         current_app.logger.error(f"Error in api_gather_data: {str(e)}")
         return jsonify({"error": "An error occurred while gathering data"}), 500    
     
+@api.route('/gather/subscription', methods=['GET', 'PUT', 'DELETE'])
+@require_auth
+def gather_subscription(user_id):
+    subscription = GatherSubscription.query.get(user_id)
+    if request.method == 'PUT' and subscription is None:
+        subscription = GatherSubscription(user_id=user_id)
+        db.session.add(subscription)
+        db.session.commit()
+    elif request.method == 'DELETE' and subscription is not None:
+        db.session.delete(subscription)
+        db.session.commit()
+        subscription = None
+    return jsonify({
+        "subscribed": subscription is not None,
+        "watermarks": {row.source: row.watermark for row in GatherWatermark.query}
+    }), 200
+
 @api.route('/data', methods=['GET'])
 @require_auth
 def api_get_data(user_id):
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        snippets = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=False).paginate(page=page, per_page=per_page, error_out=False)
+        per_page = get_per_page(request.args)
+        fields = snippet_fields()
+        snippet_query = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=False)
+        if is_cursor_request(request.args):
+            return json_response({'snippets': snippet_cursor_page(snippet_query, per_page, fields)})
+
+        snippets = project_snippets(snippet_query, fields).paginate(page=page, per_page=per_page, error_out=False)
         
-        snippet_data = [{
-            **snippet.to_dict(),
-            'has_documentation': snippet.has_documentation
-        } for snippet in snippets.items]
+        snippet_data = [snippet.to_dict(fields) for snippet in snippets.items]
         
         current_app.logger.info(f"Retrieved {snippets.total} gathered code snippets for user {user_id}")
         
-        return jsonify({
+        return json_response({
             'snippets': {
                 'items': snippet_data,
                 'total': snippets.total,
                 'pages': snippets.pages,
                 'page': page
             }
-        }), 200
+        })
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error in api_get_data: {str(e)}")
         return jsonify({"error": "An error occurred while retrieving data"}), 500
@@ -211,16 +265,19 @@ def api_get_data(user_id):
 def api_generate_docs():
     try:
         limit = request.args.get('limit', default=5, type=int)
-        snippetList = CodeSnippet.query.filter(CodeSnippet.documentation.is_(None)).limit(limit).all()
+        batch_size = current_app.config.get('DOC_BATCH_SIZE', 20)
+        snippet_ids = [id for (id,) in db.session.query(CodeSnippet.id).filter(
+            CodeSnippet.has_documentation.isnot(True)
+        ).order_by(CodeSnippet.id).limit(limit)]
         
         task_ids = []
-        for snippet in snippetList:
-            task = generate_documentation_task.delay(snippet.id)
+        for start in range(0, len(snippet_ids), batch_size):
+            task = generate_documentation_batch_task.delay(snippet_ids[start:start + batch_size])
             task_ids.append(task.id)
         
-        current_app.logger.info(f"Started documentation generation for {len(snippetList)} code snippetList")
+        current_app.logger.info(f"Started documentation generation for {len(snippet_ids)} code snippets in {len(task_ids)} batches")
         return jsonify({
-            "message": f"Documentation generation started for {len(snippetList)} snippetList",
+            "message": f"Documentation generation started for {len(snippet_ids)} snippets",
             "task_ids": task_ids
         }), 202
     except Exception as e:
@@ -253,11 +310,56 @@ def require_auth(view_function):
 def api_search(user_id):
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        per_page = get_per_page(request.args)
         query = request.args.get('q', '')
         source = request.args.get('source', '')
         language = request.args.get('language', '')
         min_stars = request.args.get('min_stars', type=int)
+        use_fts = bool(query) and is_fts_available() and bool(build_fts_query(query))
+        fields = snippet_fields()
+
+        if request.args.get('mode') == 'similar':
+            snippet_id = request.args.get('snippet_id', type=int)
+            if not is_similarity_available():
+                return jsonify({"error": "Similarity search is not available on this server"}), 400
+            if not query and snippet_id is None:
+                return jsonify({"error": "Pass q= or snippet_id= to find similar snippets"}), 400
+            try:
+                items, total = similar_snippets(user_id, text=query, snippet_id=snippet_id, source=source,
+                                                language=language, min_stars=min_stars, page=page,
+                                                per_page=per_page, fields=fields)
+            except LookupError:
+                return jsonify({"error": "Snippet not found"}), 404
+            return json_response({
+                'items': items,
+                'total': total,
+                'pages': -(-total // per_page) if per_page else 0,
+                'page': page
+            })
+
+        if is_cursor_request(request.args):
+            snippetList = CodeSnippet.query.filter_by(user_id=user_id)
+            if use_fts:
+                snippetList = snippetList.filter(fts_match_clause(user_id, query))
+            else:
+                snippetList = snippetList.filter(CodeSnippet.name_or_title.ilike(f'%{query}%'))
+            if source:
+                snippetList = snippetList.filter_by(source=source)
+            if language:
+                snippetList = snippetList.filter_by(language=language)
+            if min_stars:
+                snippetList = snippetList.filter(CodeSnippet.stars >= min_stars)
+            return json_response(snippet_cursor_page(snippetList, per_page, fields))
+
+        if use_fts:
+            items, total = search_snippets(user_id, query, source=source, language=language,
+                                           min_stars=min_stars, page=page, per_page=per_page, fields=fields)
+            return json_response({
+                'items': items,
+                'total': total,
+                'pages': -(-total // per_page) if per_page else 0,
+                'page': page
+            })
         
         snippetList = CodeSnippet.query.filter_by(user_id=user_id).filter(CodeSnippet.name_or_title.ilike(f'%{query}%'))
         if source:
@@ -267,17 +369,63 @@ def api_search(user_id):
         if min_stars:
             snippetList = snippetList.filter(CodeSnippet.stars >= min_stars)
         
-        paginated_snippetList = snippetList.paginate(page=page, per_page=per_page, error_out=False)
-        return jsonify({
-            'items': [snippet.to_dict() for snippet in paginated_snippetList.items],
+        paginated_snippetList = project_snippets(snippetList, fields).paginate(page=page, per_page=per_page, error_out=False)
+        return json_response({
+            'items': [snippet.to_dict(fields) for snippet in paginated_snippetList.items],
             'total': paginated_snippetList.total,
             'pages': paginated_snippetList.pages,
             'page': page
-        }), 200
+        })
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error in api_search: {str(e)}")
         return jsonify({"error": "An error occurred while searching data"}), 500
 
+def wants_async(data=None):
+    flag = request.args.get('async')
+    if flag is None and data:
+        flag = data.get('async')
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+def new_job_id(user_id):
+    # Job IDs carry their owner so /jobs can check access without a lookup
+    return f"{user_id}-{uuid.uuid4()}"
+
+def job_accepted_response(job_id):
+    return jsonify({
+        'job_id': job_id,
+        'status': 'PENDING',
+        'status_url': url_for('api.get_job', job_id=job_id)
+    }), 202
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_job(user_id, job_id):
+    if not job_id.startswith(f"{user_id}-"):
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        result = celery_app.AsyncResult(job_id)
+        response = {'job_id': job_id, 'status': result.state}
+        if result.successful():
+            response['result'] = result.result
+        elif result.failed():
+            response['error'] = str(result.result)
+        return jsonify(response), 200
+    except Exception as e:
+        current_app.logger.error(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({"error": "An error occurred while fetching the job status"}), 500
+
+@api.route('/gemini/limiter', methods=['GET'])
+@require_api_key
+def gemini_limiter_stats():
+    return jsonify(get_limiter_stats()), 200
+
+@api.route('/upstream/stats', methods=['GET'])
+@require_api_key
+def upstream_http_stats():
+    return jsonify(get_http_stats()), 200
+
 @api.route('/submit', methods=['POST'])
 @require_auth
 @limiter.limit("10 per minute")
@@ -291,46 +439,67 @@ def submit_code(user_id):
         if not project_name:
             return jsonify({'message': 'Project name is required.'}), 400
 
-        if code:
-            documentation = generate_documentation({'code': code})
-            snippet_content = code
-            is_repo = False
-        elif repo_url:
-            repo_content = fetch_repository_content(repo_url)
-            documentation = generate_documentation({'repo_content': repo_content, 'repo_url': repo_url})
-            snippet_content = repo_url
-            is_repo = True
-        else:
+        if not code and not repo_url:
             return jsonify({'message': 'No code or repository URL provided.'}), 400
-        
-        project = Project.query.filter_by(name=project_name, user_id=user_id).first()
-        if not project:
-            project = Project(name=project_name, user_id=user_id)
-            db.session.add(project)
-            db.session.flush()
-        
-        snippet = CodeSnippet(
-            user_id=user_id,
-            project_id=project.id,
-            code=snippet_content,
-            is_repo=is_repo,
-            name_or_title=project_name,
-            is_user_submitted=True,
-            has_documentation=True
-        )
-        db.session.add(snippet)
-        db.session.flush()
-        
-        doc = Documentation(content=documentation, user_id=user_id, project_id=project.id, snippet_id=snippet.id)
-        db.session.add(doc)
-        db.session.commit()
+
+        if wants_async(data):
+            job_id = new_job_id(user_id)
+            submit_code_task.apply_async(args=[user_id, project_name], kwargs={'code': code, 'repo_url': repo_url}, task_id=job_id)
+            return job_accepted_response(job_id)
+
+        doc = document_submission(user_id, project_name, code=code, repo_url=repo_url)
+        documentation = doc.content
         
         return jsonify({'documentation_id': doc.id, 'documentation': documentation}), 200
+    except DocumentationUnavailable as e:
+        return documentation_unavailable(e)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error in submit_code: {str(e)}")
         return jsonify({"error": "An error occurred while processing the submission"}), 500
 
+@api.route('/submit/archive', methods=['POST'])
+@require_auth
+@limiter.limit("10 per hour")
+def submit_archive(user_id):
+    try:
+        # A multipart upload (`file` plus `projectName`), or the raw archive with ?projectName=
+        upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+        project_name = (request.form.get('projectName') or request.args.get('projectName') or '').strip()
+        if not project_name:
+            return jsonify({'message': 'Project name is required.'}), 400
+        if len(project_name) > 100:
+            return jsonify({'message': 'Project name must be at most 100 characters.'}), 400
+        if request.mimetype == 'multipart/form-data' and not upload:
+            return jsonify({'message': 'No archive provided.'}), 400
+
+        upload_id = new_job_id(user_id)
+        if upload:
+            snippet_ids = store_archive(upload_id, user_id, project_name, upload.stream, upload.filename, upload.mimetype)
+        else:
+            snippet_ids = store_archive(upload_id, user_id, project_name, request.stream, mimetype=request.mimetype)
+        batches = queue_archive_documentation(upload_id, snippet_ids)
+        current_app.logger.info(f"Archive upload {upload_id}: {len(snippet_ids)} files in {batches} batches")
+        return jsonify({
+            'upload_id': upload_id,
+            'files': len(snippet_ids),
+            'batches': batches,
+            'status_url': url_for('api.get_archive_upload', upload_id=upload_id)
+        }), 202
+    except InvalidArchive as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in submit_archive: {str(e)}", exc_info=True)
+        return jsonify({"error": "An error occurred while processing the archive"}), 500
+
+@api.route('/submit/archive/<upload_id>', methods=['GET'])
+@require_auth
+def get_archive_upload(user_id, upload_id):
+    upload = ArchiveUpload.query.filter_by(id=upload_id, user_id=user_id).first()
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    return json_response(get_archive_progress(upload))
+
 @api.route('/submit-correction', methods=['POST'])
 @require_auth
 @limiter.limit("20 per hour")
@@ -362,13 +531,24 @@ def get_data():
             {"path": "/login", "method": "POST", "description": "Authenticate and receive access token"},
             {"path": "/refresh", "method": "POST", "description": "Refresh access token"},
             {"path": "/generate_key", "method": "POST", "description": "Generate a new API key"},
+            {"path": "/api-keys/<id>", "method": "DELETE", "description": "Revoke an API key"},
             {"path": "/gather", "method": "POST", "description": "Gather code snippets from various sources"},
             {"path": "/data", "method": "GET", "description": "Retrieve user's code snippets"},
             {"path": "/documentation", "method": "GET", "description": "Generate documentation for code snippets"},
             {"path": "/documentation/<id>", "method": "GET", "description": "Retrieve documentation for a specific snippet"},
-            {"path": "/search", "method": "GET", "description": "Search for code snippets"},
+            {"path": "/search", "method": "GET", "description": "Search for code snippets; mode=similar finds snippets like a given one"},
             {"path": "/submit-code", "method": "POST", "description": "Submit code or repository for documentation"},
-            {"path": "/submit-correction", "method": "POST", "description": "Submit a correction for existing documentation"}
+            {"path": "/submit/archive", "method": "POST", "description": "Submit a zip or tarball of source files for documentation"},
+            {"path": "/submit/archive/<id>", "method": "GET", "description": "Per-file documentation progress of an archive upload"},
+            {"path": "/submit-correction", "method": "POST", "description": "Submit a correction for existing documentation"},
+            {"path": "/submit/stream", "method": "POST", "description": "Submit code or a repository and stream the documentation as Server-Sent Events"},
+            {"path": "/documentation/generate/<id>/stream", "method": "POST", "description": "Generate documentation for a snippet and stream it as Server-Sent Events"},
+            {"path": "/jobs/<id>", "method": "GET", "description": "Retrieve the status and result of a background documentation job"},
+            {"path": "/gather/subscription", "method": "GET, PUT, DELETE", "description": "Subscribe to new items found by the scheduled incremental gather"},
+            {"path": "/export", "method": "GET", "description": "Download the user's snippets and documentation as NDJSON"},
+            {"path": "/import", "method": "POST", "description": "Import snippets and documentation from an NDJSON export"},
+            {"path": "/gemini/limiter", "method": "GET", "description": "Queued, admitted and rejected Gemini call counters"},
+            {"path": "/upstream/stats", "method": "GET", "description": "Per-host outbound HTTP counters and pooled connections"}
         ]
     }
     return jsonify(data), 200
@@ -403,65 +583,163 @@ def generate_documentation_for_snippet(user_id, id):
         if snippet.user_id != user_id:
             return jsonify({"error": "Unauthorized access"}), 403
         
-        if snippet.is_repo:
-            if not snippet.code:
-                return jsonify({"error": "Repository URL is missing"}), 400
-            repo_content = fetch_repository_content(snippet.code)
-            if 'error' in repo_content:
-                return jsonify({"error": repo_content['error']}), 500
-            documentation_content = generate_documentation({'repo_url': snippet.code, 'repo_content': repo_content})
-        else:
-            documentation_content = generate_documentation({
-                'code': snippet.code,
-                'name_or_title': snippet.name_or_title,
-                'language': snippet.language
-            })
-        
-        documentation = Documentation.query.filter_by(snippet_id=id).first()
-        if documentation:
-            documentation.content = documentation_content
-        else:
-            documentation = Documentation(
-                content=documentation_content, 
-                user_id=user_id, 
-                project_id=snippet.project_id, 
-                snippet_id=snippet.id
-            )
-            db.session.add(documentation)
-        
-        snippet.has_documentation = True
-        db.session.commit()
+        if snippet.is_repo and not snippet.code:
+            return jsonify({"error": "Repository URL is missing"}), 400
+
+        if wants_async(request.get_json(silent=True)):
+            job_id = new_job_id(user_id)
+            generate_snippet_documentation_task.apply_async(args=[user_id, snippet.id], task_id=job_id)
+            return job_accepted_response(job_id)
+
+        documentation_content = document_snippet(snippet)
         
         return jsonify({"message": "Documentation generated successfully", "documentation": documentation_content}), 200
+    except DocumentationUnavailable as e:
+        return documentation_unavailable(e)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error generating documentation: {str(e)}", exc_info=True)
         return jsonify({"error": f"An error occurred while generating documentation: {str(e)}"}), 500
 
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_documentation_response(prompt, save):
+    def events():
+        stream = stream_documentation_from_prompt(prompt)
+        try:
+            while True:
+                yield sse_event('chunk', {'text': next(stream)})
+        except StopIteration as finished:
+            documentation = finished.value
+        except Exception as e:
+            current_app.logger.error(f"Error streaming documentation: {str(e)}", exc_info=True)
+            yield sse_event('error', {'error': 'An error occurred while generating documentation'})
+            return
+
+        if is_error_documentation(documentation):
+            yield sse_event('error', {'error': documentation})
+            return
+        try:
+            yield sse_event('done', {**save(documentation), 'documentation': documentation})
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error saving streamed documentation: {str(e)}", exc_info=True)
+            yield sse_event('error', {'error': 'An error occurred while saving the documentation'})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@api.route('/documentation/generate/<int:id>/stream', methods=['GET', 'POST'])
+@require_auth
+def stream_documentation_for_snippet(user_id, id):
+    try:
+        snippet = CodeSnippet.query.get_or_404(id)
+        if snippet.user_id != user_id:
+            return jsonify({"error": "Unauthorized access"}), 403
+        if snippet.is_repo and not snippet.code:
+            return jsonify({"error": "Repository URL is missing"}), 400
+
+        prompt = build_documentation_prompt(snippet_documentation_data(snippet))
+
+        def save(documentation):
+            doc = save_snippet_documentation(snippet, documentation)
+            return {'documentation_id': doc.id, 'snippet_id': snippet.id}
+
+        return stream_documentation_response(prompt, save)
+    except Exception as e:
+        current_app.logger.error(f"Error streaming documentation: {str(e)}", exc_info=True)
+        return jsonify({"error": f"An error occurred while generating documentation: {str(e)}"}), 500
+
+@api.route('/submit/stream', methods=['POST'])
+@require_auth
+@limiter.limit("10 per minute")
+def stream_submit_code(user_id):
+    try:
+        data = request.json
+        code = data.get('code')
+        repo_url = data.get('repoUrl')
+        project_name = data.get('projectName')
+
+        if not project_name:
+            return jsonify({'message': 'Project name is required.'}), 400
+        if not code and not repo_url:
+            return jsonify({'message': 'No code or repository URL provided.'}), 400
+
+        prompt = build_documentation_prompt(submission_documentation_data(code=code, repo_url=repo_url))
+
+        def save(documentation):
+            doc = save_submission(user_id, project_name, documentation, code=code, repo_url=repo_url)
+            return {'documentation_id': doc.id, 'snippet_id': doc.snippet_id}
+
+        return stream_documentation_response(prompt, save)
+    except Exception as e:
+        current_app.logger.error(f"Error in stream_submit_code: {str(e)}")
+        return jsonify({"error": "An error occurred while processing the submission"}), 500
+
+@api.route('/export', methods=['GET'])
+@require_auth
+@limiter.limit("10 per hour")
+def export_data(user_id):
+    def lines():
+        try:
+            yield from export_user_data(user_id)
+        except Exception as e:
+            # Headers are already sent; a truncated body is all the client can be told
+            current_app.logger.error(f"Error exporting data for user {user_id}: {str(e)}", exc_info=True)
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': 'attachment; filename="codebase-export.ndjson"',
+        'X-Accel-Buffering': 'no'
+    })
+
+@api.route('/import', methods=['POST'])
+@require_auth
+@limiter.limit("10 per hour")
+def import_data(user_id):
+    try:
+        # Either a multipart upload named `file` or a raw NDJSON body; both are read line by line
+        upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+        stream = upload.stream if upload else request.stream
+        summary = import_user_data(user_id, iter_ndjson(stream))
+        current_app.logger.info(f"Imported {summary['snippets']} snippets for user {user_id}")
+        return jsonify(summary), 200
+    except InvalidImport as e:
+        return jsonify({"error": str(e), "imported": e.imported}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in import_data: {str(e)}", exc_info=True)
+        return jsonify({"error": "An error occurred while importing data"}), 500
+
 @api.route('/user-snippets', methods=['GET'])
 @require_auth
 def api_get_user_snippets(user_id):
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        snippets = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=True).paginate(page=page, per_page=per_page, error_out=False)
+        per_page = get_per_page(request.args)
+        fields = snippet_fields()
+        snippet_query = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=True)
+        if is_cursor_request(request.args):
+            return json_response({'snippets': snippet_cursor_page(snippet_query, per_page, fields)})
+
+        snippets = project_snippets(snippet_query, fields).paginate(page=page, per_page=per_page, error_out=False)
         
-        snippet_data = [{
-            **snippet.to_dict(),
-            'has_documentation': snippet.has_documentation
-        } for snippet in snippets.items]
+        snippet_data = [snippet.to_dict(fields) for snippet in snippets.items]
         
         current_app.logger.info(f"Retrieved {snippets.total} user-submitted code snippets for user {user_id}")
         
-        return jsonify({
+        return json_response({
             'snippets': {
                 'items': snippet_data,
                 'total': snippets.total,
                 'pages': snippets.pages,
                 'page': page
             }
-        }), 200
+        })
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error in api_get_user_snippets: {str(e)}")
         return jsonify({"error": "An error occurred while retrieving user snippets"}), 500
@@ -471,30 +749,46 @@ def api_get_user_snippets(user_id):
 def get_dashboard_data(user_id):
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        per_page = get_per_page(request.args)
+        fields = snippet_fields()
 
-        # Get user-submitted snippets
-        user_snippets = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=True).paginate(page=page, per_page=per_page, error_out=False)
+        snippet_query = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=True)
 
-        # Get counts
-        total_snippets = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=True).count()
-        documented_snippets = CodeSnippet.query.filter_by(user_id=user_id, is_user_submitted=True, has_documentation=True).count()
+        # Counts are maintained incrementally in user_snippet_stats
+        stats = get_user_stats(user_id)
+        total_snippets = stats['total']
+        documented_snippets = stats['documented']
 
-        snippet_data = [{
-            **snippet.to_dict(),
-            'has_documentation': snippet.has_documentation
-        } for snippet in user_snippets.items]
+        if is_cursor_request(request.args):
+            return json_response({
+                'total_snippets': total_snippets,
+                'documented_snippets': documented_snippets,
+                'languages': stats['languages'],
+                'sources': stats['sources'],
+                'snippets': snippet_cursor_page(snippet_query, per_page, fields)
+            })
 
-        return jsonify({
+        # Get user-submitted snippets; the total is already known, so skip paginate()'s COUNT
+        page = max(page, 1)
+        items = project_snippets(snippet_query, fields).limit(per_page).offset((page - 1) * per_page).all()
+        user_snippets = Pagination(snippet_query, page, per_page, total_snippets, items)
+
+        snippet_data = [snippet.to_dict(fields) for snippet in user_snippets.items]
+
+        return json_response({
             'total_snippets': total_snippets,
             'documented_snippets': documented_snippets,
+            'languages': stats['languages'],
+            'sources': stats['sources'],
             'snippets': {
                 'items': snippet_data,
                 'total': user_snippets.total,
                 'pages': user_snippets.pages,
                 'page': page
             }
-        }), 200
+        })
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error in get_dashboard_data: {str(e)}", exc_info=True)
         return jsonify({"error": "An unexpected error occurred while retrieving dashboard data. Please try again later."}), 500
\ No newline at end of file
@@ -6,4 +6,36 @@ from app.models import CodeSnippet
 @click.command(name='create_tables')
 @with_appcontext
 def create_tables():
-    db.create_all()
\ No newline at end of file
+    db.create_all()
+
+@click.command(name='rebuild_search_index')
+@with_appcontext
+def rebuild_search_index_command():
+    from app.services.search_service import rebuild_search_index
+    if rebuild_search_index():
+        click.echo('Search index rebuilt.')
+    else:
+        click.echo('Full-text search is only available on SQLite databases.')
+
+
+@click.command(name='rebuild_user_stats')
+@with_appcontext
+def rebuild_user_stats_command():
+    from app.services.stats_service import rebuild_user_stats
+    rebuild_user_stats(db.session)
+    db.session.commit()
+    click.echo('User snippet stats rebuilt.')
+
+
+@click.command(name='rebuild_similarity_index')
+@click.option('--user-id', type=int, help='Only rebuild this user\'s index.')
+@with_appcontext
+def rebuild_similarity_index_command(user_id):
+    from app.services.similarity_service import is_similarity_available, refresh_similarity_index
+    if not is_similarity_available():
+        click.echo('Similarity search needs numpy.')
+        return
+    user_ids = [user_id] if user_id else [id for (id,) in db.session.query(CodeSnippet.user_id).distinct()]
+    for id in user_ids:
+        index = refresh_similarity_index(id, full=True)
+        click.echo(f'User {id}: {len(index)} snippets indexed.')
@@ -1,4 +1,7 @@
 from .user import User
 from .api_key import APIKey
 from .code_snippet import CodeSnippet
-from .documentation import Documentation, Project, Correction
\ No newline at end of file
+from .documentation import Documentation, Project, Correction, DocumentationCache
+from .user_stats import UserSnippetStats
+from .gather import GatherWatermark, GatherSubscription
+from .upload import ArchiveUpload, ArchiveUploadFile
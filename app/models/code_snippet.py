@@ -2,35 +2,46 @@ from app import db
 from datetime import datetime
 
 class CodeSnippet(db.Model):
+    FIELDS = (
+        'id', 'user_id', 'project_id', 'url', 'name_or_title', 'language', 'code', 'stars', 'source',
+        'created_at', 'updated_at', 'is_user_submitted', 'has_documentation', 'is_repo'
+    )
+    # List views leave out the snippet body, which dominates row size
+    SUMMARY_FIELDS = tuple(field for field in FIELDS if field != 'code')
+
+    __table_args__ = (
+        db.Index('ix_code_snippet_user_id_url', 'user_id', 'url', unique=True),
+        # List pages: filter by owner and kind, newest first
+        db.Index('ix_code_snippet_user_id_submitted_created_at', 'user_id', 'is_user_submitted', 'created_at', 'id'),
+        # Dashboard counts
+        db.Index('ix_code_snippet_user_id_submitted_documented', 'user_id', 'is_user_submitted', 'has_documentation'),
+        # Rows changed since the similarity index was last refreshed
+        db.Index('ix_code_snippet_user_id_updated_at', 'user_id', 'updated_at'),
+        # The undocumented backlog picked up by GET /documentation
+        db.Index('ix_code_snippet_undocumented', 'id',
+                 sqlite_where=db.text('has_documentation IS NOT 1'),
+                 postgresql_where=db.text('has_documentation IS NOT true')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'))
     url = db.Column(db.String(500))
     name_or_title = db.Column(db.String(255))
     language = db.Column(db.String(50))
-    code = db.Column(db.Text)
+    code = db.deferred(db.Column(db.Text))
     stars = db.Column(db.Integer, default=0)
     source = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_user_submitted = db.Column(db.Boolean, default=False)
     has_documentation = db.Column(db.Boolean, default=False)
     is_repo = db.Column(db.Boolean, default=False)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'project_id': self.project_id,
-            'url': self.url,
-            'name_or_title': self.name_or_title,
-            'language': self.language,
-            'code': self.code,
-            'stars': self.stars,
-            'source': self.source,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'is_user_submitted': self.is_user_submitted,
-            'has_documentation': self.has_documentation,
-            'is_repo': self.is_repo
-        }
\ No newline at end of file
+    def to_dict(self, fields=None):
+        # Only touch the requested attributes so deferred columns stay unloaded
+        data = {}
+        for field in fields or self.FIELDS:
+            value = getattr(self, field)
+            data[field] = value.isoformat() if isinstance(value, datetime) else value
+        return data
@@ -2,6 +2,10 @@ from app import db
 from datetime import datetime
 
 class Project(db.Model):
+    __table_args__ = (
+        db.Index('ix_project_name_user_id', 'name', 'user_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -11,11 +15,16 @@ class Project(db.Model):
 
 
 class Documentation(db.Model):
+    __table_args__ = (
+        # Documentation changed since the similarity index was last refreshed
+        db.Index('ix_documentation_user_id_updated_at', 'user_id', 'updated_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'))
-    snippet_id = db.Column(db.Integer, db.ForeignKey('code_snippet.id'), nullable=False)
+    snippet_id = db.Column(db.Integer, db.ForeignKey('code_snippet.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -34,4 +43,12 @@ class Correction(db.Model):
     content = db.Column(db.Text, nullable=False)
     documentation_id = db.Column(db.Integer, db.ForeignKey('documentation.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DocumentationCache(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    model = db.Column(db.String(100), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
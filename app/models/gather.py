@@ -0,0 +1,19 @@
+from app import db
+from datetime import datetime
+
+
+class GatherWatermark(db.Model):
+    """Newest item activity seen per gather source, as epoch seconds."""
+    __tablename__ = 'gather_watermark'
+
+    source = db.Column(db.String(50), primary_key=True)
+    watermark = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class GatherSubscription(db.Model):
+    """Users who receive the items found by the scheduled incremental gather."""
+    __tablename__ = 'gather_subscription'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
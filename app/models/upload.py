@@ -0,0 +1,36 @@
+from app import db
+from datetime import datetime
+
+
+class ArchiveUpload(db.Model):
+    """A zip or tarball submitted through /submit/archive; the id doubles as the job id."""
+    __tablename__ = 'archive_upload'
+
+    id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    filename = db.Column(db.String(255))
+    ignored_files = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    files = db.relationship('ArchiveUploadFile', backref='upload', lazy='dynamic')
+
+
+class ArchiveUploadFile(db.Model):
+    """Per-file progress of an archive upload: pending, documented, failed or skipped."""
+    __tablename__ = 'archive_upload_file'
+
+    id = db.Column(db.Integer, primary_key=True)
+    upload_id = db.Column(db.String(64), db.ForeignKey('archive_upload.id'), nullable=False, index=True)
+    path = db.Column(db.String(500), nullable=False)
+    snippet_id = db.Column(db.Integer, db.ForeignKey('code_snippet.id'), index=True)
+    status = db.Column(db.String(20), nullable=False)
+    detail = db.Column(db.String(255))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'snippet_id': self.snippet_id,
+            'status': self.status,
+            'detail': self.detail
+        }
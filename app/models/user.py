@@ -1,17 +1,17 @@
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.password_service import hash_password, verify_password
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(255))
     role = db.Column(db.String(20), default='user')  # 'user' or 'admin'
     is_verified = db.Column(db.Boolean, default=False)
     api_keys = db.relationship('APIKey', back_populates='user', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        return verify_password(self.password_hash, password)
\ No newline at end of file
@@ -0,0 +1,16 @@
+from app import db
+
+
+class UserSnippetStats(db.Model):
+    """Snippet counts per user, kept up to date as snippets are stored and documented.
+
+    ``dimension`` is ``'all'`` (with ``value`` ``'all'``), ``'language'`` or ``'source'``.
+    """
+    __tablename__ = 'user_snippet_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    is_user_submitted = db.Column(db.Boolean, primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    documented = db.Column(db.Integer, nullable=False, default=0)
@@ -5,9 +5,67 @@ from flask import current_app
 import time
 import re
 import base64
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from app.services.cache_service import make_cache_key, get_cached_documentation, store_cached_documentation
+from app.services.rate_limit_service import (
+    CircuitOpenError, RateLimitExceeded, gemini_call, is_quota_error, report_quota_exceeded
+)
+from app.services.chunking_service import DEFAULT_CHUNK_TOKEN_BUDGET, chunk_code, estimate_tokens, select_repo_files
+from app.services.repository_service import fetch_blob, fetch_repository
+from app.utils.metrics import upstream_timer
+
+DEFAULT_GEMINI_MODEL = 'gemini-pro'
+DEFAULT_BATCH_TOKEN_BUDGET = 6000
+DEFAULT_BATCH_MAX_SNIPPETS = 5
+DEFAULT_BATCH_CONCURRENCY = 4
+SNIPPET_MARKER = '=== SNIPPET {} ==='
+DEFAULT_REPO_PROMPT_MAX_FILES = 500
+DEFAULT_REPO_DOC_MAX_FILES = 20
+DEFAULT_REPO_DOC_MAX_FILE_SIZE = 100000  # bytes
+
+_call_slots_lock = threading.Lock()
+_call_slots = None
+
+def get_model_name():
+    return current_app.config.get('GEMINI_MODEL', DEFAULT_GEMINI_MODEL)
+
 def setup_gemini():
-    genai.configure(api_key=current_app.config['GEMINI_API_KEY'])
-    return genai.GenerativeModel('gemini-pro')
+    endpoint = current_app.config.get('GEMINI_API_ENDPOINT')
+    if endpoint:
+        # e.g. a local stub; only the REST transport accepts a plain http:// endpoint
+        genai.configure(api_key=current_app.config['GEMINI_API_KEY'], transport='rest',
+                        client_options={'api_endpoint': endpoint})
+    else:
+        genai.configure(api_key=current_app.config['GEMINI_API_KEY'])
+    return genai.GenerativeModel(get_model_name())
+
+def _get_call_slots():
+    global _call_slots
+    with _call_slots_lock:
+        if _call_slots is None:
+            _call_slots = threading.BoundedSemaphore(current_app.config.get('DOC_BATCH_CONCURRENCY', DEFAULT_BATCH_CONCURRENCY))
+        return _call_slots
+
+def reset_call_slots():
+    global _call_slots
+    with _call_slots_lock:
+        _call_slots = None
+
+@contextmanager
+def gemini_slot():
+    # Every Gemini call, streamed or not, is admitted through the shared rate limiter and
+    # circuit breaker. The pools in run_in_app_context nest (snippets, files, chunks), so
+    # the cap on concurrent calls is this one process-wide semaphore rather than their sizes.
+    with _get_call_slots(), gemini_call(), upstream_timer('gemini'):
+        yield
+
+def generate_content(prompt, **kwargs):
+    model = setup_gemini()
+    with gemini_slot():
+        return model.generate_content(prompt, **kwargs)
 
 
 import requests
@@ -20,71 +78,159 @@ from flask import current_app
 
 def fetch_repository_content(repo_url):
     try:
-        if not repo_url:
-            raise ValueError("Repository URL is empty")
-
-        # Extract owner and repo name from URL
-        parts = repo_url.split('/')
-        if len(parts) < 5 or 'github.com' not in parts:
-            raise ValueError(f"Invalid GitHub repository URL: {repo_url}")
-        
-        owner, repo = parts[-2], parts[-1]
-        current_app.logger.info(f"Fetching content for repository: {owner}/{repo}")
-
-        # Fetch README content
-        readme_url = f"https://api.github.com/repos/{owner}/{repo}/readme"
-        readme_response = requests.get(readme_url)
-        if readme_response.status_code == 200:
-            readme_content = base64.b64decode(readme_response.json()['content']).decode('utf-8')
-            current_app.logger.info(f"Successfully fetched README for {owner}/{repo}")
-        else:
-            readme_content = f"README not found. Status code: {readme_response.status_code}"
-            current_app.logger.warning(f"Failed to fetch README for {owner}/{repo}. Status code: {readme_response.status_code}")
-
-        # Fetch file structure
-        contents_url = f"https://api.github.com/repos/{owner}/{repo}/contents"
-        contents_response = requests.get(contents_url)
-        if contents_response.status_code == 200:
-            file_structure = [item['path'] for item in contents_response.json()]
-            current_app.logger.info(f"Successfully fetched file structure for {owner}/{repo}")
-        else:
-            file_structure = []
-            current_app.logger.warning(f"Failed to fetch file structure for {owner}/{repo}. Status code: {contents_response.status_code}")
-
+        repository = fetch_repository(repo_url)
+        blobs = [entry for entry in repository['tree'] if entry['type'] == 'blob']
         return {
-            "readme": readme_content,
-            "file_structure": file_structure
+            "readme": repository['readme'],
+            "file_structure": [entry['path'] for entry in blobs],
+            "files": blobs,
+            "owner": repository['owner'],
+            "repo": repository['repo'],
+            "sha": repository['sha']
         }
     except Exception as e:
         current_app.logger.error(f"Error fetching repository content: {str(e)}", exc_info=True)
         return {"error": f"Failed to fetch repository content: {str(e)}"}
 
-def generate_documentation(data):
-    model = setup_gemini()
-    
+def build_prompt(data):
     if 'code' in data:
-        prompt = create_code_prompt(data)
+        return create_code_prompt(data)
     elif 'repo_url' in data:
-        repo_content = fetch_repository_content(data['repo_url'])
-        prompt = create_repo_prompt(data['repo_url'], repo_content)
-    else:
-        raise ValueError("Invalid data provided for documentation generation")
+        repo_content = data.get('repo_content')
+        if not repo_content or 'error' in repo_content:
+            repo_content = fetch_repository_content(data['repo_url'])
+        return create_repo_prompt(data['repo_url'], repo_content)
+    raise ValueError("Invalid data provided for documentation generation")
+
+def build_documentation_prompt(data):
+    """Return the prompt that yields the final documentation for ``data``.
+
+    Code over ``DOC_CHUNK_TOKEN_BUDGET`` tokens is split by top-level
+    definitions and repositories by source file; the parts are documented
+    in parallel (each cached on its own) and the returned prompt merges them.
+    """
+    if 'code' in data:
+        chunks = chunk_code(data.get('code') or '', data.get('language'), get_chunk_token_budget())
+        if len(chunks) == 1:
+            return create_code_prompt(data)
+        part_docs = map_documentation([create_chunk_prompt(data, chunk['text']) for chunk in chunks])
+        return create_reduce_prompt(data, part_docs)
+    elif 'repo_url' in data:
+        repo_content = data.get('repo_content')
+        if not repo_content or 'error' in repo_content:
+            repo_content = fetch_repository_content(data['repo_url'])
+        if 'error' in repo_content or not repo_content.get('files'):
+            return create_repo_prompt(data['repo_url'], repo_content)
+        file_docs = document_repository_files(repo_content)
+        if not file_docs:
+            return create_repo_prompt(data['repo_url'], repo_content)
+        return create_repo_reduce_prompt(data['repo_url'], repo_content, file_docs)
+    raise ValueError("Invalid data provided for documentation generation")
+
+def generate_documentation(data):
+    try:
+        prompt = build_documentation_prompt(data)
+    except RuntimeError as e:
+        current_app.logger.error(f"Documenting parts failed: {str(e)}")
+        return f"Error: Failed to generate documentation. {str(e)}"
+    return generate_documentation_from_prompt(prompt)
+
+def get_chunk_token_budget():
+    return current_app.config.get('DOC_CHUNK_TOKEN_BUDGET', DEFAULT_CHUNK_TOKEN_BUDGET)
+
+def run_in_app_context(jobs):
+    """Run callables on a bounded thread pool, each inside an app context.
+
+    Pools may nest; model calls are capped separately by ``generate_content``.
+    """
+    app = current_app._get_current_object()
+
+    def run(job):
+        with app.app_context():
+            return job()
+
+    with ThreadPoolExecutor(max_workers=app.config.get('DOC_BATCH_CONCURRENCY', DEFAULT_BATCH_CONCURRENCY)) as executor:
+        return list(executor.map(run, jobs))
+
+def map_documentation(prompts):
+    documents = run_in_app_context([lambda prompt=prompt: generate_documentation_from_prompt(prompt) for prompt in prompts])
+    for documentation in documents:
+        if is_error_documentation(documentation):
+            raise RuntimeError(documentation[len('Error:'):].strip())
+    return documents
+
+def document_repository_files(repo_content):
+    """Document the repository's main source files; returns ``[(path, documentation)]``.
+
+    Results are cached by blob SHA, so files untouched since the last run
+    are neither downloaded nor sent to the model again.
+    """
+    files = select_repo_files(
+        repo_content['files'],
+        current_app.config.get('REPO_DOC_MAX_FILES', DEFAULT_REPO_DOC_MAX_FILES),
+        current_app.config.get('REPO_DOC_MAX_FILE_SIZE', DEFAULT_REPO_DOC_MAX_FILE_SIZE)
+    )
+    model_name = get_model_name()
+
+    def document_file(entry):
+        key = make_cache_key(f"repo-file\n{entry['path']}\n{entry['sha']}", model_name)
+        cached = get_cached_documentation(key)
+        if cached is not None:
+            return cached
+        try:
+            content = fetch_blob(repo_content['owner'], repo_content['repo'], entry['sha'])
+        except Exception as e:
+            current_app.logger.warning(f"Skipping {entry['path']}: {str(e)}")
+            return None
+        data = {'name_or_title': entry['path'], 'language': entry['path'].rsplit('.', 1)[-1], 'code': content}
+        chunks = chunk_code(content, data['language'], get_chunk_token_budget())
+        documents = run_in_app_context([
+            lambda chunk=chunk: generate_documentation_from_prompt(create_chunk_prompt(data, chunk['text']))
+            for chunk in chunks
+        ]) if len(chunks) > 1 else [generate_documentation_from_prompt(create_chunk_prompt(data, content))]
+        if any(is_error_documentation(documentation) for documentation in documents):
+            current_app.logger.warning(f"Skipping {entry['path']}: documentation failed")
+            return None
+        documentation = '\n\n'.join(documents)
+        store_cached_documentation(key, model_name, documentation)
+        return documentation
+
+    documents = run_in_app_context([lambda entry=entry: document_file(entry) for entry in files])
+    return [(entry['path'], documentation) for entry, documentation in zip(files, documents) if documentation]
+
+def generate_documentation_from_prompt(prompt, post_process=True):
+    model_name = get_model_name()
+    cache_key = make_cache_key(prompt, model_name)
+    cached = get_cached_documentation(cache_key)
+    if cached is not None:
+        current_app.logger.info(f"Documentation cache hit for {cache_key[:12]}")
+        return cached
 
     retries = 5
     for i in range(retries):
         try:
-            response = model.generate_content(prompt)
+            response = generate_content(prompt)
             
             if response.text:
-                return post_process_documentation(response.text)
+                documentation = post_process_documentation(response.text) if post_process else response.text
+                store_cached_documentation(cache_key, model_name, documentation)
+                return documentation
             else:
                 current_app.logger.error("Empty response from Gemini API")
                 return "Error: Empty response from AI model."
         
+        except (CircuitOpenError, RateLimitExceeded) as e:
+            current_app.logger.warning(f"Gemini call not admitted: {str(e)}")
+            return f"Error: Failed to generate documentation. {str(e)}"
         except Exception as e:
             if i < retries - 1:
-                wait_time = 2 ** i
-                current_app.logger.warning(f"Gemini API error. Retrying in {wait_time} seconds... Error: {str(e)}")
+                if is_quota_error(e):
+                    # Slow every process down through the shared bucket instead of sleeping locally
+                    report_quota_exceeded()
+                    current_app.logger.warning(f"Gemini quota exceeded, retrying through the rate limiter. Error: {str(e)}")
+                    continue
+                wait_time = random.uniform(0, 2 ** i)
+                current_app.logger.warning(f"Gemini API error. Retrying in {wait_time:.1f} seconds... Error: {str(e)}")
                 time.sleep(wait_time)
             else:
                 current_app.logger.error(f"Max retries exceeded for Gemini API: {str(e)}")
@@ -92,6 +238,59 @@ def generate_documentation(data):
     
     return "Error: Failed to generate documentation after multiple attempts."
 
+def stream_documentation_from_prompt(prompt):
+    """Yield documentation text as the model streams it, post-processed line by line.
+
+    The generator returns the final documentation, which is exactly what
+    ``generate_documentation_from_prompt`` would have produced and cached.
+    """
+    model_name = get_model_name()
+    cache_key = make_cache_key(prompt, model_name)
+    cached = get_cached_documentation(cache_key)
+    if cached is not None:
+        yield cached
+        return cached
+
+    model = setup_gemini()
+    processor = IncrementalPostProcessor()
+
+    retries = 5
+    for i in range(retries):
+        started = False
+        try:
+            with gemini_slot():
+                for chunk in model.generate_content(prompt, stream=True):
+                    started = True
+                    output = processor.feed(chunk.text)
+                    if output:
+                        yield output
+            break
+        except (CircuitOpenError, RateLimitExceeded) as e:
+            current_app.logger.warning(f"Gemini call not admitted: {str(e)}")
+            return f"Error: Failed to generate documentation. {str(e)}"
+        except Exception as e:
+            # Once text has been sent to the client a retry would duplicate it
+            if started or i == retries - 1:
+                current_app.logger.error(f"Gemini streaming failed: {str(e)}")
+                return f"Error: Failed to generate documentation. {str(e)}"
+            if is_quota_error(e):
+                report_quota_exceeded()
+                continue
+            wait_time = random.uniform(0, 2 ** i)
+            current_app.logger.warning(f"Gemini API error. Retrying in {wait_time} seconds... Error: {str(e)}")
+            time.sleep(wait_time)
+
+    output = processor.finish()
+    if output:
+        yield output
+    if not processor.raw:
+        current_app.logger.error("Empty response from Gemini API")
+        return "Error: Empty response from AI model."
+
+    documentation = post_process_documentation(processor.raw)
+    store_cached_documentation(cache_key, model_name, documentation)
+    return documentation
+
 def create_code_prompt(data):
     return f"""Generate comprehensive documentation for the following code snippet:
 
@@ -109,6 +308,47 @@ Documentation should include:
 6. Any important notes or considerations for users/developers
 """
 
+def create_chunk_prompt(data, code):
+    return f"""Document the following part of a larger piece of code:
+
+Name/Title: {data.get('name_or_title', 'N/A')}
+Language: {data.get('language', 'N/A')}
+Code:
+{code}
+
+Describe only what this part contains:
+1. Its purpose
+2. The functions, classes, or other definitions it contains and their roles
+3. Their input parameters and return values (if applicable)
+4. Any notable libraries used and any important notes
+Be concise; this will be merged with the documentation of the other parts.
+"""
+
+def create_reduce_prompt(data, part_docs):
+    parts = '\n'.join(f"=== PART {i} ===\n{documentation}\n" for i, documentation in enumerate(part_docs, 1))
+    return f"""Generate comprehensive documentation for the following code snippet.
+It was too large to document in one pass, so each of its {len(part_docs)} parts has been documented separately, in source order. Merge the partial documentation below into one coherent document without repeating yourself.
+
+Name/Title: {data.get('name_or_title', 'N/A')}
+Language: {data.get('language', 'N/A')}
+
+{parts}
+Documentation should include:
+1. A brief description of the code's purpose
+2. Key components, functions, or classes and their roles
+3. Input parameters and return values (if applicable)
+4. Any notable technologies, frameworks, or libraries used
+5. Usage examples
+6. Any important notes or considerations for users/developers
+"""
+
+def format_file_structure(paths):
+    limit = current_app.config.get('REPO_PROMPT_MAX_FILES', DEFAULT_REPO_PROMPT_MAX_FILES)
+    listed = ', '.join(paths[:limit])
+    if len(paths) > limit:
+        listed += f" ... and {len(paths) - limit} more files"
+    return listed
+
 def create_repo_prompt(repo_url, repo_content):
     return f"""Generate comprehensive documentation for the following GitHub repository:
 
@@ -118,7 +358,7 @@ README Content:
 {repo_content['readme']}
 
 File Structure:
-{', '.join(repo_content['file_structure'])}
+{format_file_structure(repo_content.get('file_structure', []))}
 
 Documentation should include:
 1. A brief description of the repository's purpose and main functionality
@@ -129,6 +369,130 @@ Documentation should include:
 6. Any important notes or considerations for users/developers
 """
 
+def create_repo_reduce_prompt(repo_url, repo_content, file_docs):
+    files = '\n'.join(f"=== {path} ===\n{documentation}\n" for path, documentation in file_docs)
+    return f"""Generate comprehensive documentation for the following GitHub repository:
+
+Repository URL: {repo_url}
+
+README Content:
+{repo_content['readme']}
+
+File Structure:
+{format_file_structure(repo_content.get('file_structure', []))}
+
+Documentation of its main source files:
+{files}
+Documentation should include:
+1. A brief description of the repository's purpose and main functionality
+2. Key components or modules and their roles
+3. Main technologies, frameworks, or libraries used
+4. Installation and setup instructions (if available in the README)
+5. Usage examples or API endpoints (if it's a library or service)
+6. Any important notes or considerations for users/developers
+"""
+
+def is_error_documentation(documentation):
+    return documentation is None or documentation.startswith('Error:')
+
+def create_batch_code_prompt(items):
+    sections = '\n'.join(f"""{SNIPPET_MARKER.format(item['id'])}
+Name/Title: {item.get('name_or_title', 'N/A')}
+Language: {item.get('language', 'N/A')}
+Code:
+{item.get('code', 'No code provided')}
+""" for item in items)
+    return f"""Generate comprehensive documentation for each of the following code snippets.
+Start the documentation of every snippet with its marker line exactly as given (for example "{SNIPPET_MARKER.format(items[0]['id'])}") and write nothing before the first marker.
+
+{sections}
+The documentation of each snippet should cover:
+1. A brief description of the code's purpose
+2. Key components, functions, or classes and their roles
+3. Input parameters and return values (if applicable)
+4. Any notable technologies, frameworks, or libraries used
+5. Usage examples
+6. Any important notes or considerations for users/developers
+"""
+
+def split_batch_documentation(text, ids):
+    pattern = '|'.join(re.escape(SNIPPET_MARKER.format(id)) for id in ids)
+    parts = re.split(f'({pattern})', text)
+    sections = {}
+    for marker, body in zip(parts[1::2], parts[2::2]):
+        id = int(re.search(r'\d+', marker).group())
+        if body.strip():
+            sections[id] = post_process_documentation(body)
+    return sections
+
+def pack_snippets(items, token_budget, max_items):
+    groups, current, current_tokens = [], [], 0
+    for item in items:
+        tokens = estimate_tokens(item.get('code'))
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def generate_packed_documentation(items):
+    if len(items) == 1:
+        return {items[0]['id']: generate_documentation(items[0])}
+
+    raw = generate_documentation_from_prompt(create_batch_code_prompt(items), post_process=False)
+    if is_error_documentation(raw):
+        return {item['id']: raw for item in items}
+
+    model_name = get_model_name()
+    sections = split_batch_documentation(raw, [item['id'] for item in items])
+    results = {}
+    for item in items:
+        documentation = sections.get(item['id'])
+        if documentation:
+            # Stored under the single-snippet key so later regenerations hit the cache
+            store_cached_documentation(make_cache_key(create_code_prompt(item), model_name), model_name, documentation)
+        else:
+            current_app.logger.warning(f"Batch response had no section for snippet {item['id']}, documenting it alone")
+            documentation = generate_documentation(item)
+        results[item['id']] = documentation
+    return results
+
+def document_snippets(items):
+    """Document snippet dicts (``id``, ``code``, ``name_or_title``, ``language``,
+    ``is_repo``) and return ``{id: documentation}``.
+
+    Cached snippets are answered first, small ones are packed into shared
+    prompts and the model calls run on a bounded thread pool.
+    """
+    app = current_app._get_current_object()
+    model_name = get_model_name()
+    results = {}
+    jobs = []
+    code_items = []
+    for item in items:
+        if item.get('is_repo'):
+            jobs.append(lambda item=item: {item['id']: generate_documentation({'repo_url': item['code']})})
+            continue
+        cached = get_cached_documentation(make_cache_key(create_code_prompt(item), model_name))
+        if cached is not None:
+            results[item['id']] = cached
+        else:
+            code_items.append(item)
+
+    groups = pack_snippets(
+        code_items,
+        app.config.get('DOC_BATCH_TOKEN_BUDGET', DEFAULT_BATCH_TOKEN_BUDGET),
+        app.config.get('DOC_BATCH_MAX_SNIPPETS', DEFAULT_BATCH_MAX_SNIPPETS)
+    )
+    jobs.extend(lambda group=group: generate_packed_documentation(group) for group in groups)
+
+    for documented in run_in_app_context(jobs):
+        results.update(documented)
+    return results
+
 def post_process_documentation(raw_doc):
     # Remove any repetition of the prompt
     cleaned_doc = re.sub(r'^.*?Documentation should include:', '', raw_doc, flags=re.DOTALL).strip()
@@ -144,4 +508,78 @@ def post_process_documentation(raw_doc):
     cleaned_doc = re.sub(r'```(\w+)?\n', r'\n```\1\n', cleaned_doc)
     cleaned_doc = re.sub(r'\n```\s*\n', r'\n```\n\n', cleaned_doc)
     
-    return cleaned_doc.strip()
\ No newline at end of file
+    return cleaned_doc.strip()
+
+class IncrementalPostProcessor:
+    """Streaming counterpart of ``post_process_documentation``.
+
+    Output is released a line at a time, one line behind the model, so a
+    setext underline can still turn the previous line into a header.
+    """
+    PROMPT_ECHO_PREFIX = 'Generate comprehensive documentation'
+    PROMPT_ECHO_MARKER = 'Documentation should include:'
+    PREAMBLE_LIMIT = 2000
+
+    def __init__(self):
+        self.raw = ''
+        self.pending = ''
+        self.held_line = None
+        self.started = False
+        self.emitted = False
+
+    def feed(self, text):
+        self.raw += text
+        self.pending += text
+        if not self.started:
+            # Hold the start back until we know whether the prompt was echoed
+            head = self.pending.lstrip()[:len(self.PROMPT_ECHO_PREFIX)]
+            marker = self.pending.find(self.PROMPT_ECHO_MARKER)
+            if marker != -1:
+                self.pending = self.pending[marker + len(self.PROMPT_ECHO_MARKER):]
+            elif self.PROMPT_ECHO_PREFIX.startswith(head) and len(self.pending) < self.PREAMBLE_LIMIT:
+                return ''
+            self.started = True
+
+        *lines, self.pending = self.pending.split('\n')
+        return self._emit(lines)
+
+    def finish(self):
+        self.started = True
+        lines = [self.pending] if self.pending else []
+        self.pending = ''
+        output = self._emit(lines)
+        if self.held_line is not None:
+            output += self._format(self._process_line(self.held_line))
+            self.held_line = None
+        return output
+
+    def _emit(self, lines):
+        output = ''
+        for line in lines:
+            if self.held_line is None:
+                self.held_line = line
+                continue
+            previous, self.held_line = self.held_line, line
+            if previous and not previous.startswith('#') and re.match(r'={3,}', line):
+                previous, self.held_line = f'# {previous}', line.lstrip('=') or None
+            elif previous and not previous.startswith('##') and re.match(r'-{3,}', line):
+                previous, self.held_line = f'## {previous}', line.lstrip('-') or None
+            output += self._format(self._process_line(previous))
+        return output
+
+    def _process_line(self, line):
+        line = re.sub(r'Please format the documentation in .*?\.', '', line)
+        if re.match(r'```\w+\s*$', line):
+            return '\n' + line.rstrip()
+        if re.match(r'```\s*$', line):
+            return '\n```\n'
+        return line
+
+    def _format(self, line):
+        if not self.emitted:
+            line = line.lstrip()
+            if not line:
+                return ''
+            self.emitted = True
+        return line + '\n'
+
@@ -0,0 +1,257 @@
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.code_snippet import CodeSnippet
+from app.models.documentation import Project
+from app.models.upload import ArchiveUpload, ArchiveUploadFile
+from app.services.chunking_service import SOURCE_EXTENSIONS
+from app.services.stats_service import record_snippets_added
+
+DEFAULT_MAX_FILES = 500
+DEFAULT_MAX_FILE_BYTES = 200000
+DEFAULT_MAX_TOTAL_BYTES = 50 * 1024 * 1024  # uncompressed
+DEFAULT_SPOOL_BYTES = 1024 * 1024
+DEFAULT_DOC_BATCH_SIZE = 20
+INSERT_CHUNK_SIZE = 500
+COPY_CHUNK_BYTES = 64 * 1024
+
+PENDING = 'pending'
+DOCUMENTED = 'documented'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+IGNORED = 'ignored'
+
+ZIP_MIMETYPES = {'application/zip', 'application/x-zip-compressed'}
+IGNORED_DIRECTORIES = {'node_modules', '__pycache__', 'vendor', 'dist', 'build', 'venv', 'site-packages'}
+LANGUAGES = {
+    '.py': 'Python', '.js': 'JavaScript', '.jsx': 'JavaScript', '.ts': 'TypeScript', '.tsx': 'TypeScript',
+    '.go': 'Go', '.rs': 'Rust', '.java': 'Java', '.kt': 'Kotlin', '.rb': 'Ruby', '.php': 'PHP', '.c': 'C',
+    '.h': 'C', '.cc': 'C++', '.cpp': 'C++', '.hpp': 'C++', '.cs': 'C#', '.swift': 'Swift', '.scala': 'Scala',
+    '.sh': 'Shell', '.m': 'Objective-C', '.lua': 'Lua', '.ex': 'Elixir', '.exs': 'Elixir', '.clj': 'Clojure'
+}
+
+
+class InvalidArchive(ValueError):
+    pass
+
+
+def _normalize_path(name):
+    path = posixpath.normpath(name.replace('\\', '/').lstrip('/'))
+    return None if path in ('.', '') or path.startswith('../') else path
+
+
+def _is_source_file(path):
+    directories = path.split('/')[:-1]
+    if any(part.startswith('.') or part in IGNORED_DIRECTORIES for part in directories):
+        return False
+    return posixpath.splitext(path)[1].lower() in SOURCE_EXTENSIONS
+
+
+def _seekable(stream):
+    if stream.seekable():
+        return stream
+    # Zip archives keep their index at the end; past ARCHIVE_SPOOL_BYTES the copy goes to disk, not memory
+    spool = tempfile.SpooledTemporaryFile(max_size=current_app.config.get('ARCHIVE_SPOOL_BYTES', DEFAULT_SPOOL_BYTES))
+    shutil.copyfileobj(stream, spool, COPY_CHUNK_BYTES)
+    spool.seek(0)
+    return spool
+
+
+def _is_zip(stream, filename, mimetype):
+    if (filename or '').lower().endswith('.zip') or mimetype in ZIP_MIMETYPES:
+        return True
+    if not stream.seekable():
+        return False
+    magic = stream.read(4)
+    stream.seek(0)
+    return magic.startswith(b'PK\x03\x04')
+
+
+def _zip_members(stream):
+    try:
+        archive = zipfile.ZipFile(_seekable(stream))
+    except zipfile.BadZipFile as e:
+        raise InvalidArchive(f"Not a valid zip archive: {str(e)}")
+    with archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, lambda info=info: archive.open(info)
+
+
+def _tar_members(stream):
+    # `r|*` reads the tarball front to back (gzip, bz2 or xz), so the stream never needs to seek
+    try:
+        archive = tarfile.open(fileobj=stream, mode='r|*')
+    except tarfile.TarError as e:
+        raise InvalidArchive(f"Not a valid zip or tar archive: {str(e)}")
+    with archive:
+        try:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, member.size, lambda member=member: archive.extractfile(member)
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise InvalidArchive(f"Corrupt tar archive: {str(e)}")
+
+
+def iter_archive_files(stream, filename=None, mimetype=None):
+    """Yield ``{'path', 'status', 'code', 'detail'}`` for each file in a zip or tarball.
+
+    Members are decompressed one at a time, so only the current file is held
+    in memory. Non-source files and dependency or hidden directories come
+    back as ``ignored``; oversized or binary source files, and source files
+    past ``ARCHIVE_MAX_FILES``, as ``skipped``.
+    """
+    config = current_app.config
+    max_files = config.get('ARCHIVE_MAX_FILES', DEFAULT_MAX_FILES)
+    max_file_bytes = config.get('ARCHIVE_MAX_FILE_BYTES', DEFAULT_MAX_FILE_BYTES)
+    max_total_bytes = config.get('ARCHIVE_MAX_TOTAL_BYTES', DEFAULT_MAX_TOTAL_BYTES)
+
+    members = _zip_members(stream) if _is_zip(stream, filename, mimetype) else _tar_members(stream)
+    accepted = total_bytes = 0
+    for member_name, size, open_member in members:
+        path = _normalize_path(member_name)
+        if not path or not _is_source_file(path):
+            yield {'path': path or member_name, 'status': IGNORED, 'code': None, 'detail': None}
+            continue
+        if accepted >= max_files:
+            yield {'path': path, 'status': SKIPPED, 'code': None, 'detail': f'over the {max_files} file limit'}
+            continue
+        if size > max_file_bytes:
+            yield {'path': path, 'status': SKIPPED, 'code': None, 'detail': f'larger than {max_file_bytes} bytes'}
+            continue
+        try:
+            with open_member() as handle:
+                # Sizes in the header can lie, so never read more than the limit
+                data = handle.read(max_file_bytes + 1)
+        except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+            # e.g. an encrypted member or an unsupported compression method
+            yield {'path': path, 'status': SKIPPED, 'code': None, 'detail': f'could not be extracted ({str(e)[:200]})'}
+            continue
+        total_bytes += len(data)
+        if total_bytes > max_total_bytes:
+            raise InvalidArchive(f"Archive expands to more than {max_total_bytes} bytes")
+        if len(data) > max_file_bytes:
+            yield {'path': path, 'status': SKIPPED, 'code': None, 'detail': f'larger than {max_file_bytes} bytes'}
+            continue
+        try:
+            code = data.decode('utf-8')
+        except UnicodeDecodeError:
+            code = None
+        if code is None or '\x00' in code:
+            yield {'path': path, 'status': SKIPPED, 'code': None, 'detail': 'not UTF-8 text'}
+            continue
+        accepted += 1
+        yield {'path': path, 'status': PENDING, 'code': code, 'detail': None}
+
+
+def _get_or_create_project(session, user_id, project_name):
+    project = session.query(Project).filter_by(name=project_name, user_id=user_id).first()
+    if not project:
+        project = Project(name=project_name, user_id=user_id)
+        session.add(project)
+        session.flush()
+    return project
+
+
+def store_archive(upload_id, user_id, project_name, stream, filename=None, mimetype=None):
+    """Create the upload, its project and one snippet per source file; returns the new snippet ids.
+
+    Everything is written in one transaction, so a broken archive leaves
+    nothing behind. File rows go in with ``executemany``; each snippet is its
+    own INSERT because the file row needs its id.
+    """
+    now = datetime.utcnow()
+    snippet_table = CodeSnippet.__table__
+    file_table = ArchiveUploadFile.__table__
+    with Session(db.engine) as session:
+        project = _get_or_create_project(session, user_id, project_name)
+        upload = ArchiveUpload(id=upload_id, user_id=user_id, project_id=project.id, filename=filename, created_at=now)
+        session.add(upload)
+        session.flush()
+
+        snippet_ids, added, files, ignored = [], [], [], 0
+        for entry in iter_archive_files(stream, filename, mimetype):
+            if entry['status'] == IGNORED:
+                ignored += 1
+                continue
+            snippet_id = None
+            if entry['status'] == PENDING:
+                language = LANGUAGES.get(posixpath.splitext(entry['path'])[1].lower(), 'Unknown')
+                snippet_id = session.execute(snippet_table.insert(), {
+                    'user_id': user_id,
+                    'project_id': project.id,
+                    'name_or_title': entry['path'][:255],
+                    'language': language,
+                    'code': entry['code'],
+                    'stars': 0,
+                    'source': 'Archive',
+                    'created_at': now,
+                    'updated_at': now,
+                    'is_user_submitted': True,
+                    'has_documentation': False,
+                    'is_repo': False
+                }).inserted_primary_key[0]
+                snippet_ids.append(snippet_id)
+                # Stats only need these, so the file body is not kept around
+                added.append({'is_user_submitted': True, 'language': language, 'source': 'Archive',
+                              'has_documentation': False})
+            files.append({'upload_id': upload_id, 'path': entry['path'][:500], 'snippet_id': snippet_id,
+                          'status': entry['status'], 'detail': entry['detail'], 'updated_at': now})
+            if len(files) >= INSERT_CHUNK_SIZE:
+                session.execute(file_table.insert(), files)
+                files = []
+        if files:
+            session.execute(file_table.insert(), files)
+        if not snippet_ids:
+            raise InvalidArchive('The archive has no source files to document')
+
+        upload.ignored_files = ignored
+        record_snippets_added(session, user_id, added)
+        session.commit()
+    return snippet_ids
+
+
+def queue_archive_documentation(upload_id, snippet_ids):
+    """Fan the new snippets out to Celery workers in ``DOC_BATCH_SIZE`` batches."""
+    from app.tasks import document_archive_batch_task
+    batch_size = current_app.config.get('DOC_BATCH_SIZE', DEFAULT_DOC_BATCH_SIZE)
+    batches = [snippet_ids[start:start + batch_size] for start in range(0, len(snippet_ids), batch_size)]
+    for batch in batches:
+        document_archive_batch_task.delay(upload_id, batch)
+    return len(batches)
+
+
+def record_archive_progress(upload_id, documented, failed):
+    table = ArchiveUploadFile.__table__
+    now = datetime.utcnow()
+    for status, snippet_ids in ((DOCUMENTED, documented), (FAILED, failed)):
+        if snippet_ids:
+            db.session.execute(table.update().where(
+                table.c.upload_id == upload_id,
+                table.c.snippet_id.in_(snippet_ids)
+            ).values(status=status, updated_at=now))
+    db.session.commit()
+
+
+def get_archive_progress(upload):
+    counts = {status: 0 for status in (PENDING, DOCUMENTED, FAILED, SKIPPED)}
+    counts.update(db.session.query(ArchiveUploadFile.status, func.count()).filter(
+        ArchiveUploadFile.upload_id == upload.id
+    ).group_by(ArchiveUploadFile.status))
+    return {
+        'upload_id': upload.id,
+        'project_id': upload.project_id,
+        'filename': upload.filename,
+        'status': 'processing' if counts[PENDING] else 'done',
+        'counts': {**counts, IGNORED: upload.ignored_files or 0},
+        'files': [file.to_dict() for file in upload.files.order_by(ArchiveUploadFile.id)]
+    }
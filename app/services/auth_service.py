@@ -1,9 +1,43 @@
+import atexit
+import hashlib
+import threading
+import time
 import jwt
+import redis
 from datetime import datetime, timedelta
+from cachetools import TTLCache
 from flask import current_app
-from app.models import User
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Session
+from app.models import User, APIKey
+from app.services.password_service import PasswordHashingBusy, needs_rehash, record_rehash
+from app.utils.redis_client import get_redis
 from app import db
 
+TOKEN_CACHE_TTL = 30  # seconds
+API_KEY_CACHE_TTL = 60  # seconds
+AUTH_CACHE_SIZE = 10000
+LAST_USED_FLUSH_INTERVAL = 5  # seconds
+REVOKED_API_KEY_PREFIX = 'auth:revoked-api-key:'
+
+_cache_lock = threading.Lock()
+_token_cache = None
+_api_key_cache = None
+_pending_last_used = {}
+_flusher = None
+
+def _get_token_cache():
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=current_app.config.get('TOKEN_CACHE_TTL', TOKEN_CACHE_TTL))
+    return _token_cache
+
+def _get_api_key_cache():
+    global _api_key_cache
+    if _api_key_cache is None:
+        _api_key_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=current_app.config.get('API_KEY_CACHE_TTL', API_KEY_CACHE_TTL))
+    return _api_key_cache
+
 def generate_tokens(user_id):
     access_token = jwt.encode({
         'user_id': user_id,
@@ -18,14 +52,133 @@ def generate_tokens(user_id):
     return access_token, refresh_token
 
 def verify_token(token):
+    with _cache_lock:
+        cached = _get_token_cache().get(token)
+    # The cache TTL is short, but never serve a token past its own expiry
+    if cached and cached[1] > time.time():
+        return cached[0]
+
     try:
         payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload['user_id']
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+    with _cache_lock:
+        _get_token_cache()[token] = (payload['user_id'], payload['exp'])
+    return payload['user_id']
+
+def _revocation_key(key):
+    # Only a digest of the key goes to Redis
+    return REVOKED_API_KEY_PREFIX + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def _publish_revocation(key):
+    """Tell other processes to drop ``key`` from their caches; the marker outlives any entry they hold."""
+    client = get_redis()
+    if client is None:
+        return
+    ttl = current_app.config.get('API_KEY_CACHE_TTL', API_KEY_CACHE_TTL)
+    try:
+        client.set(_revocation_key(key), 1, ex=int(ttl) + 1)
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Could not publish API key revocation, other processes drop it within {ttl}s: {str(e)}")
+
+def _is_revoked_elsewhere(key):
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(_revocation_key(key)))
+    except redis.RedisError:
+        return False
+
+def authenticate_api_key(key):
+    with _cache_lock:
+        cached = _get_api_key_cache().get(key)
+    if cached is not None and _is_revoked_elsewhere(key):
+        invalidate_api_key(key)
+        cached = None
+    if cached is None:
+        api_key = APIKey.query.filter_by(key=key).first()
+        if not api_key:
+            return None
+        cached = (api_key.id, api_key.user_id)
+        with _cache_lock:
+            _get_api_key_cache()[key] = cached
+
+    record_api_key_use(cached[0])
+    return cached[1]
+
+def invalidate_api_key(key):
+    with _cache_lock:
+        _get_api_key_cache().pop(key, None)
+
+def revoke_api_key(user_id, key_id):
+    api_key = APIKey.query.filter_by(id=key_id, user_id=user_id).first()
+    if not api_key:
+        return False
+    db.session.delete(api_key)
+    db.session.commit()
+    # Without Redis, other processes drop the key once their API_KEY_CACHE_TTL expires
+    invalidate_api_key(api_key.key)
+    _publish_revocation(api_key.key)
+    with _cache_lock:
+        _pending_last_used.pop(key_id, None)
+    return True
+
+def record_api_key_use(api_key_id):
+    with _cache_lock:
+        _pending_last_used[api_key_id] = datetime.utcnow()
+    _ensure_flusher()
+
+def flush_api_key_usage():
+    with _cache_lock:
+        pending = dict(_pending_last_used)
+        _pending_last_used.clear()
+    if not pending:
+        return 0
+
+    table = APIKey.__table__
+    statement = table.update().where(table.c.id == bindparam('key_id')).values(last_used=bindparam('used_at'))
+    try:
+        with Session(db.engine) as session:
+            session.execute(statement, [{'key_id': key_id, 'used_at': used_at} for key_id, used_at in pending.items()])
+            session.commit()
+    except Exception:
+        with _cache_lock:
+            for key_id, used_at in pending.items():
+                if _pending_last_used.get(key_id, used_at) <= used_at:
+                    _pending_last_used[key_id] = used_at
+        raise
+    return len(pending)
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _cache_lock:
+        if _flusher is not None:
+            return
+        app = current_app._get_current_object()
+        interval = app.config.get('API_KEY_USAGE_FLUSH_INTERVAL', LAST_USED_FLUSH_INTERVAL)
+
+        def flush_in_context():
+            with app.app_context():
+                try:
+                    flush_api_key_usage()
+                except Exception as e:
+                    app.logger.warning(f"Failed to flush API key usage: {str(e)}")
+
+        def run():
+            while True:
+                time.sleep(interval)
+                flush_in_context()
+
+        _flusher = threading.Thread(target=run, name='api-key-usage-flusher', daemon=True)
+        _flusher.start()
+        atexit.register(flush_in_context)
+
 def create_user(name, email, password):
     user = User(name=name, email=email)
     user.set_password(password)
@@ -33,10 +186,25 @@ def create_user(name, email, password):
     db.session.commit()
     return user
 
+def authenticate_user(email, password):
+    """Return the user if the password matches, upgrading a stale hash on the way."""
+    user = User.query.filter_by(email=email).first()
+    if not user or not user.check_password(password):
+        return None
+    if needs_rehash(user.password_hash):
+        try:
+            user.set_password(password)
+        except PasswordHashingBusy:
+            # The upgrade can wait for the next login
+            return user
+        db.session.commit()
+        record_rehash()
+    return user
+
 def verify_user(user_id):
     user = User.query.get(user_id)
     if user:
         user.is_verified = True
         db.session.commit()
         return True
-    return False
\ No newline at end of file
+    return False
@@ -0,0 +1,134 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+from cachetools import TTLCache
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.documentation import DocumentationCache
+from app.utils.metrics import DOC_CACHE_EVENTS, DOC_CACHE_MEMORY_ENTRIES
+
+DEFAULT_MEMORY_SIZE = 256
+DEFAULT_TTL = 7 * 24 * 60 * 60  # seconds
+DEFAULT_MAX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_memory_cache = None
+_stats = {
+    'memory_hits': 0,
+    'persistent_hits': 0,
+    'misses': 0,
+    'stores': 0,
+    'evictions': 0
+}
+
+
+def normalize_prompt(prompt):
+    lines = prompt.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def make_cache_key(prompt, model_name):
+    normalized = normalize_prompt(prompt)
+    return hashlib.sha256(f"{model_name}\n{normalized}".encode('utf-8')).hexdigest()
+
+
+def _get_ttl():
+    return current_app.config.get('DOC_CACHE_TTL', DEFAULT_TTL)
+
+
+def _get_memory_cache():
+    global _memory_cache
+    if _memory_cache is None:
+        _memory_cache = TTLCache(
+            maxsize=current_app.config.get('DOC_CACHE_MEMORY_SIZE', DEFAULT_MEMORY_SIZE),
+            ttl=_get_ttl()
+        )
+    return _memory_cache
+
+
+def _incr(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+    DOC_CACHE_EVENTS.inc(amount, event=name)
+
+
+def _remember(key, content):
+    with _lock:
+        cache = _get_memory_cache()
+        cache[key] = content
+        DOC_CACHE_MEMORY_ENTRIES.set(len(cache))
+
+
+def get_cached_documentation(key):
+    with _lock:
+        content = _get_memory_cache().get(key)
+    if content is not None:
+        _incr('memory_hits')
+        return content
+
+    try:
+        with Session(db.engine) as session:
+            entry = session.get(DocumentationCache, key)
+            if entry and entry.expires_at > datetime.utcnow():
+                content = entry.content
+    except Exception as e:
+        current_app.logger.warning(f"Documentation cache lookup failed: {str(e)}")
+
+    if content is None:
+        _incr('misses')
+        return None
+
+    _incr('persistent_hits')
+    _remember(key, content)
+    return content
+
+
+def store_cached_documentation(key, model_name, content):
+    _remember(key, content)
+    _incr('stores')
+
+    now = datetime.utcnow()
+    max_entries = current_app.config.get('DOC_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    try:
+        with Session(db.engine) as session:
+            session.merge(DocumentationCache(
+                key=key,
+                model=model_name,
+                content=content,
+                created_at=now,
+                expires_at=now + timedelta(seconds=_get_ttl())
+            ))
+            evicted = session.query(DocumentationCache).filter(
+                DocumentationCache.expires_at <= now
+            ).delete(synchronize_session=False)
+
+            overflow = session.query(DocumentationCache.key).order_by(
+                DocumentationCache.created_at.desc()
+            ).offset(max_entries).subquery()
+            evicted += session.query(DocumentationCache).filter(
+                DocumentationCache.key.in_(overflow.select())
+            ).delete(synchronize_session=False)
+            session.commit()
+        if evicted:
+            _incr('evictions', evicted)
+    except Exception as e:
+        current_app.logger.warning(f"Documentation cache store failed: {str(e)}")
+
+
+def get_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_entries'] = len(_memory_cache) if _memory_cache is not None else 0
+    lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+    stats['hit_ratio'] = (stats['memory_hits'] + stats['persistent_hits']) / lookups if lookups else 0.0
+    return stats
+
+
+def clear_memory_cache():
+    global _memory_cache
+    with _lock:
+        _memory_cache = None
+        DOC_CACHE_MEMORY_ENTRIES.set(0)
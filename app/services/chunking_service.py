@@ -0,0 +1,120 @@
+import ast
+import hashlib
+import posixpath
+import re
+
+DEFAULT_CHUNK_TOKEN_BUDGET = 3000
+# A chunk also ends after any segment whose hash is 0 mod this, so chunk
+# boundaries are content-defined and an edit only shifts its own neighbourhood
+BOUNDARY_MODULUS = 4
+
+DEFINITION_PATTERN = re.compile(
+    r'^(?:@|#\[|(?:export\s+)?(?:default\s+)?(?:async\s+)?'
+    r'(?:def|class|function|func|fn|pub|impl|struct|interface|enum|trait|type|module|'
+    r'public|private|protected|internal|static|abstract|final|const|let|var|sub|object)\b)'
+)
+
+SOURCE_EXTENSIONS = {
+    '.py', '.js', '.jsx', '.ts', '.tsx', '.go', '.rs', '.java', '.kt', '.rb', '.php', '.c', '.h',
+    '.cc', '.cpp', '.hpp', '.cs', '.swift', '.scala', '.sh', '.m', '.lua', '.ex', '.exs', '.clj'
+}
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for code and English prose
+    return len(text or '') // 4 + 1
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _python_segment_starts(code):
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    starts = []
+    for node in tree.body:
+        decorators = getattr(node, 'decorator_list', None)
+        starts.append(min([node.lineno] + [decorator.lineno for decorator in decorators or []]) - 1)
+    return starts
+
+
+def _generic_segment_starts(lines):
+    starts = []
+    previous = ''
+    for i, line in enumerate(lines):
+        if DEFINITION_PATTERN.match(line) and not previous.startswith(('@', '#[')):
+            starts.append(i)
+        if line.strip():
+            previous = line
+    return starts
+
+
+def split_top_level(code, language=None):
+    """Split source into top-level segments (definitions with their decorators)."""
+    lines = code.splitlines(keepends=True)
+    starts = None
+    if (language or '').lower() in ('python', 'py', 'unknown', 'n/a', ''):
+        starts = _python_segment_starts(code)
+    if starts is None:
+        starts = _generic_segment_starts(lines)
+
+    # Anything before the first definition (imports, headers) is its own segment
+    starts = sorted(set([0] + [start for start in starts if 0 <= start < len(lines)]))
+    bounds = starts + [len(lines)]
+    return [''.join(lines[start:end]) for start, end in zip(bounds, bounds[1:]) if ''.join(lines[start:end]).strip()]
+
+
+def _split_oversized(segment, token_budget):
+    pieces, current = [], ''
+    for line in segment.splitlines(keepends=True):
+        if current and estimate_tokens(current + line) > token_budget:
+            pieces.append(current)
+            current = ''
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_code(code, language=None, token_budget=DEFAULT_CHUNK_TOKEN_BUDGET):
+    """Group top-level segments into chunks of at most ``token_budget`` tokens.
+
+    Returns ``[{'index', 'text', 'hash'}]``; a single chunk means no split was needed.
+    """
+    if estimate_tokens(code) <= token_budget:
+        return [{'index': 0, 'text': code, 'hash': content_hash(code)}]
+
+    segments = []
+    for segment in split_top_level(code, language):
+        if estimate_tokens(segment) > token_budget:
+            segments.extend(_split_oversized(segment, token_budget))
+        else:
+            segments.append(segment)
+
+    texts, current = [], ''
+    for segment in segments:
+        if current and estimate_tokens(current + segment) > token_budget:
+            texts.append(current)
+            current = ''
+        current += segment
+        if int(content_hash(segment)[:8], 16) % BOUNDARY_MODULUS == 0:
+            texts.append(current)
+            current = ''
+    if current:
+        texts.append(current)
+    return [{'index': i, 'text': text, 'hash': content_hash(text)} for i, text in enumerate(texts)]
+
+
+def select_repo_files(tree, max_files, max_size):
+    """Pick the source files worth documenting: shallow paths first, then by name."""
+    candidates = [
+        entry for entry in tree
+        if entry.get('type') == 'blob'
+        and posixpath.splitext(entry['path'])[1].lower() in SOURCE_EXTENSIONS
+        and (entry.get('size') or 0) <= max_size
+    ]
+    candidates.sort(key=lambda entry: (entry['path'].count('/'), entry['path']))
+    return candidates[:max_files]
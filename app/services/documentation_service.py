@@ -0,0 +1,98 @@
+from app import db
+from app.models.code_snippet import CodeSnippet
+from app.models.documentation import Documentation, Project
+from app.services.ai_service import fetch_repository_content, generate_documentation, is_error_documentation
+from app.services.stats_service import mark_snippets_documented, record_snippets_added
+
+
+class DocumentationUnavailable(Exception):
+    """The model returned its error fallback instead of documentation."""
+
+
+def submission_documentation_data(code=None, repo_url=None):
+    if code:
+        return {'code': code}
+    return {'repo_content': fetch_repository_content(repo_url), 'repo_url': repo_url}
+
+
+def _checked(documentation):
+    if is_error_documentation(documentation):
+        raise DocumentationUnavailable(documentation or 'Error: No documentation was generated')
+    return documentation
+
+
+def generate_submission_documentation(code=None, repo_url=None):
+    return generate_documentation(submission_documentation_data(code=code, repo_url=repo_url))
+
+
+def save_submission(user_id, project_name, documentation, code=None, repo_url=None):
+    project = Project.query.filter_by(name=project_name, user_id=user_id).first()
+    if not project:
+        project = Project(name=project_name, user_id=user_id)
+        db.session.add(project)
+        db.session.flush()
+
+    snippet = CodeSnippet(
+        user_id=user_id,
+        project_id=project.id,
+        code=code if code else repo_url,
+        is_repo=not code,
+        name_or_title=project_name,
+        is_user_submitted=True,
+        has_documentation=True
+    )
+    db.session.add(snippet)
+    db.session.flush()
+    record_snippets_added(db.session, user_id, [snippet])
+
+    doc = Documentation(content=documentation, user_id=user_id, project_id=project.id, snippet_id=snippet.id)
+    db.session.add(doc)
+    db.session.commit()
+    return doc
+
+
+def document_submission(user_id, project_name, code=None, repo_url=None):
+    documentation = _checked(generate_submission_documentation(code=code, repo_url=repo_url))
+    return save_submission(user_id, project_name, documentation, code=code, repo_url=repo_url)
+
+
+def snippet_documentation_data(snippet):
+    if snippet.is_repo:
+        repo_content = fetch_repository_content(snippet.code)
+        if 'error' in repo_content:
+            raise RuntimeError(repo_content['error'])
+        return {'repo_url': snippet.code, 'repo_content': repo_content}
+
+    return {
+        'code': snippet.code,
+        'name_or_title': snippet.name_or_title,
+        'language': snippet.language
+    }
+
+
+def generate_snippet_documentation(snippet):
+    return generate_documentation(snippet_documentation_data(snippet))
+
+
+def save_snippet_documentation(snippet, content):
+    documentation = Documentation.query.filter_by(snippet_id=snippet.id).first()
+    if documentation:
+        documentation.content = content
+    else:
+        documentation = Documentation(
+            content=content,
+            user_id=snippet.user_id,
+            project_id=snippet.project_id,
+            snippet_id=snippet.id
+        )
+        db.session.add(documentation)
+
+    mark_snippets_documented(db.session, [snippet])
+    db.session.commit()
+    return documentation
+
+
+def document_snippet(snippet):
+    content = _checked(generate_snippet_documentation(snippet))
+    save_snippet_documentation(snippet, content)
+    return content
@@ -1,14 +1,119 @@
-from flask import url_for
-from flask_mail import Message
+import smtplib
+import threading
+import time
+
+from flask import current_app, url_for
+from flask_mail import BadHeaderError, Message
 from app import mail
 
-def send_verification_email(user):
-    msg = Message('Verify Your Email',
-                  sender='noreply@codebase.com',
-                  recipients=[user.email])
-    msg.body = f'''To verify your email, please click on the following link:
+DEFAULT_SENDER = 'noreply@codebase.com'
+DEFAULT_CONNECTION_IDLE = 30  # seconds
+
+# Connection-level failures: the rest of the batch is retried on a new session
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError, OSError)
+# Failures specific to one message, which a retry would not fix
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError,
+                  smtplib.SMTPNotSupportedError, BadHeaderError, AssertionError)
+
+
+class EmailDeliveryError(Exception):
+    def __init__(self, message, unsent):
+        super().__init__(message)
+        self.unsent = unsent
+
+
+_connection_lock = threading.Lock()
+_connection = None
+_connection_used = 0.0
+_stats = {'sent': 0, 'failed': 0, 'connections': 0}
+
+
+def build_message(subject, recipients, body, sender=DEFAULT_SENDER):
+    """A JSON-serialisable message, so it can travel through the Celery queue."""
+    return {'subject': subject, 'recipients': list(recipients), 'body': body, 'sender': sender}
+
+
+def verification_message(user):
+    return build_message('Verify Your Email', [user.email], f'''To verify your email, please click on the following link:
 {url_for('api.verify', user_id=user.id, _external=True)}
 
 If you did not make this request then simply ignore this email and no changes will be made.
-'''
-    mail.send(msg)
\ No newline at end of file
+''')
+
+
+def queue_emails(messages):
+    from app.tasks import send_emails_task
+    return send_emails_task.delay(messages)
+
+
+def send_verification_email(user):
+    # Built here, while the request context can still produce an external URL
+    return queue_emails([verification_message(user)])
+
+
+def _open_connection():
+    global _connection
+    _connection = mail.connect()
+    _connection.__enter__()
+    _stats['connections'] += 1
+    return _connection
+
+
+def close_connection():
+    with _connection_lock:
+        _close_connection()
+
+
+def _close_connection():
+    global _connection
+    if _connection is None:
+        return
+    try:
+        _connection.__exit__(None, None, None)
+    except CONNECTION_ERRORS + (smtplib.SMTPException,):
+        pass
+    _connection = None
+
+
+def send_emails(messages):
+    """Send message dicts over this process's SMTP session, opening it if needed.
+
+    The session stays open for ``EMAIL_CONNECTION_IDLE`` seconds, so queued
+    messages handled back to back share one connection. Messages the server
+    rejects are logged and dropped; on a connection failure the unsent rest
+    is raised in ``EmailDeliveryError.unsent`` for the caller to retry.
+    """
+    global _connection_used
+    idle = current_app.config.get('EMAIL_CONNECTION_IDLE', DEFAULT_CONNECTION_IDLE)
+    sent = 0
+    with _connection_lock:
+        if _connection is not None and time.monotonic() - _connection_used > idle:
+            _close_connection()
+        for i, message in enumerate(messages):
+            reused = _connection is not None
+            try:
+                connection = _connection or _open_connection()
+                try:
+                    connection.send(Message(**message))
+                except CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    # The server may have dropped an idle session; reconnect once
+                    _close_connection()
+                    _open_connection().send(Message(**message))
+            except MESSAGE_ERRORS as e:
+                _stats['failed'] += 1
+                current_app.logger.error(f"Dropping email to {message.get('recipients')}: {str(e)}")
+                continue
+            except CONNECTION_ERRORS + (smtplib.SMTPException,) as e:
+                _close_connection()
+                raise EmailDeliveryError(f"SMTP delivery failed: {str(e)}", messages[i:]) from e
+            finally:
+                _connection_used = time.monotonic()
+            sent += 1
+            _stats['sent'] += 1
+    return sent
+
+
+def get_email_stats():
+    return dict(_stats)
@@ -0,0 +1,190 @@
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import current_app
+
+from app import db
+from app.models.gather import GatherSubscription, GatherWatermark
+from app.services.github_service import gather_data_from_github
+from app.services.snippet_service import store_gathered_snippets
+from app.services.stackoverflow_service import gather_data_from_stackoverflow
+from app.utils.helpers import clean_data
+from app.utils.metrics import current_upstream_timings, track_upstream_timings
+
+DEFAULT_PAGES_PER_SOURCE = 3
+DEFAULT_DEADLINE = 20  # seconds
+DEFAULT_INCREMENTAL_PAGE_SIZE = 100
+DEFAULT_INCREMENTAL_MAX_PAGES = 10  # per window; GitHub search stops at 1000 results
+DEFAULT_INCREMENTAL_MAX_WINDOWS = 16
+DEFAULT_INCREMENTAL_LOOKBACK = 24 * 60 * 60  # seconds, for a source's first run
+
+GatherSource = namedtuple('GatherSource', ['name', 'fetch_page', 'url_config_key', 'max_concurrency', 'incremental'])
+
+_sources = {}
+
+
+def register_source(name, fetch_page, url_config_key, max_concurrency=2, incremental=False):
+    """Register ``fetch_page(api_url, page)`` as a gather source.
+
+    ``fetch_page`` must return a list of item dicts and swallow its own
+    upstream errors, like the GitHub and StackOverflow services do.
+    Incremental sources also accept ``since``, ``until`` and ``per_page``
+    keywords and return only the items active in that inclusive window, and
+    a ``raise_errors`` keyword that makes a failed call raise instead of
+    looking like an empty page.
+    """
+    _sources[name] = GatherSource(name, fetch_page, url_config_key, max_concurrency, incremental)
+
+
+def unregister_source(name):
+    _sources.pop(name, None)
+
+
+def get_sources():
+    return dict(_sources)
+
+
+register_source('GitHub', gather_data_from_github, 'GITHUB_API_URL', incremental=True)
+register_source('StackOverflow', gather_data_from_stackoverflow, 'STACKOVERFLOW_API_URL', incremental=True)
+
+
+def _fetch_in_context(app, source, api_url, page, upstream_timings):
+    with app.app_context():
+        track_upstream_timings(upstream_timings)
+        return source.fetch_page(api_url, page)
+
+
+def gather_all(source_names=None, pages=None, deadline=None):
+    app = current_app._get_current_object()
+    pages = pages or app.config.get('GATHER_PAGES_PER_SOURCE', DEFAULT_PAGES_PER_SOURCE)
+    deadline = deadline or app.config.get('GATHER_DEADLINE', DEFAULT_DEADLINE)
+    sources = [source for name, source in _sources.items() if source_names is None or name in source_names]
+
+    # One pool per source caps its concurrency without starving the others
+    executors = {source.name: ThreadPoolExecutor(max_workers=source.max_concurrency) for source in sources}
+    futures = {}
+    upstream_timings = current_upstream_timings()
+    for source in sources:
+        api_url = app.config.get(source.url_config_key)
+        if not api_url:
+            current_app.logger.warning(f"Skipping gather source {source.name}: {source.url_config_key} is not configured")
+            continue
+        for page in range(1, pages + 1):
+            future = executors[source.name].submit(_fetch_in_context, app, source, api_url, page, upstream_timings)
+            futures[future] = (source.name, page)
+
+    results = []
+    started = time.monotonic()
+    pending = set(futures)
+    try:
+        while pending:
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                source_name, page = futures[future]
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    current_app.logger.error(f"Error gathering page {page} from {source_name}: {str(e)}")
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if pending:
+        skipped = sorted(f"{futures[future][0]}#{futures[future][1]}" for future in pending)
+        current_app.logger.warning(f"Gather deadline of {deadline}s reached, skipped pages: {', '.join(skipped)}")
+
+    current_app.logger.info(f"Gathered {len(results)} items from {len(sources)} sources in {time.monotonic() - started:.2f}s")
+    return results
+
+
+def _fetch_window(source, api_url, since, until, page_size, max_pages):
+    items = []
+    for page in range(1, max_pages + 1):
+        # An empty page would read as the end of the window, so a failed call has to raise
+        batch = source.fetch_page(api_url, page, since=since, until=until, per_page=page_size, raise_errors=True)
+        items.extend(batch)
+        if len(batch) < page_size:
+            return items, True
+    return items, False
+
+
+def gather_since(source, since, until):
+    """Fetch what ``source`` saw between ``since`` and ``until``; returns ``(items, watermark)``.
+
+    The watermark only moves past a window that was read to its last page. A
+    window with more than ``GATHER_INCREMENTAL_MAX_PAGES`` pages is halved
+    until it fits, and whatever is left after ``GATHER_INCREMENTAL_MAX_WINDOWS``
+    windows is picked up by the next run, as is everything from a window
+    whose fetch failed.
+    """
+    api_url = current_app.config.get(source.url_config_key)
+    page_size = current_app.config.get('GATHER_INCREMENTAL_PAGE_SIZE', DEFAULT_INCREMENTAL_PAGE_SIZE)
+    max_pages = current_app.config.get('GATHER_INCREMENTAL_MAX_PAGES', DEFAULT_INCREMENTAL_MAX_PAGES)
+    max_windows = current_app.config.get('GATHER_INCREMENTAL_MAX_WINDOWS', DEFAULT_INCREMENTAL_MAX_WINDOWS)
+    items, watermark, end = [], since, until
+    for _ in range(max_windows):
+        if watermark >= until:
+            break
+        try:
+            window_items, complete = _fetch_window(source, api_url, watermark, end, page_size, max_pages)
+        except Exception as e:
+            current_app.logger.error(f"Incremental gather from {source.name} stopped at {watermark}: {str(e)}")
+            break
+        # Items from a cut-off window are kept; storing them twice is a no-op
+        items.extend(window_items)
+        width = end - watermark
+        if complete:
+            # The next window may be twice as wide; a denser stretch halves it again
+            watermark, end = end, min(until, end + 2 * width)
+        elif width > 1:
+            end = watermark + width // 2
+        else:
+            current_app.logger.warning(f"{source.name} has more than {max_pages} pages of items at {watermark}; skipping past them")
+            watermark, end = end, min(until, end + 2)
+    if watermark < until:
+        current_app.logger.info(f"{source.name} has more new items than {max_windows} windows hold; resuming next run")
+    return items, watermark
+
+
+def run_incremental_gather(now=None):
+    """Fetch what each incremental source added since its watermark and store
+    it for every subscribed user; returns per-source and per-user counts."""
+    now = int(now if now is not None else time.time())
+    lookback = current_app.config.get('GATHER_INCREMENTAL_LOOKBACK', DEFAULT_INCREMENTAL_LOOKBACK)
+    user_ids = [user_id for (user_id,) in db.session.query(GatherSubscription.user_id)]
+    if not user_ids:
+        return {'fetched': {}, 'stored': {}, 'watermarks': {}}
+    watermarks = {row.source: row for row in GatherWatermark.query}
+
+    items, fetched, advanced = [], {}, {}
+    for source in _sources.values():
+        if not source.incremental or not current_app.config.get(source.url_config_key):
+            continue
+        row = watermarks.get(source.name)
+        since = row.watermark if row else now - lookback
+        try:
+            source_items, advanced[source.name] = gather_since(source, since, now)
+        except Exception as e:
+            current_app.logger.error(f"Incremental gather from {source.name} failed: {str(e)}")
+            continue
+        fetched[source.name] = len(source_items)
+        items.extend(source_items)
+
+    cleaned = clean_data(items)
+    stored = {user_id: store_gathered_snippets(user_id, cleaned) for user_id in user_ids}
+
+    # Watermarks only move once the items are stored, so a failed run is retried
+    for name, watermark in advanced.items():
+        row = watermarks.get(name)
+        if row is None:
+            db.session.add(GatherWatermark(source=name, watermark=watermark))
+        elif watermark > row.watermark:
+            row.watermark = watermark
+    db.session.commit()
+
+    current_app.logger.info(f"Incremental gather fetched {sum(fetched.values())} items for {len(user_ids)} subscribers")
+    return {'fetched': fetched, 'stored': stored, 'watermarks': advanced}
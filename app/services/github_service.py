@@ -1,10 +1,39 @@
-import requests
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
 from flask import current_app
 
-def gather_data_from_github(api_url):
+from app.utils.http_client import http_get
+
+DEFAULT_WATERMARK_QUALIFIER = 'pushed'
+
+def format_github_time(value):
+    return datetime.fromtimestamp(value, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def with_window_qualifier(api_url, qualifier, since, until=None):
+    # The search query lives in the URL, so the qualifier has to be added to ``q`` itself
+    parts = urlsplit(api_url)
+    query = dict(parse_qsl(parts.query))
+    window = f"{format_github_time(since)}..{format_github_time(until)}" if until is not None else f">={format_github_time(since)}"
+    query['q'] = f"{query.get('q', '')} {qualifier}:{window}".strip()
+    # Search cannot sort on pushed or created, so this only keeps paging stable;
+    # the window bounds, not the order, decide what a run has seen
+    query.update(sort='updated', order='asc')
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def gather_data_from_github(api_url, page=1, since=None, until=None, per_page=None, raise_errors=False):
+    """Fetch one page of search results; with ``since`` (and ``until``, epoch
+    seconds, both inclusive) only repositories pushed in that window."""
     github_data = []
+    params = {'page': page}
+    qualifier = current_app.config.get('GITHUB_WATERMARK_QUALIFIER', DEFAULT_WATERMARK_QUALIFIER)
+    if since is not None:
+        api_url = with_window_qualifier(api_url, qualifier, since, until)
+    if per_page:
+        params['per_page'] = per_page
     try:
-        response = requests.get(api_url)
+        response = http_get('github', api_url, params=params)
         response.raise_for_status()
         items = response.json()['items']
         for item in items:
@@ -22,6 +51,8 @@ def gather_data_from_github(api_url):
                 'stars': stars
             })
         current_app.logger.info(f"Successfully gathered {len(github_data)} items from GitHub")
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         current_app.logger.error(f"Error fetching data from GitHub: {str(e)}")
-    return github_data
\ No newline at end of file
+        if raise_errors:
+            raise
+    return github_data
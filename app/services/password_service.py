@@ -0,0 +1,114 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_HASH_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+DEFAULT_SALT_LENGTH = 16
+DEFAULT_MAX_PENDING = 64
+DEFAULT_TIMEOUT = 10  # seconds
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing pool is full or a hash takes too long; retry later."""
+
+
+_pool_lock = threading.Lock()
+_pool = None
+_slots = None
+_stats_lock = threading.Lock()
+_stats = {'hashed': 0, 'rejected': 0, 'timed_out': 0, 'rehashed': 0}
+
+
+def get_hash_method():
+    method = current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+    # werkzeug records the iteration count in the hash; spell it out so comparisons work
+    if method.startswith('pbkdf2') and method.count(':') == 1:
+        method = f'{method}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+def _default_workers():
+    # Leave half the cores to request handling
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def _get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = current_app.config.get('PASSWORD_HASH_WORKERS', _default_workers())
+                if not workers:
+                    return None, None
+                max_pending = current_app.config.get('PASSWORD_HASH_MAX_PENDING', DEFAULT_MAX_PENDING)
+                _slots = threading.BoundedSemaphore(workers + max_pending)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _pool, _slots
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _run(function, *args):
+    """Run a hash on the bounded pool; hashlib releases the GIL, so the pool size caps CPU use."""
+    pool, slots = _get_pool()
+    if pool is None:
+        return function(*args)
+    if not slots.acquire(blocking=False):
+        _count('rejected')
+        raise PasswordHashingBusy('Too many password checks in progress')
+    try:
+        future = pool.submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        result = future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', DEFAULT_TIMEOUT))
+    except FutureTimeoutError:
+        future.cancel()
+        _count('timed_out')
+        raise PasswordHashingBusy('Password check timed out')
+    _count('hashed')
+    return result
+
+
+def hash_password(password):
+    salt_length = current_app.config.get('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+    return _run(generate_password_hash, password, get_hash_method(), salt_length)
+
+
+def verify_password(password_hash, password):
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != get_hash_method()
+
+
+def record_rehash():
+    _count('rehashed')
+
+
+def get_hashing_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_hashing_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool = _slots = None
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,266 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import redis
+from flask import current_app
+
+from app.utils.redis_client import get_redis
+
+DEFAULT_RATE_PER_MINUTE = 60
+DEFAULT_BURST = 5
+DEFAULT_QUEUE_TIMEOUT = 30  # seconds
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30  # seconds
+
+BUCKET_KEY = 'gemini:limiter:bucket'
+STATS_KEY = 'gemini:limiter:stats'
+CIRCUIT_KEY = 'gemini:circuit:open'
+
+# Refill and take one token atomically, using the Redis clock so every
+# web and Celery process shares one bucket.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if ARGV[3] == 'drain' then
+    tokens = 0
+elseif tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.script = None
+
+    def _take_local(self, drain=False):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if drain:
+                self.tokens = 0
+                return 0
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def take(self, drain=False):
+        """Take a token; returns 0 on success, otherwise seconds until one is due."""
+        client = get_redis()
+        if client is not None:
+            try:
+                if self.script is None:
+                    self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+                return float(self.script(keys=[BUCKET_KEY], args=[self.rate, self.capacity, 'drain' if drain else 'take']))
+            except redis.RedisError as e:
+                current_app.logger.warning(f"Redis rate limiter failed, falling back to in-process bucket: {str(e)}")
+        return self._take_local(drain)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_until = 0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call may not go ahead; returns True for the half-open trial call."""
+        client = get_redis()
+        if client is not None:
+            try:
+                shared_until = float(client.get(CIRCUIT_KEY) or 0)
+                with self.lock:
+                    self.opened_until = max(self.opened_until, shared_until)
+            except redis.RedisError:
+                pass
+
+        with self.lock:
+            now = time.time()
+            if now < self.opened_until:
+                raise CircuitOpenError(f"Gemini circuit open for another {self.opened_until - now:.0f}s")
+            if self.failures >= self.threshold:
+                # Half-open: let a single trial call through
+                if self.trial_in_flight:
+                    raise CircuitOpenError("Gemini circuit half-open, trial call in progress")
+                self.trial_in_flight = True
+                return True
+        return False
+
+    def release_trial(self):
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.failures < self.threshold:
+                return
+            self.opened_until = time.time() + self.reset_timeout
+            opened_until = self.opened_until
+        current_app.logger.warning(f"Gemini circuit opened for {self.reset_timeout}s after {self.failures} consecutive failures")
+        client = get_redis()
+        if client is not None:
+            try:
+                client.set(CIRCUIT_KEY, opened_until, ex=int(self.reset_timeout) + 1)
+            except redis.RedisError:
+                pass
+
+
+_state_lock = threading.Lock()
+_bucket = None
+_breaker = None
+_stats = {'queued': 0, 'admitted': 0, 'rejected': 0, 'short_circuited': 0, 'failures': 0}
+
+
+def _get_bucket():
+    global _bucket
+    with _state_lock:
+        if _bucket is None:
+            per_minute = current_app.config.get('GEMINI_RATE_LIMIT', DEFAULT_RATE_PER_MINUTE)
+            _bucket = TokenBucket(per_minute / 60.0, current_app.config.get('GEMINI_BURST', DEFAULT_BURST))
+        return _bucket
+
+
+def _get_breaker():
+    global _breaker
+    with _state_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                current_app.config.get('GEMINI_BREAKER_THRESHOLD', DEFAULT_BREAKER_THRESHOLD),
+                current_app.config.get('GEMINI_BREAKER_RESET', DEFAULT_BREAKER_RESET)
+            )
+        return _breaker
+
+
+def _count(name, amount=1):
+    with _state_lock:
+        _stats[name] += amount
+    if name == 'queued':
+        return
+    client = get_redis()
+    if client is not None:
+        try:
+            client.hincrby(STATS_KEY, name, amount)
+        except redis.RedisError:
+            pass
+
+
+def acquire(timeout=None):
+    """Block until the shared bucket admits one Gemini call, or raise RateLimitExceeded."""
+    timeout = current_app.config.get('GEMINI_QUEUE_TIMEOUT', DEFAULT_QUEUE_TIMEOUT) if timeout is None else timeout
+    bucket = _get_bucket()
+    deadline = time.monotonic() + timeout
+    _count('queued')
+    try:
+        while True:
+            wait = bucket.take()
+            if wait <= 0:
+                _count('admitted')
+                return
+            if time.monotonic() + wait > deadline:
+                _count('rejected')
+                raise RateLimitExceeded(f"Gemini rate limit queue timeout after {timeout}s")
+            # Jitter keeps waiting processes from retrying in lockstep
+            time.sleep(wait + random.uniform(0, wait / 2))
+    finally:
+        _count('queued', -1)
+
+
+def report_quota_exceeded():
+    """Empty the shared bucket so every process slows down, not just this one."""
+    _get_bucket().take(drain=True)
+
+
+@contextmanager
+def gemini_call():
+    breaker = _get_breaker()
+    try:
+        trial = breaker.before_call()
+    except CircuitOpenError:
+        _count('short_circuited')
+        raise
+    try:
+        acquire()
+    except RateLimitExceeded:
+        if trial:
+            breaker.release_trial()
+        raise
+    try:
+        yield
+    except Exception:
+        _count('failures')
+        breaker.record_failure()
+        raise
+    except BaseException:
+        # e.g. GeneratorExit when a streaming reader goes away mid-answer: no verdict, but the trial slot is freed
+        if trial:
+            breaker.release_trial()
+        raise
+    else:
+        breaker.record_success()
+
+
+def is_quota_error(error):
+    text = f"{type(error).__name__} {error}"
+    return '429' in text or 'ResourceExhausted' in text or 'quota' in text.lower()
+
+
+def get_limiter_stats():
+    with _state_lock:
+        stats = {'local': dict(_stats)}
+    breaker = _breaker
+    stats['circuit_open'] = bool(breaker and time.time() < breaker.opened_until)
+    client = get_redis()
+    if client is not None:
+        try:
+            stats['shared'] = {key.decode(): int(value) for key, value in client.hgetall(STATS_KEY).items()}
+        except redis.RedisError:
+            pass
+    return stats
+
+
+def reset_limiter():
+    global _bucket, _breaker
+    with _state_lock:
+        _bucket = None
+        _breaker = None
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,136 @@
+import base64
+import threading
+
+from cachetools import LRUCache
+from flask import current_app, g
+
+from app.utils.http_client import http_get
+
+DEFAULT_GITHUB_API_BASE = 'https://api.github.com'
+DEFAULT_TIMEOUT = 10  # seconds
+DEFAULT_STATE_CACHE_SIZE = 256  # repositories
+
+# Per-repository ETags, HEAD commit SHA and the content fetched for it; the
+# least recently used repositories are dropped and simply refetched later
+_repo_state = None
+_state_lock = threading.Lock()
+
+
+def _get_repo_state():
+    global _repo_state
+    if _repo_state is None:
+        _repo_state = LRUCache(maxsize=current_app.config.get('REPO_STATE_CACHE_SIZE', DEFAULT_STATE_CACHE_SIZE))
+    return _repo_state
+
+
+def parse_repo_url(repo_url):
+    if not repo_url:
+        raise ValueError("Repository URL is empty")
+    parts = repo_url.strip().rstrip('/').split('/')
+    if len(parts) < 5 or 'github.com' not in parts:
+        raise ValueError(f"Invalid GitHub repository URL: {repo_url}")
+    owner, repo = parts[-2], parts[-1]
+    if repo.endswith('.git'):
+        repo = repo[:-len('.git')]
+    return owner, repo
+
+
+def _api_base():
+    return current_app.config.get('GITHUB_API_BASE', DEFAULT_GITHUB_API_BASE).rstrip('/')
+
+
+def _get(path, etag=None, accept='application/vnd.github+json'):
+    headers = {'Accept': accept}
+    if etag:
+        headers['If-None-Match'] = etag
+    token = current_app.config.get('GITHUB_TOKEN')
+    if token:
+        headers['Authorization'] = f'token {token}'
+    return http_get('github', f"{_api_base()}{path}", headers=headers,
+                    timeout=current_app.config.get('GITHUB_TIMEOUT', DEFAULT_TIMEOUT))
+
+
+def _fetch_readme(owner, repo, state):
+    response = _get(f"/repos/{owner}/{repo}/readme", etag=state.get('readme_etag'))
+    if response.status_code == 304:
+        return state['readme'], state['readme_etag']
+    if response.status_code == 200:
+        readme = base64.b64decode(response.json()['content']).decode('utf-8', errors='replace')
+        return readme, response.headers.get('ETag')
+    current_app.logger.warning(f"Failed to fetch README for {owner}/{repo}. Status code: {response.status_code}")
+    return f"README not found. Status code: {response.status_code}", None
+
+
+def _fetch_tree(owner, repo, sha):
+    response = _get(f"/repos/{owner}/{repo}/git/trees/{sha}?recursive=1")
+    response.raise_for_status()
+    data = response.json()
+    if data.get('truncated'):
+        current_app.logger.warning(f"Tree for {owner}/{repo}@{sha} was truncated by GitHub")
+    return [
+        {'path': entry['path'], 'type': entry['type'], 'sha': entry.get('sha'), 'size': entry.get('size')}
+        for entry in data.get('tree', [])
+    ]
+
+
+def fetch_blob(owner, repo, sha):
+    """Return the text of one blob; blobs are immutable, so callers can cache by ``sha``."""
+    response = _get(f"/repos/{owner}/{repo}/git/blobs/{sha}")
+    response.raise_for_status()
+    data = response.json()
+    if data.get('encoding') == 'base64':
+        return base64.b64decode(data['content']).decode('utf-8', errors='replace')
+    return data.get('content', '')
+
+
+def _fetch(owner, repo):
+    key = f"{owner}/{repo}"
+    with _state_lock:
+        state = dict(_get_repo_state().get(key, {}))
+
+    # A 304 here means HEAD has not moved, so everything cached for it is current
+    response = _get(f"/repos/{owner}/{repo}/commits/HEAD", etag=state.get('head_etag'),
+                    accept='application/vnd.github.sha')
+    if response.status_code == 304 and 'sha' in state:
+        current_app.logger.info(f"Repository {key} unchanged at {state['sha'][:7]}")
+        return state
+    response.raise_for_status()
+    sha = response.text.strip()
+    head_etag = response.headers.get('ETag')
+
+    if sha != state.get('sha'):
+        state['tree'] = _fetch_tree(owner, repo, sha)
+        state['readme'], state['readme_etag'] = _fetch_readme(owner, repo, state)
+    state.update(sha=sha, head_etag=head_etag)
+
+    with _state_lock:
+        _get_repo_state()[key] = state
+    current_app.logger.info(f"Fetched repository {key} at {sha[:7]} ({len(state['tree'])} entries)")
+    return state
+
+
+def fetch_repository(repo_url):
+    """Return ``{'owner', 'repo', 'sha', 'readme', 'tree'}`` for a GitHub repository.
+
+    Results are memoized for the current request or task, and revalidated
+    against GitHub with ETags across runs.
+    """
+    owner, repo = parse_repo_url(repo_url)
+    key = f"{owner}/{repo}"
+    fetched = g.setdefault('_fetched_repositories', {})
+    if key not in fetched:
+        state = _fetch(owner, repo)
+        fetched[key] = {
+            'owner': owner,
+            'repo': repo,
+            'sha': state['sha'],
+            'readme': state['readme'],
+            'tree': state['tree']
+        }
+    return fetched[key]
+
+
+def clear_repository_state():
+    global _repo_state
+    with _state_lock:
+        _repo_state = None
@@ -0,0 +1,212 @@
+import re
+from html import escape
+
+from sqlalchemy import DDL, column, event, text
+from sqlalchemy.orm import undefer
+
+from app import db
+from app.models.code_snippet import CodeSnippet
+from app.models.documentation import Documentation
+
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+# FTS5 marks matches in the raw text; private-use characters stand in for the
+# tags until the fragment has been HTML-escaped
+HIGHLIGHT_OPEN_SENTINEL = '\ue000'
+HIGHLIGHT_CLOSE_SENTINEL = '\ue001'
+
+# user_id is indexed too, so a search reads only the caller's rows out of the
+# index instead of filtering every user's matches afterwards
+SNIPPET_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS code_snippet_fts USING fts5(
+        name_or_title, code, user_id, content='code_snippet', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS code_snippet_fts_ai AFTER INSERT ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(rowid, name_or_title, code, user_id) VALUES (new.id, new.name_or_title, new.code, new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS code_snippet_fts_ad AFTER DELETE ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(code_snippet_fts, rowid, name_or_title, code, user_id) VALUES ('delete', old.id, old.name_or_title, old.code, old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS code_snippet_fts_au AFTER UPDATE OF name_or_title, code, user_id ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(code_snippet_fts, rowid, name_or_title, code, user_id) VALUES ('delete', old.id, old.name_or_title, old.code, old.user_id);
+        INSERT INTO code_snippet_fts(rowid, name_or_title, code, user_id) VALUES (new.id, new.name_or_title, new.code, new.user_id);
+    END""",
+]
+
+DOCUMENTATION_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS documentation_fts USING fts5(
+        content, user_id, content='documentation', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS documentation_fts_ai AFTER INSERT ON documentation BEGIN
+        INSERT INTO documentation_fts(rowid, content, user_id) VALUES (new.id, new.content, new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documentation_fts_ad AFTER DELETE ON documentation BEGIN
+        INSERT INTO documentation_fts(documentation_fts, rowid, content, user_id) VALUES ('delete', old.id, old.content, old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documentation_fts_au AFTER UPDATE OF content, user_id ON documentation BEGIN
+        INSERT INTO documentation_fts(documentation_fts, rowid, content, user_id) VALUES ('delete', old.id, old.content, old.user_id);
+        INSERT INTO documentation_fts(rowid, content, user_id) VALUES (new.id, new.content, new.user_id);
+    END""",
+]
+
+# Keep the index in step with db.create_all() / drop_all() on SQLite; the
+# migration creates the same objects for migrated databases.
+for _table, _statements, _fts in (
+    (CodeSnippet.__table__, SNIPPET_FTS_DDL, 'code_snippet_fts'),
+    (Documentation.__table__, DOCUMENTATION_FTS_DDL, 'documentation_fts'),
+):
+    for _statement in _statements:
+        event.listen(_table, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+    event.listen(_table, 'before_drop', DDL(f'DROP TABLE IF EXISTS {_fts}').execute_if(dialect='sqlite'))
+
+
+def is_fts_available():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def build_fts_query(query):
+    terms = re.findall(r'(\w+)(\*?)', query or '', flags=re.UNICODE)
+    parts = []
+    for index, (term, star) in enumerate(terms):
+        # The last term is always a prefix so results update while typing
+        prefix = star or index == len(terms) - 1
+        parts.append(f'"{term}"' + ('*' if prefix else ''))
+    return ' '.join(parts)
+
+
+def build_user_fts_query(user_id, query, columns):
+    """Match ``query`` in ``columns`` of rows that belong to ``user_id`` only."""
+    return f'user_id : "{int(user_id)}" AND {{{" ".join(columns)}}} : ({build_fts_query(query)})'
+
+
+def render_highlight(fragment):
+    if fragment is None:
+        return None
+    return escape(fragment).replace(HIGHLIGHT_OPEN_SENTINEL, HIGHLIGHT_OPEN).replace(HIGHLIGHT_CLOSE_SENTINEL, HIGHLIGHT_CLOSE)
+
+
+def fts_match_clause(user_id, query):
+    matching_ids = text("""
+        SELECT rowid FROM code_snippet_fts WHERE code_snippet_fts MATCH :snippet_query
+        UNION
+        SELECT d.snippet_id FROM documentation_fts
+        JOIN documentation d ON d.id = documentation_fts.rowid
+        WHERE documentation_fts MATCH :documentation_query
+    """).bindparams(
+        snippet_query=build_user_fts_query(user_id, query, ('name_or_title', 'code')),
+        documentation_query=build_user_fts_query(user_id, query, ('content',))
+    ).columns(column('rowid'))
+    return CodeSnippet.id.in_(matching_ids)
+
+
+def search_snippets(user_id, query, source=None, language=None, min_stars=None, page=1, per_page=10, fields=None):
+    filters = ['s.user_id = :user_id']
+    params = {
+        'user_id': user_id,
+        'snippet_query': build_user_fts_query(user_id, query, ('name_or_title', 'code')),
+        'documentation_query': build_user_fts_query(user_id, query, ('content',)),
+        'open': HIGHLIGHT_OPEN_SENTINEL,
+        'close': HIGHLIGHT_CLOSE_SENTINEL,
+        'limit': per_page,
+        'offset': (page - 1) * per_page
+    }
+    if source:
+        filters.append('s.source = :source')
+        params['source'] = source
+    if language:
+        filters.append('s.language = :language')
+        params['language'] = language
+    if min_stars:
+        filters.append('s.stars >= :min_stars')
+        params['min_stars'] = min_stars
+
+    # BM25 scores from two indexes are not on one scale, so each is divided by
+    # the best score in its own index first; a snippet matching both adds up
+    matches = """
+        WITH code_matches AS (
+            SELECT rowid AS snippet_id,
+                   bm25(code_snippet_fts, 10.0, 1.0, 0.0) AS rank,
+                   highlight(code_snippet_fts, 0, :open, :close) AS title_highlight,
+                   snippet(code_snippet_fts, 1, :open, :close, '...', 16) AS code_highlight
+            FROM code_snippet_fts
+            WHERE code_snippet_fts MATCH :snippet_query
+        ),
+        documentation_matches AS (
+            SELECT d.snippet_id,
+                   bm25(documentation_fts, 1.0, 0.0) AS rank,
+                   snippet(documentation_fts, 0, :open, :close, '...', 16) AS documentation_highlight
+            FROM documentation_fts
+            JOIN documentation d ON d.id = documentation_fts.rowid
+            WHERE documentation_fts MATCH :documentation_query
+        ),
+        matches AS (
+            SELECT snippet_id,
+                   rank / min(rank) OVER () AS code_score,
+                   NULL AS documentation_score,
+                   title_highlight,
+                   code_highlight,
+                   NULL AS documentation_highlight
+            FROM code_matches
+            UNION ALL
+            SELECT snippet_id, NULL, rank / min(rank) OVER (), NULL, NULL, documentation_highlight
+            FROM documentation_matches
+        )
+    """
+    where = ' AND '.join(filters)
+
+    total = db.session.execute(text(matches + f"""
+        SELECT count(DISTINCT m.snippet_id)
+        FROM matches m JOIN code_snippet s ON s.id = m.snippet_id
+        WHERE {where}
+    """), params).scalar()
+
+    rows = db.session.execute(text(matches + f"""
+        SELECT m.snippet_id,
+               coalesce(max(m.code_score), 0) + coalesce(max(m.documentation_score), 0) AS score,
+               max(m.title_highlight) AS title_highlight,
+               max(m.code_highlight) AS code_highlight,
+               max(m.documentation_highlight) AS documentation_highlight
+        FROM matches m JOIN code_snippet s ON s.id = m.snippet_id
+        WHERE {where}
+        GROUP BY m.snippet_id
+        ORDER BY score DESC, m.snippet_id
+        LIMIT :limit OFFSET :offset
+    """), params).fetchall()
+
+    snippet_query = CodeSnippet.query.filter(CodeSnippet.id.in_([row.snippet_id for row in rows]))
+    if fields is None or 'code' in fields:
+        snippet_query = snippet_query.options(undefer(CodeSnippet.code))
+    snippets = {snippet.id: snippet for snippet in snippet_query.all()} if rows else {}
+
+    items = []
+    for row in rows:
+        snippet = snippets.get(row.snippet_id)
+        if snippet is None:
+            continue
+        items.append({
+            **snippet.to_dict(fields),
+            'score': row.score,
+            'highlights': {
+                'name_or_title': render_highlight(row.title_highlight),
+                'code': render_highlight(row.code_highlight),
+                'documentation': render_highlight(row.documentation_highlight)
+            }
+        })
+
+    return items, total
+
+
+def rebuild_search_index():
+    if not is_fts_available():
+        return False
+    with db.engine.begin() as connection:
+        # Dropping first also brings an index created with older columns up to date
+        for name in ('code_snippet_fts', 'documentation_fts'):
+            for suffix in ('ai', 'ad', 'au'):
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {name}_{suffix}"))
+            connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        for statement in SNIPPET_FTS_DDL + DOCUMENTATION_FTS_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO code_snippet_fts(code_snippet_fts) VALUES ('rebuild')"))
+        connection.execute(text("INSERT INTO documentation_fts(documentation_fts) VALUES ('rebuild')"))
+    return True
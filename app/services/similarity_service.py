@@ -0,0 +1,477 @@
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from cachetools import LRUCache
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
+
+from app import db
+from app.models.code_snippet import CodeSnippet
+from app.models.documentation import Documentation
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+DEFAULT_DIMENSIONS = 128
+DEFAULT_CANDIDATES = 200
+DEFAULT_REFRESH_OVERLAP = 60  # seconds
+DEFAULT_COMPACT_RATIO = 0.25
+DEFAULT_OPEN_INDEXES = 32  # each holds three memory maps, and so three file descriptors
+COMPACT_MIN_DEAD_ROWS = 1000
+REFRESH_CHUNK_SIZE = 1000
+INDEX_VERSION = 1
+DELETED_STAMP = -1  # a row with this stamp marks its snippet as deleted
+
+TRIGRAM_WEIGHT = 0.5
+DOCUMENTATION_WEIGHT = 0.5
+# Splits identifiers too: parseHTTPResponse -> parse, HTTP, Response
+TOKEN_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def is_similarity_available():
+    return np is not None
+
+
+def _token_hashes(text):
+    words = [word.lower() for word in TOKEN_PATTERN.findall(text)]
+    tokens = words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+    return np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens), dtype=np.uint32, count=len(tokens))
+
+
+def _trigram_hashes(text):
+    data = np.frombuffer(' '.join(text.lower().split()).encode('utf-8'), dtype=np.uint8).astype(np.uint32)
+    if len(data) < 3:
+        return np.zeros(0, dtype=np.uint32)
+    hashes = (data[:-2] * np.uint32(0x9E3779B1)) ^ (data[1:-1] * np.uint32(0x85EBCA77)) ^ (data[2:] * np.uint32(0xC2B2AE3D))
+    hashes ^= hashes >> np.uint32(15)
+    hashes *= np.uint32(0x2C1B3C6D)
+    hashes ^= hashes >> np.uint32(12)
+    return hashes
+
+
+def _project(hashes, dimensions):
+    """Signed feature hashing with sublinear term counts, scaled to unit length."""
+    if not len(hashes):
+        return np.zeros(dimensions)
+    features, counts = np.unique(hashes, return_counts=True)
+    weights = (1.0 + np.log(counts)) * np.where(features & np.uint32(0x80000000), -1.0, 1.0)
+    vector = np.bincount((features % np.uint32(dimensions)).astype(np.intp), weights=weights, minlength=dimensions)
+    return _unit(vector)
+
+
+def _unit(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_text(text, dimensions):
+    """Hashed word, word-bigram and character-trigram features of ``text``."""
+    text = text or ''
+    return _unit(_project(_token_hashes(text), dimensions) + TRIGRAM_WEIGHT * _project(_trigram_hashes(text), dimensions))
+
+
+def embed_snippet(title, code, documentation, dimensions):
+    vector = embed_text(f"{title or ''}\n{code or ''}", dimensions)
+    if documentation:
+        vector = vector + DOCUMENTATION_WEIGHT * embed_text(documentation, dimensions)
+    return _unit(vector).astype(np.float32)
+
+
+def _stamp(value):
+    return int(value.timestamp() * 1000000) if value else 0
+
+
+class IndexState:
+    """Arrays of one loaded generation; replaced as a whole so searches never see a partial update."""
+
+    def __init__(self, ids, stamps, vectors, live):
+        self.ids = ids
+        self.stamps = stamps
+        self.vectors = vectors
+        self.live = live
+
+
+class SimilarityIndex:
+    """One user's snippet vectors in append-only files, memory-mapped for search.
+
+    ``meta.json`` names the current generation of ``ids``, ``stamps`` and
+    ``vectors`` files. A changed snippet is appended again and the newest row
+    for an id wins, and a deleted one gets a ``DELETED_STAMP`` row; compaction
+    writes the live rows to a new generation and switches ``meta.json`` over
+    atomically, so readers never see a mix.
+    """
+
+    def __init__(self, path, dimensions):
+        self.path = path
+        self.dimensions = dimensions
+        self.lock = threading.Lock()
+        self.meta = self._default_meta()
+        self.state = self._empty_state()
+        self._signature = None
+
+    def _default_meta(self, generation=0):
+        return {'version': INDEX_VERSION, 'dimensions': self.dimensions, 'generation': generation,
+                'max_snippet_id': 0, 'refreshed_at': None}
+
+    def _empty_state(self):
+        return IndexState(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                          np.zeros((0, self.dimensions), dtype=np.float32), np.zeros(0, dtype=bool))
+
+    def __len__(self):
+        return len(self.state.ids)
+
+    def close(self):
+        """Drop the memory maps; a later ``load`` maps the files again."""
+        self.meta, self.state, self._signature = self._default_meta(), self._empty_state(), None
+
+    def _file(self, name, generation=None):
+        return os.path.join(self.path, name if generation is None else f'{name}-{generation}')
+
+    def _read_meta(self):
+        try:
+            with open(self._file('meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != INDEX_VERSION or meta.get('dimensions') != self.dimensions:
+            return None
+        return meta
+
+    def _write_meta(self):
+        temporary = self._file('meta.json.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(temporary, self._file('meta.json'))
+
+    def _remove_generations(self, keep=None):
+        for name in os.listdir(self.path):
+            prefix, _, generation = name.partition('-')
+            if prefix in ('ids', 'stamps', 'vectors') and generation != str(keep):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def _rows_on_disk(self, generation):
+        def rows(name, width):
+            try:
+                return os.path.getsize(self._file(name, generation)) // width
+            except OSError:
+                return 0
+        # ids are written last, so a row counts only once its id is on disk
+        return min(rows('ids', 8), rows('stamps', 8), rows('vectors', 4 * self.dimensions))
+
+    def _signature_now(self):
+        try:
+            stat = os.stat(self._file('meta.json'))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, self._rows_on_disk(self.meta['generation'])
+
+    def load(self):
+        """Map the files again if any process changed them since the last look."""
+        signature = self._signature_now()
+        if signature is not None and signature == self._signature:
+            return
+        meta = self._read_meta()
+        if meta is None:
+            self.meta, self.state, self._signature = self._default_meta(), self._empty_state(), None
+            return
+        start = len(self) if meta['generation'] == self.meta['generation'] and self._signature else 0
+        self.meta = meta
+        rows = self._rows_on_disk(meta['generation'])
+        self.state = self._map(rows, min(start, rows))
+        self._signature = self._signature_now()
+
+    def _map(self, rows, start):
+        if not rows:
+            return self._empty_state()
+        generation = self.meta['generation']
+        ids = np.memmap(self._file('ids', generation), dtype=np.int64, mode='r', shape=(rows,))
+        stamps = np.memmap(self._file('stamps', generation), dtype=np.int64, mode='r', shape=(rows,))
+        vectors = np.memmap(self._file('vectors', generation), dtype=np.float32, mode='r', shape=(rows, self.dimensions))
+        # Rows before `start` were resolved on an earlier load; a newer row for the same id supersedes them
+        live = np.zeros(rows, dtype=bool)
+        live[:start] = self.state.live[:start]
+        tail = np.asarray(ids[start:])
+        if len(tail):
+            tail_ids, last = np.unique(tail[::-1], return_index=True)
+            newest = start + len(tail) - 1 - last
+            live[newest] = stamps[newest] != DELETED_STAMP
+            if start:
+                live[:start] &= ~np.isin(ids[:start], tail_ids)
+        return IndexState(ids, stamps, vectors, live)
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file('lock'), 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def stamps_for(self, snippet_ids):
+        state = self.state
+        mask = state.live & np.isin(state.ids, snippet_ids)
+        return dict(zip(state.ids[mask].tolist(), state.stamps[mask].tolist()))
+
+    def vector_for(self, snippet_id):
+        state = self.state
+        rows = np.flatnonzero(state.live & (state.ids == snippet_id))
+        return np.array(state.vectors[rows[0]]) if len(rows) else None
+
+    def reset(self):
+        """Start an empty generation, e.g. before a full rebuild."""
+        with self._file_lock():
+            self.load()
+            self.meta = self._default_meta(self.meta['generation'] + 1)
+            self._write_meta()
+            self._remove_generations(keep=self.meta['generation'])
+            self.load()
+
+    def update(self, snippet_ids, stamps, vectors, meta):
+        """Append rows and merge ``meta`` under the cross-process file lock."""
+        with self._file_lock():
+            self.load()
+            if self._read_meta() is None:
+                # Missing, or built with other settings: start over
+                self._remove_generations()
+                self.meta = self._default_meta()
+            generation = self.meta['generation']
+            # Cut back any half-written row left by a crashed writer before appending
+            rows = self._rows_on_disk(generation)
+            for name, array, width in (('vectors', vectors, 4 * self.dimensions), ('stamps', stamps, 8), ('ids', snippet_ids, 8)):
+                with open(self._file(name, generation), 'ab') as f:
+                    f.truncate(rows * width)
+                    f.write(np.ascontiguousarray(array).tobytes())
+            self.meta.update(meta)
+            self._write_meta()
+            self.load()
+            self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        state = self.state
+        dead = len(state.live) - int(state.live.sum())
+        ratio = current_app.config.get('SIMILARITY_COMPACT_RATIO', DEFAULT_COMPACT_RATIO)
+        if dead < COMPACT_MIN_DEAD_ROWS or dead < ratio * len(state.live):
+            return
+        generation = self.meta['generation'] + 1
+        for name, array in (('vectors', state.vectors), ('stamps', state.stamps), ('ids', state.ids)):
+            np.asarray(array)[state.live].tofile(self._file(name, generation))
+        self.meta['generation'] = generation
+        self._write_meta()
+        # Processes still mapping the old files keep reading them until their next load
+        self._remove_generations(keep=generation)
+        self._signature = None
+        self.load()
+
+    def search(self, vector, k, exclude=None):
+        """Top ``k`` ``(snippet_id, cosine)`` pairs; vectors are unit length, so a dot product suffices."""
+        state = self.state
+        if not len(state.ids) or k <= 0:
+            return []
+        scores = np.asarray(state.vectors @ vector.astype(np.float32))
+        scores[~state.live] = -np.inf
+        if exclude is not None:
+            scores[state.ids == exclude] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(state.ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+class _IndexCache(LRUCache):
+    def popitem(self):
+        key, index = super().popitem()
+        # Searches already running keep their own reference to the old maps
+        index.close()
+        return key, index
+
+
+_indexes = None
+_indexes_lock = threading.Lock()
+
+
+def get_index_dir():
+    return current_app.config.get('SIMILARITY_INDEX_DIR') or os.path.join(current_app.instance_path, 'similarity')
+
+
+def get_similarity_index(user_id):
+    path = os.path.join(get_index_dir(), str(user_id))
+    dimensions = current_app.config.get('SIMILARITY_DIMENSIONS', DEFAULT_DIMENSIONS)
+    global _indexes
+    with _indexes_lock:
+        if _indexes is None:
+            _indexes = _IndexCache(maxsize=current_app.config.get('SIMILARITY_OPEN_INDEXES', DEFAULT_OPEN_INDEXES))
+        index = _indexes.get(path)
+        if index is None or index.dimensions != dimensions:
+            index = _indexes[path] = SimilarityIndex(path, dimensions)
+    return index
+
+
+def clear_similarity_indexes():
+    global _indexes
+    with _indexes_lock:
+        if _indexes is not None:
+            for index in _indexes.values():
+                index.close()
+        _indexes = None
+
+
+def _changed_snippet_ids(user_id, meta):
+    """Ids added since the last refresh, plus ids whose snippet or documentation was updated."""
+    if not meta.get('refreshed_at'):
+        return None
+    since = datetime.fromisoformat(meta['refreshed_at']) - timedelta(
+        seconds=current_app.config.get('SIMILARITY_REFRESH_OVERLAP', DEFAULT_REFRESH_OVERLAP))
+    snippet_ids = {id for (id,) in db.session.query(CodeSnippet.id).filter(
+        CodeSnippet.user_id == user_id, CodeSnippet.id > meta.get('max_snippet_id', 0))}
+    snippet_ids.update(id for (id,) in db.session.query(CodeSnippet.id).filter(
+        CodeSnippet.user_id == user_id, CodeSnippet.updated_at > since))
+    snippet_ids.update(id for (id,) in db.session.query(Documentation.snippet_id).filter(
+        Documentation.user_id == user_id, Documentation.updated_at > since))
+    return sorted(snippet_ids)
+
+
+def _deleted_snippet_ids(user_id, index):
+    """Live ids in ``index`` whose snippet is gone.
+
+    The ids are only compared when the index holds more live rows than the
+    user has snippets, so a refresh without deletions costs one COUNT.
+    """
+    state = index.state
+    live = int(state.live.sum())
+    if not live or live <= db.session.query(func.count(CodeSnippet.id)).filter(CodeSnippet.user_id == user_id).scalar():
+        return []
+    existing = np.fromiter((id for (id,) in db.session.query(CodeSnippet.id).filter(CodeSnippet.user_id == user_id)),
+                           dtype=np.int64)
+    indexed = np.asarray(state.ids[state.live])
+    return indexed[~np.isin(indexed, existing)].tolist()
+
+
+def _iter_snippet_chunks(user_id, snippet_ids):
+    query = CodeSnippet.query.options(undefer(CodeSnippet.code)).filter(CodeSnippet.user_id == user_id)
+    if snippet_ids is None:
+        # Everything, walked in id order so each chunk is an index range
+        last_id = 0
+        while True:
+            chunk = query.filter(CodeSnippet.id > last_id).order_by(CodeSnippet.id).limit(REFRESH_CHUNK_SIZE).all()
+            if not chunk:
+                return
+            last_id = chunk[-1].id
+            yield chunk
+    else:
+        for start in range(0, len(snippet_ids), REFRESH_CHUNK_SIZE):
+            yield query.filter(CodeSnippet.id.in_(snippet_ids[start:start + REFRESH_CHUNK_SIZE])).all()
+
+
+def refresh_similarity_index(user_id, full=False):
+    """Bring a user's index up to date with the database and return it.
+
+    Only snippets added since the last refresh, or whose snippet or
+    documentation row was updated since, are embedded again; one whose
+    timestamps match its indexed row is left alone. Deleted snippets are
+    marked dead and dropped at the next compaction.
+    """
+    index = get_similarity_index(user_id)
+    overlap = current_app.config.get('SIMILARITY_REFRESH_OVERLAP', DEFAULT_REFRESH_OVERLAP)
+    with index.lock:
+        index.load()
+        if full:
+            index.reset()
+        started = datetime.utcnow()
+        snippet_ids = _changed_snippet_ids(user_id, index.meta) if len(index) else None
+        max_snippet_id = index.meta['max_snippet_id']
+        appended = False
+        for chunk in _iter_snippet_chunks(user_id, snippet_ids):
+            chunk_ids = [snippet.id for snippet in chunk]
+            documentation = {}
+            for snippet_id, content, updated_at in db.session.query(
+                    Documentation.snippet_id, Documentation.content, Documentation.updated_at
+            ).filter(Documentation.snippet_id.in_(chunk_ids)).order_by(Documentation.id):
+                contents, stamp = documentation.get(snippet_id, ([], 0))
+                documentation[snippet_id] = (contents + [content], max(stamp, _stamp(updated_at)))
+
+            known = index.stamps_for(chunk_ids)
+            ids, stamps, vectors = [], [], []
+            for snippet in chunk:
+                contents, doc_stamp = documentation.get(snippet.id, ([], 0))
+                stamp = max(_stamp(snippet.updated_at), doc_stamp)
+                max_snippet_id = max(max_snippet_id, snippet.id)
+                if known.get(snippet.id) == stamp:
+                    continue
+                ids.append(snippet.id)
+                stamps.append(stamp)
+                vectors.append(embed_snippet(snippet.name_or_title, snippet.code, '\n\n'.join(contents), index.dimensions))
+            if ids:
+                index.update(np.array(ids, dtype=np.int64), np.array(stamps, dtype=np.int64), np.vstack(vectors),
+                             {'max_snippet_id': max_snippet_id})
+                appended = True
+
+        deleted = _deleted_snippet_ids(user_id, index)
+        if deleted:
+            index.update(np.array(deleted, dtype=np.int64), np.full(len(deleted), DELETED_STAMP, dtype=np.int64),
+                         np.zeros((len(deleted), index.dimensions), dtype=np.float32), {})
+            appended = True
+
+        refreshed_at = index.meta.get('refreshed_at')
+        # Advancing the watermark rewrites meta.json, so skip it while the overlap window still covers it
+        if appended or not refreshed_at or datetime.fromisoformat(refreshed_at) < started - timedelta(seconds=overlap):
+            index.update(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                         np.zeros((0, index.dimensions), dtype=np.float32),
+                         {'max_snippet_id': max_snippet_id, 'refreshed_at': started.isoformat()})
+    return index
+
+
+def similar_snippets(user_id, text=None, snippet_id=None, source=None, language=None, min_stars=None,
+                     page=1, per_page=10, fields=None):
+    """Snippets most like ``snippet_id`` or ``text``, best first; returns ``(items, total)``.
+
+    The top ``SIMILARITY_CANDIDATES`` come from the index, and filters and
+    pages apply to those, so ``total`` never exceeds that number.
+    """
+    index = refresh_similarity_index(user_id)
+    if snippet_id is not None:
+        vector = index.vector_for(snippet_id)
+        if vector is None:
+            raise LookupError(f"Snippet {snippet_id} not found")
+    else:
+        vector = embed_text(text, index.dimensions)
+
+    candidates = index.search(vector, current_app.config.get('SIMILARITY_CANDIDATES', DEFAULT_CANDIDATES),
+                              exclude=snippet_id)
+    if not candidates:
+        return [], 0
+    query = CodeSnippet.query.filter(CodeSnippet.user_id == user_id,
+                                     CodeSnippet.id.in_([id for id, _ in candidates]))
+    if source:
+        query = query.filter(CodeSnippet.source == source)
+    if language:
+        query = query.filter(CodeSnippet.language == language)
+    if min_stars:
+        query = query.filter(CodeSnippet.stars >= min_stars)
+    if fields is None or 'code' in fields:
+        query = query.options(undefer(CodeSnippet.code))
+    snippets = {snippet.id: snippet for snippet in query}
+
+    ranked = [(snippets[id], score) for id, score in candidates if id in snippets]
+    offset = (page - 1) * per_page
+    items = [{**snippet.to_dict(fields), 'score': round(score, 4)} for snippet, score in ranked[offset:offset + per_page]]
+    return items, len(ranked)
@@ -0,0 +1,117 @@
+from datetime import datetime
+
+from sqlalchemy import and_, exists, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.code_snippet import CodeSnippet
+from app.services.stats_service import rebuild_user_stats, record_snippets_added
+
+URL_LOOKUP_CHUNK_SIZE = 5000
+
+
+def _on_conflict_do_nothing(table, conflict_columns):
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=conflict_columns)
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=conflict_columns)
+    return None
+
+
+def _insert_unless_duplicate(session, table, conflict_columns, row):
+    # Dialects without ON CONFLICT: one SAVEPOINT per row, and only a clash on
+    # ``conflict_columns`` is swallowed; any other integrity error is re-raised
+    try:
+        with session.begin_nested():
+            return session.execute(table.insert(), row).inserted_primary_key[0]
+    except IntegrityError:
+        duplicate = and_(*(table.c[column] == row[column] for column in conflict_columns))
+        if session.execute(select(exists().where(duplicate))).scalar():
+            return None
+        raise
+
+
+def insert_ignoring_duplicates(session, table, conflict_columns, rows):
+    """Insert ``rows``, skipping any that clash on ``conflict_columns``; returns how many went in.
+
+    SQLite and PostgreSQL do this in one ``ON CONFLICT DO NOTHING`` statement,
+    whose rowcount may be -1 if the driver cannot tell. Other dialects insert
+    row by row.
+    """
+    statement = _on_conflict_do_nothing(table, conflict_columns)
+    if statement is not None:
+        return session.execute(statement, rows).rowcount
+    return sum(_insert_unless_duplicate(session, table, conflict_columns, row) is not None for row in rows)
+
+
+def insert_one_ignoring_duplicate(session, table, conflict_columns, row):
+    """Insert ``row`` and return its primary key, or None if it clashes on ``conflict_columns``."""
+    statement = _on_conflict_do_nothing(table, conflict_columns)
+    if statement is None:
+        return _insert_unless_duplicate(session, table, conflict_columns, row)
+    result = session.execute(statement, row)
+    return result.inserted_primary_key[0] if result.rowcount else None
+
+
+def find_existing_urls(session, user_id, urls):
+    existing = set()
+    urls = list(urls)
+    for start in range(0, len(urls), URL_LOOKUP_CHUNK_SIZE):
+        chunk = urls[start:start + URL_LOOKUP_CHUNK_SIZE]
+        existing.update(url for (url,) in session.query(CodeSnippet.url).filter(
+            CodeSnippet.user_id == user_id,
+            CodeSnippet.url.in_(chunk)
+        ))
+    return existing
+
+
+def build_gathered_row(user_id, item, now):
+    is_repo = 'github.com' in item.get('url', '')
+    return {
+        'user_id': user_id,
+        'url': item.get('url', ''),
+        'name_or_title': item.get('name_or_title', 'Untitled'),
+        'language': item.get('language', 'Unknown'),
+        'code': item['url'] if is_repo else item.get('code', ''),
+        'stars': item.get('stars', 0),
+        'source': item.get('source', 'Unknown'),
+        'created_at': now,
+        'updated_at': now,
+        'is_user_submitted': False,
+        'has_documentation': False,
+        'is_repo': is_repo
+    }
+
+
+def store_gathered_snippets(user_id, items):
+    """Insert gathered items the user does not have yet; returns how many were inserted.
+
+    Existing URLs are found with one batched lookup and the insert skips
+    anything that raced in since, via the unique ``(user_id, url)`` index, so
+    the count comes from the statement's rowcount rather than the rows tried.
+    """
+    unique_items = {}
+    for item in items:
+        if item.get('url'):
+            unique_items.setdefault(item['url'], item)
+    if not unique_items:
+        return 0
+
+    now = datetime.utcnow()
+    inserted = 0
+    with Session(db.engine) as session:
+        existing = find_existing_urls(session, user_id, unique_items.keys())
+        rows = [build_gathered_row(user_id, item, now) for url, item in unique_items.items() if url not in existing]
+        if rows:
+            rowcount = insert_ignoring_duplicates(session, CodeSnippet.__table__, ['user_id', 'url'], rows)
+            inserted = max(rowcount, 0)
+            if rowcount == len(rows):
+                record_snippets_added(session, user_id, rows)
+            else:
+                # Some rows lost a race (or the driver cannot tell); recount this user
+                rebuild_user_stats(session, user_id)
+            session.commit()
+    return inserted
@@ -1,10 +1,22 @@
-import requests
+import httpx
 from flask import current_app
 
-def gather_data_from_stackoverflow(api_url):
+from app.utils.http_client import http_get
+
+def gather_data_from_stackoverflow(api_url, page=1, since=None, until=None, per_page=None, raise_errors=False):
+    """Fetch one page of questions; with ``since`` (and ``until``, epoch
+    seconds, both inclusive) only questions active in that window, oldest first."""
     stackoverflow_data = []
+    params = {'page': page}
+    if since is not None:
+        # With sort=activity, min and max filter on last_activity_date, the same field the pages are ordered by
+        params.update(sort='activity', order='asc', min=since)
+        if until is not None:
+            params['max'] = until
+    if per_page:
+        params['pagesize'] = per_page
     try:
-        response = requests.get(api_url)
+        response = http_get('stackoverflow', api_url, params=params)
         response.raise_for_status()
         items = response.json()['items']
         for item in items:
@@ -22,6 +34,8 @@ def gather_data_from_stackoverflow(api_url):
                 'stars': stars
             })
         current_app.logger.info(f"Successfully gathered {len(stackoverflow_data)} items from StackOverflow")
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         current_app.logger.error(f"Error fetching data from StackOverflow: {str(e)}")
-    return stackoverflow_data
\ No newline at end of file
+        if raise_errors:
+            raise
+    return stackoverflow_data
@@ -0,0 +1,136 @@
+from collections import Counter
+
+from sqlalchemy import case, func, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models.code_snippet import CodeSnippet
+from app.models.user_stats import UserSnippetStats
+
+ALL = 'all'
+UNKNOWN = 'Unknown'
+DIMENSIONS = ('language', 'source')
+KEY_COLUMNS = ('user_id', 'is_user_submitted', 'dimension', 'value')
+
+
+def _get(snippet, name):
+    return snippet.get(name) if isinstance(snippet, dict) else getattr(snippet, name)
+
+
+def _stat_keys(user_id, snippet):
+    is_user_submitted = bool(_get(snippet, 'is_user_submitted'))
+    yield (user_id, is_user_submitted, ALL, ALL)
+    for dimension in DIMENSIONS:
+        yield (user_id, is_user_submitted, dimension, _get(snippet, dimension) or UNKNOWN)
+
+
+def _apply(session, totals, documented):
+    keys = set(totals) | set(documented)
+    if not keys:
+        return
+    rows = []
+    for key in sorted(keys):
+        row = dict(zip(KEY_COLUMNS, key))
+        row.update(total=totals[key], documented=documented[key])
+        rows.append(row)
+
+    table = UserSnippetStats.__table__
+    dialect = session.bind.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        session.execute(insert.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                'total': table.c.total + insert.excluded.total,
+                'documented': table.c.documented + insert.excluded.documented
+            }
+        ), rows)
+        return
+
+    for row in rows:
+        key_filter = [table.c[name] == row[name] for name in KEY_COLUMNS]
+        updated = session.execute(table.update().where(*key_filter).values(
+            total=table.c.total + row['total'],
+            documented=table.c.documented + row['documented']
+        ))
+        if updated.rowcount == 0:
+            session.execute(table.insert(), [row])
+
+
+def record_snippets_added(session, user_id, snippets):
+    """Count newly inserted snippets, in the caller's transaction."""
+    totals, documented = Counter(), Counter()
+    for snippet in snippets:
+        for key in _stat_keys(user_id, snippet):
+            totals[key] += 1
+            if _get(snippet, 'has_documentation'):
+                documented[key] += 1
+    _apply(session, totals, documented)
+
+
+def record_snippets_documented(session, snippets):
+    """Count snippets that just gained documentation, in the caller's transaction."""
+    documented = Counter()
+    for snippet in snippets:
+        for key in _stat_keys(_get(snippet, 'user_id'), snippet):
+            documented[key] += 1
+    _apply(session, Counter(), documented)
+
+
+def mark_snippets_documented(session, snippets):
+    """Set ``has_documentation`` and count the snippets this call flipped; returns them.
+
+    Each flag changes with a conditional UPDATE, so when two workers document
+    the same snippet only the one whose UPDATE matched counts it.
+    """
+    table = CodeSnippet.__table__
+    flipped = []
+    for snippet in snippets:
+        result = session.execute(table.update().where(
+            table.c.id == snippet.id,
+            table.c.has_documentation.isnot(True)
+        ).values(has_documentation=True))
+        if result.rowcount == 1:
+            flipped.append(snippet)
+        if isinstance(snippet, CodeSnippet):
+            # Already written above, so the ORM must not flush it again
+            set_committed_value(snippet, 'has_documentation', True)
+    record_snippets_documented(session, flipped)
+    return flipped
+
+
+def rebuild_user_stats(session, user_id=None):
+    """Recompute the stats from ``code_snippet``, for one user or everyone."""
+    table = UserSnippetStats.__table__
+    delete = table.delete()
+    if user_id is not None:
+        delete = delete.where(table.c.user_id == user_id)
+    session.execute(delete)
+
+    documented = func.sum(case((CodeSnippet.has_documentation.is_(True), 1), else_=0))
+    is_user_submitted = func.coalesce(CodeSnippet.is_user_submitted, False)
+    groupings = [(ALL, None)] + [(dimension, func.coalesce(getattr(CodeSnippet, dimension), UNKNOWN)) for dimension in DIMENSIONS]
+    for dimension, value in groupings:
+        group_by = [CodeSnippet.user_id, is_user_submitted] + ([value] if value is not None else [])
+        select = db.select(
+            CodeSnippet.user_id, is_user_submitted, literal(dimension), value if value is not None else literal(ALL),
+            func.count(), documented
+        ).group_by(*group_by)
+        if user_id is not None:
+            select = select.where(CodeSnippet.user_id == user_id)
+        session.execute(table.insert().from_select(list(KEY_COLUMNS) + ['total', 'documented'], select))
+
+
+def get_user_stats(user_id, is_user_submitted=True):
+    stats = {'total': 0, 'documented': 0, 'languages': {}, 'sources': {}}
+    rows = UserSnippetStats.query.filter_by(user_id=user_id, is_user_submitted=is_user_submitted)
+    for row in rows:
+        counts = {'total': row.total, 'documented': row.documented}
+        if row.dimension == ALL:
+            stats.update(counts)
+        elif row.dimension == 'language':
+            stats['languages'][row.value] = counts
+        elif row.dimension == 'source':
+            stats['sources'][row.value] = counts
+    return stats
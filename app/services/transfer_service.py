@@ -0,0 +1,233 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.code_snippet import CodeSnippet
+from app.models.documentation import Documentation, Project
+from app.services.snippet_service import find_existing_urls, insert_ignoring_duplicates, insert_one_ignoring_duplicate
+from app.services.stats_service import rebuild_user_stats, record_snippets_added
+from app.utils.serialization import dumps, loads
+
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+DEFAULT_IMPORT_CHUNK_SIZE = 500
+DEFAULT_IMPORT_MAX_LINE_BYTES = 4 * 1024 * 1024
+
+EXPORT_FIELDS = tuple(field for field in CodeSnippet.FIELDS if field not in ('id', 'user_id', 'project_id'))
+DATETIME_FIELDS = ('created_at', 'updated_at')
+TEXT_FIELDS = ('url', 'name_or_title', 'language', 'code', 'source')
+
+
+class InvalidImport(ValueError):
+    def __init__(self, message, line_number=None):
+        super().__init__(f"Line {line_number}: {message}" if line_number else message)
+        self.line_number = line_number
+        self.imported = None
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _export_line(record):
+    return dumps(record) + b'\n'
+
+
+def export_user_data(user_id, batch_size=None):
+    """Yield a user's snippets as NDJSON lines, one snippet per line with its documentation nested.
+
+    Rows are fetched ``EXPORT_BATCH_SIZE`` at a time from a server-side cursor,
+    so memory stays flat however many snippets the user has.
+    """
+    batch_size = batch_size or current_app.config.get('EXPORT_BATCH_SIZE', DEFAULT_EXPORT_BATCH_SIZE)
+    snippet = CodeSnippet.__table__
+    documentation = Documentation.__table__
+    project = Project.__table__
+    query = (
+        select(
+            snippet.c.id,
+            *[snippet.c[field] for field in EXPORT_FIELDS],
+            project.c.name.label('project'),
+            documentation.c.id.label('documentation_id'),
+            documentation.c.content.label('documentation_content'),
+            documentation.c.created_at.label('documentation_created_at'),
+            documentation.c.updated_at.label('documentation_updated_at')
+        )
+        .select_from(snippet)
+        .outerjoin(project, project.c.id == snippet.c.project_id)
+        .outerjoin(documentation, documentation.c.snippet_id == snippet.c.id)
+        .where(snippet.c.user_id == user_id)
+        .order_by(snippet.c.id, documentation.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    # Documentation rows arrive next to their snippet, so each line is complete once the id changes
+    current_id, record = None, None
+    for row in db.session.execute(query):
+        if row.id != current_id:
+            if record is not None:
+                yield _export_line(record)
+            current_id = row.id
+            record = {'type': 'snippet', 'id': row.id, 'project': row.project, 'documentation': []}
+            record.update((field, _isoformat(row._mapping[field])) for field in EXPORT_FIELDS)
+        if row.documentation_id is not None:
+            record['documentation'].append({
+                'content': row.documentation_content,
+                'created_at': _isoformat(row.documentation_created_at),
+                'updated_at': _isoformat(row.documentation_updated_at)
+            })
+    if record is not None:
+        yield _export_line(record)
+
+
+def iter_ndjson(stream, max_line_bytes=None):
+    """Yield ``(line_number, record)`` from a binary NDJSON stream, one line in memory at a time."""
+    max_line_bytes = max_line_bytes or current_app.config.get('IMPORT_MAX_LINE_BYTES', DEFAULT_IMPORT_MAX_LINE_BYTES)
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_line_bytes:
+            raise InvalidImport(f"longer than {max_line_bytes} bytes", line_number)
+        if not line.strip():
+            continue
+        try:
+            yield line_number, loads(line)
+        except ValueError as e:
+            raise InvalidImport(f"invalid JSON ({str(e)})", line_number) from e
+
+
+def _parse_datetime(value, now, line_number):
+    if value is None:
+        return now
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidImport(f"invalid timestamp {value!r}", line_number)
+
+
+def _parse_record(user_id, line_number, record, now):
+    if not isinstance(record, dict) or record.get('type', 'snippet') != 'snippet':
+        raise InvalidImport('expected a snippet object', line_number)
+    documentation = record.get('documentation') or []
+    if not isinstance(documentation, list) or not all(
+            isinstance(doc, dict) and isinstance(doc.get('content'), str) for doc in documentation):
+        raise InvalidImport('documentation must be a list of objects with content', line_number)
+    if not isinstance(record.get('project', ''), (str, type(None))):
+        raise InvalidImport('project must be a name', line_number)
+    for field in TEXT_FIELDS:
+        if not isinstance(record.get(field), (str, type(None))):
+            raise InvalidImport(f'{field} must be a string', line_number)
+    stars = record.get('stars')
+    if stars is not None and (isinstance(stars, bool) or not isinstance(stars, int)):
+        raise InvalidImport('stars must be an integer', line_number)
+
+    row = {field: record.get(field) for field in EXPORT_FIELDS}
+    row.update(
+        user_id=user_id,
+        stars=record.get('stars') or 0,
+        is_user_submitted=bool(record.get('is_user_submitted')),
+        has_documentation=bool(record.get('has_documentation') or documentation),
+        is_repo=bool(record.get('is_repo'))
+    )
+    for field in DATETIME_FIELDS:
+        row[field] = _parse_datetime(row[field], now, line_number)
+    docs = [
+        {'content': doc['content'], **{field: _parse_datetime(doc.get(field), now, line_number) for field in DATETIME_FIELDS}}
+        for doc in documentation
+    ]
+    return row, record.get('project'), docs
+
+
+def _resolve_projects(session, user_id, names, projects):
+    missing = [name for name in names if name not in projects]
+    if not missing:
+        return
+    projects.update(session.query(Project.name, Project.id).filter(
+        Project.user_id == user_id,
+        Project.name.in_(missing)
+    ))
+    table = Project.__table__
+    for name in missing:
+        if name not in projects:
+            result = session.execute(table.insert(), {'name': name, 'user_id': user_id, 'created_at': datetime.utcnow()})
+            projects[name] = result.inserted_primary_key[0]
+
+
+def _import_chunk(session, user_id, chunk, projects, summary):
+    now = datetime.utcnow()
+    parsed = [_parse_record(user_id, line_number, record, now) for line_number, record in chunk]
+    _resolve_projects(session, user_id, {name for _, name, _ in parsed if name}, projects)
+
+    existing = find_existing_urls(session, user_id, {row['url'] for row, _, _ in parsed if row['url']})
+    plain, documented = [], []
+    for row, project_name, docs in parsed:
+        if row['url'] and row['url'] in existing:
+            summary['skipped'] += 1
+            continue
+        if row['url']:
+            existing.add(row['url'])
+        row['project_id'] = projects.get(project_name)
+        (documented if docs else plain).append((row, docs))
+
+    table, conflict_columns = CodeSnippet.__table__, ['user_id', 'url']
+    inserted, added, exact = [], 0, True
+    if plain:
+        rows = [row for row, _ in plain]
+        rowcount = insert_ignoring_duplicates(session, table, conflict_columns, rows)
+        inserted.extend(rows)
+        exact = rowcount == len(rows)
+        added += len(rows) if exact else max(rowcount, 0)
+
+    # Documentation needs the new snippet id, so these go one statement at a time
+    doc_rows = []
+    for row, docs in documented:
+        snippet_id = insert_one_ignoring_duplicate(session, table, conflict_columns, row)
+        if snippet_id is None:
+            summary['skipped'] += 1
+            continue
+        inserted.append(row)
+        added += 1
+        doc_rows.extend({**doc, 'user_id': user_id, 'project_id': row['project_id'],
+                         'snippet_id': snippet_id} for doc in docs)
+    if doc_rows:
+        session.execute(Documentation.__table__.insert(), doc_rows)
+
+    if exact:
+        record_snippets_added(session, user_id, inserted)
+    else:
+        # Some rows raced in since the lookup (or the driver cannot tell); recount this user
+        rebuild_user_stats(session, user_id)
+    session.commit()
+    summary['snippets'] += added
+    summary['documentation'] += len(doc_rows)
+
+
+def import_user_data(user_id, records, chunk_size=None):
+    """Insert ``(line_number, record)`` pairs from ``iter_ndjson`` in bulk, committing every chunk.
+
+    Snippets whose URL the user already has are skipped. A bad line stops the
+    import; chunks before it stay committed and are reported on the error.
+    """
+    chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_IMPORT_CHUNK_SIZE)
+    summary = {'snippets': 0, 'documentation': 0, 'skipped': 0}
+    projects = {}
+    with Session(db.engine) as session:
+        try:
+            chunk = []
+            for item in records:
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    _import_chunk(session, user_id, chunk, projects, summary)
+                    chunk = []
+            if chunk:
+                _import_chunk(session, user_id, chunk, projects, summary)
+        except InvalidImport as e:
+            session.rollback()
+            e.imported = summary
+            raise
+    return summary
@@ -1,12 +1,108 @@
+from flask import current_app
+from sqlalchemy.orm import undefer
+
 from app import celery, db
 from app.models.code_snippet import CodeSnippet
-from app.services.ai_service import generate_documentation
+from app.models.documentation import Documentation
+from app.services.ai_service import document_snippets, is_error_documentation
+from app.services.archive_service import record_archive_progress
+from app.services.documentation_service import document_snippet, document_submission
+from app.services.email_service import EmailDeliveryError, send_emails
+from app.services.gather_service import run_incremental_gather
+from app.services.stats_service import mark_snippets_documented
+
+
+def snippet_to_prompt_data(snippet):
+    return {
+        'id': snippet.id,
+        'code': snippet.code,
+        'name_or_title': snippet.name_or_title,
+        'language': snippet.language,
+        'is_repo': snippet.is_repo
+    }
+
+
+def save_documentation(snippets, documentation_by_id):
+    """Write Documentation rows and has_documentation flags in one transaction."""
+    snippet_ids = [snippet.id for snippet in snippets]
+    existing = {
+        documentation.snippet_id: documentation
+        for documentation in Documentation.query.filter(Documentation.snippet_id.in_(snippet_ids))
+    }
+
+    saved, failed, documented = [], [], []
+    for snippet in snippets:
+        content = documentation_by_id.get(snippet.id)
+        if is_error_documentation(content):
+            failed.append(snippet.id)
+            continue
+        if snippet.id in existing:
+            existing[snippet.id].content = content
+        else:
+            db.session.add(Documentation(
+                content=content,
+                user_id=snippet.user_id,
+                project_id=snippet.project_id,
+                snippet_id=snippet.id
+            ))
+        documented.append(snippet)
+        saved.append(snippet.id)
+
+    mark_snippets_documented(db.session, documented)
+    db.session.commit()
+    return saved, failed
+
+
+@celery.task
+def generate_documentation_batch_task(snippet_ids):
+    snippets = CodeSnippet.query.options(undefer(CodeSnippet.code)).filter(CodeSnippet.id.in_(snippet_ids)).all()
+    documentation_by_id = document_snippets([snippet_to_prompt_data(snippet) for snippet in snippets])
+    saved, failed = save_documentation(snippets, documentation_by_id)
+    return {'documented': saved, 'failed': failed}
+
+
+@celery.task
+def document_archive_batch_task(upload_id, snippet_ids):
+    try:
+        result = generate_documentation_batch_task.run(snippet_ids)
+    except Exception:
+        db.session.rollback()
+        record_archive_progress(upload_id, [], snippet_ids)
+        raise
+    record_archive_progress(upload_id, result['documented'], result['failed'])
+    return result
+
 
 @celery.task
 def generate_documentation_task(snippet_id):
-    snippet = CodeSnippet.query.get(snippet_id)
-    if snippet:
-        documentation = generate_documentation(snippet.to_dict())
-        snippet.documentation = documentation
-        db.session.commit()
-    return f"Documentation generated for snippet {snippet_id}"
\ No newline at end of file
+    generate_documentation_batch_task.run([snippet_id])
+    return f"Documentation generated for snippet {snippet_id}"
+
+
+@celery.task
+def submit_code_task(user_id, project_name, code=None, repo_url=None):
+    doc = document_submission(user_id, project_name, code=code, repo_url=repo_url)
+    return {'documentation_id': doc.id, 'snippet_id': doc.snippet_id, 'documentation': doc.content}
+
+
+@celery.task
+def generate_snippet_documentation_task(user_id, snippet_id):
+    snippet = CodeSnippet.query.filter_by(id=snippet_id, user_id=user_id).first()
+    if not snippet:
+        raise ValueError(f"Snippet {snippet_id} not found")
+    documentation = document_snippet(snippet)
+    return {'snippet_id': snippet_id, 'documentation': documentation}
+
+
+@celery.task
+def incremental_gather_task():
+    return run_incremental_gather()
+
+
+@celery.task(bind=True, max_retries=5)
+def send_emails_task(self, messages):
+    try:
+        return {'sent': send_emails(messages)}
+    except EmailDeliveryError as e:
+        countdown = current_app.config.get('EMAIL_RETRY_BACKOFF', 2) ** (self.request.retries + 1)
+        raise self.retry(args=[e.unsent], exc=e, countdown=countdown)
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_BUSY_TIMEOUT = 5000  # milliseconds
+DEFAULT_SYNCHRONOUS = 'NORMAL'
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_OVERFLOW = 20
+DEFAULT_WRITE_QUEUE_TIMEOUT = 30  # seconds
+READ_PREFIXES = ('SELECT', 'PRAGMA', 'EXPLAIN')
+
+
+class FairLock:
+    """A FIFO lock: waiting writers are served in arrival order, which keeps the tail short."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiters = deque()
+        self._held = False
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            ticket = object()
+            self._waiters.append(ticket)
+            try:
+                while self._held or self._waiters[0] is not ticket:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                self._held = True
+                return True
+            finally:
+                self._waiters.remove(ticket)
+                self._condition.notify_all()
+
+    def release(self):
+        with self._condition:
+            self._held = False
+            self._condition.notify_all()
+
+
+def is_sqlite_file(url):
+    return url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:')
+
+
+def configure_engine_options(app):
+    """Pool settings for a file SQLite database: a real pool shared across threads
+    instead of Flask-SQLAlchemy's default of a new connection per checkout."""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+    if not app.config.get('SQLITE_PROFILE_ENABLED', True) or not uri or not is_sqlite_file(make_url(uri)):
+        return
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    # Flask-SQLAlchemy picks NullPool for SQLite before it merges these options
+    options.setdefault('poolclass', QueuePool)
+    options.setdefault('pool_size', app.config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE))
+    options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW))
+    options.setdefault('connect_args', {}).setdefault('check_same_thread', False)
+
+
+def init_sqlite_profile(app, engine):
+    """WAL journaling, a busy timeout and relaxed fsyncs on every SQLite connection,
+    plus the optional single-writer lock (``DB_SERIALIZE_WRITES``)."""
+    if engine.dialect.name != 'sqlite' or not app.config.get('SQLITE_PROFILE_ENABLED', True):
+        return
+    busy_timeout = int(app.config.get('SQLITE_BUSY_TIMEOUT', DEFAULT_BUSY_TIMEOUT))
+    pragmas = [f'PRAGMA busy_timeout = {busy_timeout}']
+    if is_sqlite_file(engine.url) and app.config.get('SQLITE_WAL', True):
+        # WAL lets readers carry on while a write is in progress; NORMAL only fsyncs at checkpoints
+        pragmas.append('PRAGMA journal_mode = WAL')
+        pragmas.append(f"PRAGMA synchronous = {app.config.get('SQLITE_SYNCHRONOUS', DEFAULT_SYNCHRONOUS)}")
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    if app.config.get('DB_SERIALIZE_WRITES', False):
+        install_write_lock(engine, app.config.get('DB_WRITE_QUEUE_TIMEOUT', DEFAULT_WRITE_QUEUE_TIMEOUT))
+
+
+def install_write_lock(engine, timeout):
+    """Let one connection at a time hold a write transaction, queueing the rest in order.
+
+    SQLite's busy handler retries with growing sleeps, so contended writers
+    see long tails; waiting on a FIFO lock hands the database over as soon as
+    the previous writer finishes. A writer that cannot get the lock within
+    ``timeout`` goes ahead and relies on the busy timeout instead.
+    """
+    lock = FairLock()
+
+    def acquire(info):
+        if info.get('write_lock_held'):
+            return
+        if lock.acquire(timeout):
+            info['write_lock_held'] = True
+
+    def release(info):
+        if info.pop('write_lock_held', False):
+            lock.release()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def lock_before_write(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(READ_PREFIXES):
+            acquire(conn.info)
+
+    @event.listens_for(engine, 'commit')
+    def unlock_on_commit(conn):
+        release(conn.info)
+
+    @event.listens_for(engine, 'rollback')
+    def unlock_on_rollback(conn):
+        release(conn.info)
+
+    @event.listens_for(engine, 'reset')
+    def unlock_on_reset(dbapi_connection, connection_record):
+        release(connection_record.info)
+
+    @event.listens_for(engine, 'invalidate')
+    def unlock_on_invalidate(dbapi_connection, connection_record, exception):
+        release(connection_record.info)
+
+    return lock
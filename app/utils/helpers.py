@@ -12,7 +12,10 @@ def clean_data(data: List[Dict[str, str]]) -> List[Dict[str, str]]:
             cleaned_data.append({
                 'source': item['source'],
                 'name_or_title': name_or_title,
-                'url': url
+                'url': url,
+                'language': item.get('language') or 'Unknown',
+                'code': item.get('code', ''),
+                'stars': item.get('stars', 0)
             })
 
     return cleaned_data
@@ -0,0 +1,182 @@
+import importlib.util
+import random
+import threading
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import httpx
+from flask import current_app
+
+from app.utils.metrics import upstream_timer
+
+DEFAULT_CONNECT_TIMEOUT = 5  # seconds
+DEFAULT_READ_TIMEOUT = 10  # seconds
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.5  # seconds, doubled per attempt
+DEFAULT_RETRY_MAX_WAIT = 10  # seconds
+DEFAULT_MAX_RESPONSE_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30  # seconds
+
+RETRY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class ResponseTooLarge(httpx.HTTPError):
+    pass
+
+
+_client = None
+_transport = None
+_http2 = False
+_client_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_host_stats = defaultdict(lambda: {'requests': 0, 'errors': 0, 'retries': 0, 'bytes': 0, 'seconds': 0.0})
+
+
+def http2_available():
+    return importlib.util.find_spec('h2') is not None
+
+
+def get_http_client():
+    """The process-wide client: keep-alive pools per host, HTTP/2 when ``h2`` is installed."""
+    global _client, _transport, _http2
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config
+                limits = httpx.Limits(
+                    max_connections=config.get('HTTP_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS),
+                    max_keepalive_connections=config.get('HTTP_MAX_KEEPALIVE', DEFAULT_MAX_KEEPALIVE),
+                    keepalive_expiry=config.get('HTTP_KEEPALIVE_EXPIRY', DEFAULT_KEEPALIVE_EXPIRY)
+                )
+                _http2 = bool(config.get('HTTP_HTTP2', True) and http2_available())
+                _transport = httpx.HTTPTransport(http2=_http2, limits=limits)
+                _client = httpx.Client(
+                    transport=_transport,
+                    timeout=httpx.Timeout(
+                        config.get('HTTP_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+                        connect=config.get('HTTP_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)
+                    ),
+                    headers={'User-Agent': 'CodeBase'}
+                )
+    return _client
+
+
+def close_http_client():
+    global _client, _transport
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = _transport = None
+    with _stats_lock:
+        _host_stats.clear()
+
+
+def _record(host, **counts):
+    with _stats_lock:
+        stats = _host_stats[host]
+        for name, value in counts.items():
+            stats[name] += value
+
+
+def _retry_delay(attempt, response=None):
+    backoff = current_app.config.get('HTTP_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF)
+    delay = random.uniform(0, backoff * 2 ** attempt)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            try:
+                delay = max(delay, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(delay, current_app.config.get('HTTP_RETRY_MAX_WAIT', DEFAULT_RETRY_MAX_WAIT))
+
+
+def _send(client, method, url, max_bytes, **kwargs):
+    with client.stream(method, url, **kwargs) as response:
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ResponseTooLarge(f"{url} declared {declared} bytes, over the {max_bytes} byte limit")
+        body = bytearray()
+        for chunk in response.iter_raw():
+            body.extend(chunk)
+            if len(body) > max_bytes:
+                raise ResponseTooLarge(f"{url} sent more than {max_bytes} bytes")
+    # Rebuilt from the raw bytes so the usual decoding (gzip, charset) still applies
+    return httpx.Response(
+        response.status_code, headers=response.headers, content=bytes(body),
+        request=response.request, extensions=response.extensions
+    )
+
+
+def http_request(service, method, url, params=None, headers=None, timeout=None, max_bytes=None, retries=None):
+    """Send a request through the shared client and return an ``httpx.Response``.
+
+    Idempotent requests are retried on transport errors and on 429/502/503/504
+    with jittered exponential backoff (honouring ``Retry-After``); the last
+    response is returned as is, so callers still check the status.
+    """
+    client = get_http_client()
+    host = urlsplit(url).netloc
+    method = method.upper()
+    max_bytes = max_bytes or current_app.config.get('HTTP_MAX_RESPONSE_BYTES', DEFAULT_MAX_RESPONSE_BYTES)
+    if retries is None:
+        retries = current_app.config.get('HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES) if method in RETRY_METHODS else 0
+    kwargs = {'params': params, 'headers': headers}
+    if timeout is not None:
+        kwargs['timeout'] = timeout
+
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        response = None
+        try:
+            with upstream_timer(service):
+                response = _send(client, method, url, max_bytes, **kwargs)
+        except httpx.TransportError as e:
+            _record(host, requests=1, errors=1, seconds=time.perf_counter() - started)
+            if attempt == retries:
+                raise
+            current_app.logger.warning(f"{service} request to {host} failed ({str(e)}), retrying")
+        except ResponseTooLarge:
+            _record(host, requests=1, errors=1, seconds=time.perf_counter() - started)
+            raise
+        else:
+            _record(host, requests=1, bytes=len(response.content), seconds=time.perf_counter() - started,
+                    errors=int(response.status_code >= 500))
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            current_app.logger.warning(f"{service} request to {host} returned {response.status_code}, retrying")
+        _record(host, retries=1)
+        time.sleep(_retry_delay(attempt, response))
+
+
+def http_get(service, url, **kwargs):
+    return http_request(service, 'GET', url, **kwargs)
+
+
+def get_http_stats():
+    """Per-host request counters plus the shared pool's open connections."""
+    with _stats_lock:
+        hosts = {host: dict(stats) for host, stats in _host_stats.items()}
+    pool = getattr(_transport, '_pool', None)
+    for connection in getattr(pool, 'connections', []):
+        origin = getattr(connection, '_origin', None)
+        if origin is None:
+            continue
+        host = origin.host.decode('ascii')
+        if origin.port not in (None, 80, 443):
+            host = f'{host}:{origin.port}'
+        stats = hosts.setdefault(host, {'requests': 0, 'errors': 0, 'retries': 0, 'bytes': 0, 'seconds': 0.0})
+        stats['connections'] = stats.get('connections', 0) + 1
+        stats['idle_connections'] = stats.get('idle_connections', 0) + int(connection.is_idle())
+    for stats in hosts.values():
+        stats.setdefault('connections', 0)
+        stats.setdefault('idle_connections', 0)
+        stats['seconds'] = round(stats['seconds'], 4)
+    return {'http2': _http2, 'hosts': hosts}
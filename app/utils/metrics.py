@@ -0,0 +1,222 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+_upstream_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.extend(self._samples(list(zip(self.labelnames, key)), value))
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, labels, value):
+        return [f'{self.name}{_format_labels(labels)} {_format_value(value)}']
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self, labels, value):
+        return [f'{self.name}{_format_labels(labels)} {_format_value(value)}']
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, labels, value):
+        counts, total, count = value
+        samples = [
+            f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(float(bound)))])} {bucket_count}'
+            for bound, bucket_count in zip(self.buckets, counts)
+        ]
+        samples.append(f'{self.name}_bucket{_format_labels(labels + [("le", "+Inf")])} {count}')
+        samples.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+        samples.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return samples
+
+
+REQUEST_LATENCY = Histogram(
+    'codebase_http_request_duration_seconds', 'Request latency by endpoint.', ['endpoint', 'method', 'status'])
+REQUEST_DB_QUERIES = Histogram(
+    'codebase_http_request_db_queries', 'SQL statements executed per request.', ['endpoint'], QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram(
+    'codebase_http_request_db_seconds', 'Time spent in SQL per request.', ['endpoint'])
+REQUEST_UPSTREAM_TIME = Histogram(
+    'codebase_http_request_upstream_seconds', 'Time spent in outbound calls per request.', ['endpoint', 'service'])
+DB_QUERY_LATENCY = Histogram(
+    'codebase_db_query_duration_seconds', 'SQL statement latency, in and out of requests.')
+UPSTREAM_LATENCY = Histogram(
+    'codebase_upstream_request_duration_seconds', 'Outbound call latency by service.', ['service', 'outcome'])
+DOC_CACHE_EVENTS = Counter(
+    'codebase_doc_cache_events_total', 'Documentation cache hits, misses, stores and evictions.', ['event'])
+DOC_CACHE_MEMORY_ENTRIES = Gauge(
+    'codebase_doc_cache_memory_entries', 'Entries in the in-process documentation cache.')
+
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    for metric in _registry:
+        metric.clear()
+
+
+@contextmanager
+def upstream_timer(service):
+    """Time an outbound call to ``service`` (github, stackoverflow, gemini)."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_LATENCY.observe(elapsed, service=service, outcome=outcome)
+        if has_app_context() and 'metrics_upstream' in g:
+            with _upstream_lock:
+                g.metrics_upstream[service] = g.metrics_upstream.get(service, 0.0) + elapsed
+
+
+def current_upstream_timings():
+    """The current request's upstream timings, to hand to worker threads."""
+    return g.get('metrics_upstream') if has_app_context() else None
+
+
+def track_upstream_timings(timings):
+    """Attribute upstream calls made in this (worker) app context to a request."""
+    if timings is not None:
+        g.metrics_upstream = timings
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERY_LATENCY.observe(elapsed)
+    if has_request_context() and 'metrics_db_queries' in g:
+        g.metrics_db_queries += 1
+        g.metrics_db_time += elapsed
+
+
+_listeners_installed = False
+
+
+def init_metrics(app):
+    """Install request/SQL instrumentation and the ``/metrics`` route."""
+    global _listeners_installed
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_db_queries = 0
+        g.metrics_db_time = 0.0
+        g.metrics_upstream = {}
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' not in g:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_start,
+                                endpoint=endpoint, method=request.method, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(g.metrics_db_queries, endpoint=endpoint)
+        REQUEST_DB_TIME.observe(g.metrics_db_time, endpoint=endpoint)
+        for service, elapsed in g.metrics_upstream.items():
+            REQUEST_UPSTREAM_TIME.observe(elapsed, endpoint=endpoint, service=service)
+        return response
+
+    def metrics():
+        return Response(render_metrics(), mimetype=None, content_type=CONTENT_TYPE)
+
+    app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', metrics)
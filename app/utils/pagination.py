@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 10
+DEFAULT_MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, id):
+    payload = json.dumps([created_at.isoformat(), id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def is_cursor_request(args):
+    return 'cursor' in args
+
+
+def get_per_page(args):
+    """``per_page`` from the query string, clamped to ``1..MAX_PER_PAGE``."""
+    per_page = args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    return min(max(per_page, 1), current_app.config.get('MAX_PER_PAGE', DEFAULT_MAX_PER_PAGE))
+
+
+def wants_total(args):
+    return args.get('include_total', '').lower() in ('1', 'true', 'yes')
+
+
+def keyset_paginate(query, model, cursor, per_page, include_total=False):
+    """Return one page ordered newest first, seeking past ``cursor``.
+
+    Each page is a range scan on ``(created_at, id)`` rather than an
+    OFFSET, so deep pages cost the same as the first one.
+    """
+    per_page = max(per_page, 1)
+    page_query = query
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        page_query = page_query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < id)
+        ))
+
+    rows = page_query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    total = query.order_by(None).count() if include_total else None
+    return rows, next_cursor, total
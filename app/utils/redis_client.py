@@ -0,0 +1,36 @@
+import threading
+import time
+
+import redis
+from flask import current_app
+
+RECONNECT_INTERVAL = 30  # seconds
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis_url():
+    url = current_app.config.get('REDIS_URL')
+    if url:
+        return url
+    broker = current_app.config.get('CELERY_BROKER_URL') or ''
+    return broker if broker.startswith(('redis://', 'rediss://')) else None
+
+
+def get_redis():
+    """Return a shared Redis client, or None when Redis is not configured or reachable."""
+    url = get_redis_url()
+    if not url:
+        return None
+    with _lock:
+        client, checked_at = _clients.get(url, (None, None))
+        if client is None and (checked_at is None or time.monotonic() - checked_at > RECONNECT_INTERVAL):
+            client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+            try:
+                client.ping()
+            except redis.RedisError as e:
+                current_app.logger.warning(f"Redis unavailable at {url}, using in-process state: {str(e)}")
+                client = None
+            _clients[url] = (client, time.monotonic())
+        return client
@@ -0,0 +1,46 @@
+import json
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def parse_fields(args, allowed, default):
+    """Return the fields named by ``?fields=a,b``, or ``default`` when absent.
+
+    ``fields=all`` selects every allowed field. ``id`` is always included.
+    """
+    raw = args.get('fields', '').strip()
+    if not raw:
+        return default
+    if raw == 'all':
+        return allowed
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(['id'] + fields))
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_response(data, status=200):
+    """Like ``jsonify`` but serialized with orjson when it is installed."""
+    return current_app.response_class(dumps(data), status=status, mimetype='application/json')
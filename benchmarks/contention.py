@@ -0,0 +1,133 @@
+"""Write latency under contention for each SQLite profile.
+
+    python -m benchmarks.contention --writers 8 --readers 8 --transactions 100
+
+Writers commit one snippet (plus its stats rows) per transaction while
+readers page through snippets. ``legacy`` is SQLite's defaults without the
+profile, ``wal`` the profile set up by ``create_app`` and ``wal+queue`` adds
+the single-writer queue (``DB_SERIALIZE_WRITES``).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.models.code_snippet import CodeSnippet
+from app.services.stats_service import record_snippets_added
+from benchmarks.run import percentile
+from config.config import Config
+
+PROFILES = {
+    'legacy': {'SQLITE_PROFILE_ENABLED': False},
+    'wal': {},
+    'wal+queue': {'DB_SERIALIZE_WRITES': True},
+}
+
+
+def make_app(workdir, name, overrides):
+    attributes = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, name.replace('+', '-'))}.db",
+        'METRICS_ENABLED': False,
+    }
+    attributes.update(overrides)
+    return create_app(type('ContentionConfig', (Config,), attributes))
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'p50_ms': round(1000 * percentile(latencies, 0.50), 2),
+        'p95_ms': round(1000 * percentile(latencies, 0.95), 2),
+        'p99_ms': round(1000 * percentile(latencies, 0.99), 2),
+        'max_ms': round(1000 * latencies[-1], 2),
+    }
+
+
+def run_profile(app, writers, readers, transactions):
+    with app.app_context():
+        db.create_all()
+
+    writes, reads, errors = [], [], []
+    stop_reading = threading.Event()
+    start = threading.Barrier(writers + readers)
+
+    def write(worker):
+        with app.app_context():
+            start.wait()
+            for i in range(transactions):
+                started = time.perf_counter()
+                try:
+                    snippet = CodeSnippet(user_id=worker + 1, name_or_title=f'Snippet {worker}-{i}', language='Python',
+                                          code='pass', url=f'https://example.com/{worker}/{i}', is_user_submitted=True,
+                                          created_at=datetime.utcnow())
+                    db.session.add(snippet)
+                    db.session.flush()
+                    record_snippets_added(db.session, snippet.user_id, [snippet])
+                    db.session.commit()
+                    writes.append(time.perf_counter() - started)
+                except OperationalError as e:
+                    db.session.rollback()
+                    errors.append(str(e.orig))
+
+    def read(worker):
+        with app.app_context():
+            start.wait()
+            while not stop_reading.is_set():
+                started = time.perf_counter()
+                CodeSnippet.query.filter_by(user_id=worker % writers + 1, is_user_submitted=True) \
+                    .order_by(CodeSnippet.created_at.desc()).limit(20).all()
+                db.session.rollback()
+                reads.append(time.perf_counter() - started)
+
+    reader_threads = [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+    writer_threads = [threading.Thread(target=write, args=(i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop_reading.set()
+    for thread in reader_threads:
+        thread.join()
+
+    return {
+        'writes_per_s': round(len(writes) / elapsed, 1),
+        'writes': summarize(writes),
+        'reads': summarize(reads),
+        'write_errors': len(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--transactions', type=int, default=100, help='transactions per writer')
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='comma-separated profiles to run')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='codebase-contention-')
+    print(f"{'profile':<12} {'writes/s':>9} {'w p50':>8} {'w p95':>8} {'w p99':>8} {'w max':>8} "
+          f"{'r p99':>8} {'errors':>7}")
+    for name in args.profiles.split(','):
+        result = run_profile(make_app(workdir, name, PROFILES[name]), args.writers, args.readers, args.transactions)
+        writes, reads = result['writes'], result['reads']
+        print(f"{name:<12} {result['writes_per_s']:>9} {writes.get('p50_ms', '-'):>8} {writes.get('p95_ms', '-'):>8} "
+              f"{writes.get('p99_ms', '-'):>8} {writes.get('max_ms', '-'):>8} {reads.get('p99_ms', '-'):>8} "
+              f"{result['write_errors']:>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
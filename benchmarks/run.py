@@ -0,0 +1,359 @@
+"""Drive every API route against a seeded SQLite database and local upstream stubs.
+
+    python -m benchmarks.run --requests 200 --concurrency 8 --latency 0.05
+    python -m benchmarks.run --scenarios search,dashboard --compare benchmarks/results/<old>.json
+    python -m benchmarks.run --scenarios login,refresh --cpus 2 --hash-workers 1 --concurrency 32
+
+Results (throughput and p50/p95/p99 per scenario) are printed and saved
+as JSON so runs can be compared across commits.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.services.auth_service import flush_api_key_usage, generate_tokens
+from app.services.password_service import DEFAULT_HASH_METHOD, get_hashing_stats
+from app.services.stats_service import rebuild_user_stats
+from benchmarks.stubs import start_stubs
+from config.config import Config
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+PASSWORD = 'benchmark-password'
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+Scenario = namedtuple('Scenario', ['name', 'method', 'build', 'prepare'])
+
+
+def scenario(name, method, build, prepare=None):
+    return Scenario(name, method, build, prepare)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class BenchmarkContext:
+    def __init__(self, base_url, users, snippets_per_user):
+        self.base_url = base_url
+        self.users = users
+        self.snippets_per_user = snippets_per_user
+        self.tokens = {}
+        self.api_keys = {}
+        self.revocable_keys = []
+        self.counter = itertools.count()
+        self.run_id = int(time.time() * 1000)
+
+    def user(self, i):
+        return i % self.users + 1
+
+    def auth(self, i):
+        return {'Authorization': f'Bearer {self.tokens[self.user(i)][0]}'}
+
+    def api_key(self, i):
+        return {'X-API-Key': self.api_keys[self.user(i)]}
+
+    def submitted_snippet(self, i):
+        # Seeded ids are laid out user by user, submitted snippets first
+        user = self.user(i)
+        return (user - 1) * self.snippets_per_user + 1 + (i // self.users) % (self.snippets_per_user // 2)
+
+    def unique(self):
+        return f'{self.run_id}-{next(self.counter)}'
+
+
+def _prepare_revocable_keys(app, ctx, count):
+    from app.models.api_key import APIKey
+    with app.app_context():
+        keys = [APIKey(key=f'revoke-{ctx.unique()}', user_id=ctx.user(i)) for i in range(count)]
+        db.session.add_all(keys)
+        db.session.commit()
+        ctx.revocable_keys = [key.id for key in keys]
+
+
+SCENARIOS = [
+    scenario('index', 'GET', lambda ctx, i: ('/api/v1/', {})),
+    scenario('signup', 'POST', lambda ctx, i: ('/api/v1/signup', {'json': {
+        'name': 'Bench', 'email': f'bench-{ctx.unique()}@example.com', 'password': PASSWORD}})),
+    scenario('verify', 'GET', lambda ctx, i: (f'/api/v1/verify/{ctx.user(i)}', {})),
+    scenario('login', 'POST', lambda ctx, i: ('/api/v1/login', {'json': {
+        'email': f'user{ctx.user(i)}@example.com', 'password': PASSWORD}})),
+    scenario('refresh', 'POST', lambda ctx, i: ('/api/v1/refresh', {'json': {
+        'refresh_token': ctx.tokens[ctx.user(i)][1]}})),
+    scenario('generate_key', 'POST', lambda ctx, i: ('/api/v1/generate_key', {'headers': ctx.auth(i)})),
+    scenario('revoke_key', 'DELETE', lambda ctx, i: (f'/api/v1/api-keys/{ctx.revocable_keys[i]}', {'headers': ctx.auth(i)}),
+             prepare=_prepare_revocable_keys),
+    scenario('gather', 'POST', lambda ctx, i: ('/api/v1/gather', {'headers': ctx.auth(i)})),
+    scenario('data', 'GET', lambda ctx, i: (f'/api/v1/data?page={i % 5 + 1}', {'headers': ctx.auth(i)})),
+    scenario('data_cursor', 'GET', lambda ctx, i: ('/api/v1/data?cursor=', {'headers': ctx.auth(i)})),
+    scenario('documentation_queue', 'GET', lambda ctx, i: ('/api/v1/documentation?limit=5', {'headers': ctx.api_key(i)})),
+    scenario('search', 'GET', lambda ctx, i: (f'/api/v1/search?q=snippet+{i % 100}', {'headers': ctx.auth(i)})),
+    scenario('search_cursor', 'GET', lambda ctx, i: ('/api/v1/search?q=snippet&cursor=', {'headers': ctx.auth(i)})),
+    scenario('job_status', 'GET', lambda ctx, i: (f'/api/v1/jobs/{ctx.user(i)}-{ctx.unique()}', {'headers': ctx.auth(i)})),
+    scenario('gemini_limiter', 'GET', lambda ctx, i: ('/api/v1/gemini/limiter', {'headers': ctx.api_key(i)})),
+    scenario('submit', 'POST', lambda ctx, i: ('/api/v1/submit', {'headers': ctx.auth(i), 'json': {
+        'projectName': 'Bench', 'code': f'def f_{ctx.unique().replace("-", "_")}():\n    return 1\n'}})),
+    scenario('submit_async', 'POST', lambda ctx, i: ('/api/v1/submit?async=1', {'headers': ctx.auth(i), 'json': {
+        'projectName': 'Bench', 'code': f'x = "{ctx.unique()}"\n'}})),
+    scenario('submit_repo', 'POST', lambda ctx, i: ('/api/v1/submit', {'headers': ctx.auth(i), 'json': {
+        'projectName': 'Bench', 'repoUrl': f'https://github.com/bench/repo-{i % 10}'}})),
+    scenario('submit_stream', 'POST', lambda ctx, i: ('/api/v1/submit/stream', {'headers': ctx.auth(i), 'json': {
+        'projectName': 'Bench', 'code': f'y = "{ctx.unique()}"\n'}})),
+    scenario('submit_correction', 'POST', lambda ctx, i: ('/api/v1/submit-correction', {'headers': ctx.auth(i), 'json': {
+        'documentation_id': ctx.submitted_snippet(i), 'correction': 'Typo fix'}})),
+    scenario('documentation_get', 'GET', lambda ctx, i: (f'/api/v1/documentation/{ctx.submitted_snippet(i)}', {'headers': ctx.auth(i)})),
+    scenario('documentation_generate', 'POST', lambda ctx, i: (
+        f'/api/v1/documentation/generate/{ctx.submitted_snippet(i)}', {'headers': ctx.auth(i)})),
+    scenario('documentation_generate_stream', 'POST', lambda ctx, i: (
+        f'/api/v1/documentation/generate/{ctx.submitted_snippet(i)}/stream', {'headers': ctx.auth(i)})),
+    scenario('user_snippets', 'GET', lambda ctx, i: (f'/api/v1/user-snippets?page={i % 5 + 1}', {'headers': ctx.auth(i)})),
+    scenario('dashboard', 'GET', lambda ctx, i: ('/api/v1/dashboard', {'headers': ctx.auth(i)})),
+    scenario('metrics', 'GET', lambda ctx, i: ('/metrics', {})),
+]
+
+
+def seed_database(app, users, snippets_per_user):
+    """Create verified users with API keys, each owning half submitted and half gathered snippets."""
+    with app.app_context():
+        db.create_all()
+        password_hash = generate_password_hash(PASSWORD, app.config['PASSWORD_HASH_METHOD'])
+        db.session.execute(text("""
+            INSERT INTO user (id, name, email, password_hash, role, is_verified)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :users)
+            SELECT n, 'User ' || n, 'user' || n || '@example.com', :password_hash, 'user', 1 FROM seq
+        """), {'users': users, 'password_hash': password_hash})
+        db.session.execute(text("""
+            INSERT INTO api_key (id, key, user_id, created_at)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :users)
+            SELECT n, 'bench-key-' || n, n, datetime('now') FROM seq
+        """), {'users': users})
+        db.session.execute(text("""
+            INSERT INTO project (id, name, user_id, created_at)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :users)
+            SELECT n, 'Bench', n, datetime('now') FROM seq
+        """), {'users': users})
+        half = snippets_per_user // 2
+        db.session.execute(text("""
+            INSERT INTO code_snippet (id, user_id, project_id, url, name_or_title, language, code, stars, source,
+                                      created_at, updated_at, is_user_submitted, has_documentation, is_repo)
+            WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < :total - 1)
+            SELECT n + 1, n / :per_user + 1, n / :per_user + 1, 'https://example.com/snippet/' || n,
+                   'Snippet ' || n, 'Python', 'def snippet_' || n || '():' || char(10) || '    return ' || n,
+                   n % 500, CASE WHEN n % :per_user < :half THEN NULL ELSE 'GitHub' END,
+                   datetime('2024-01-01', '+' || n || ' seconds'), datetime('2024-01-01', '+' || n || ' seconds'),
+                   n % :per_user < :half, n % :per_user < :half, 0
+            FROM seq
+        """), {'total': users * snippets_per_user, 'per_user': snippets_per_user, 'half': half})
+        # Documentation ids line up with the submitted snippet ids, for /submit-correction
+        db.session.execute(text("""
+            INSERT INTO documentation (id, content, user_id, project_id, snippet_id, created_at, updated_at)
+            SELECT id, '# Snippet ' || id || char(10) || 'Returns a constant.', user_id, project_id, id,
+                   created_at, updated_at
+            FROM code_snippet WHERE is_user_submitted = 1
+        """))
+        rebuild_user_stats(db.session)
+        db.session.commit()
+
+
+def run_scenario(ctx, scenario, requests_count, concurrency):
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        path, kwargs = scenario.build(ctx, i)
+        started = time.perf_counter()
+        try:
+            response = session.request(scenario.method, ctx.base_url + path, timeout=120, **kwargs)
+            response.content  # include the full (possibly streamed) body in the latency
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(one, range(requests_count)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = Counter(str(status) for _, status in samples)
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+    return {
+        'requests': requests_count,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 4),
+        'throughput_rps': round(requests_count / elapsed, 2) if elapsed else None,
+        'mean_ms': round(1000 * sum(latencies) / len(latencies), 2),
+        'p50_ms': round(1000 * percentile(latencies, 0.50), 2),
+        'p95_ms': round(1000 * percentile(latencies, 0.95), 2),
+        'p99_ms': round(1000 * percentile(latencies, 0.99), 2),
+        'max_ms': round(1000 * latencies[-1], 2),
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    header = f"{'scenario':<30} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:<30} {result['throughput_rps']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+                f"{result['p99_ms']:>9} {result['errors']:>7}")
+        base = (baseline or {}).get(name)
+        if base and base.get('p95_ms'):
+            line += f" {100 * (result['p95_ms'] - base['p95_ms']) / base['p95_ms']:>+11.1f}%"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenarios', help='comma-separated scenario names (default: all)')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--snippets-per-user', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05, help='base upstream latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='extra random upstream latency in seconds')
+    parser.add_argument('--gemini-latency', type=float, help='base Gemini latency (default: --latency)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream calls that fail')
+    parser.add_argument('--cpus', type=int, help='pin the benchmark to this many CPUs, for a fixed CPU budget')
+    parser.add_argument('--hash-method', default=DEFAULT_HASH_METHOD, help='PASSWORD_HASH_METHOD for seeded users')
+    parser.add_argument('--hash-workers', type=int, help='PASSWORD_HASH_WORKERS (0 hashes on the request thread)')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare p95 against')
+    parser.add_argument('--list', action='store_true', help='list scenarios and exit')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        print('\n'.join(scenario.name for scenario in SCENARIOS))
+        return 0
+
+    selected = SCENARIOS
+    if args.scenarios:
+        names = set(args.scenarios.split(','))
+        unknown = names - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            print(f"Unknown scenarios: {', '.join(sorted(unknown))}", file=sys.stderr)
+            return 2
+        selected = [scenario for scenario in SCENARIOS if scenario.name in names]
+
+    if args.cpus:
+        os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:args.cpus])
+
+    stubs = start_stubs(args.latency, args.jitter, args.error_rate, args.gemini_latency)
+    workdir = tempfile.mkdtemp(prefix='codebase-bench-')
+
+    class BenchmarkConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'codebase.db')}"
+        GITHUB_API_URL = f"{stubs['github'].url}/search/repositories"
+        GITHUB_API_BASE = stubs['github'].url
+        STACKOVERFLOW_API_URL = f"{stubs['stackoverflow'].url}/questions"
+        GEMINI_API_KEY = 'benchmark'
+        GEMINI_API_ENDPOINT = stubs['gemini'].url
+        GEMINI_RATE_LIMIT = 1000000
+        GEMINI_BURST = 100000
+        REDIS_URL = None
+        MAIL_SUPPRESS_SEND = False
+        MAIL_SERVER = '127.0.0.1'
+        MAIL_PORT = stubs['smtp'].port
+        PASSWORD_HASH_METHOD = args.hash_method
+
+    if args.hash_workers is not None:
+        BenchmarkConfig.PASSWORD_HASH_WORKERS = args.hash_workers
+
+    app = create_app(BenchmarkConfig)
+    seed_database(app, args.users, args.snippets_per_user)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    ctx = BenchmarkContext(f'http://127.0.0.1:{server.server_port}', args.users, args.snippets_per_user)
+    with app.app_context():
+        ctx.tokens = {user: generate_tokens(user) for user in range(1, args.users + 1)}
+    ctx.api_keys = {user: f'bench-key-{user}' for user in range(1, args.users + 1)}
+
+    results = {}
+    try:
+        for scenario in selected:
+            if scenario.prepare:
+                scenario.prepare(app, ctx, args.requests)
+            results[scenario.name] = run_scenario(ctx, scenario, args.requests, args.concurrency)
+    finally:
+        server.shutdown()
+        with app.app_context():
+            flush_api_key_usage()
+        for stub in stubs.values():
+            stub.stop()
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+            'upstream_requests': {name: stub.requests for name, stub in stubs.items()},
+            'upstream_errors_injected': {name: stub.errors for name, stub in stubs.items()},
+            'cpus': len(os.sched_getaffinity(0)),
+            'password_hashing': get_hashing_stats(),
+        },
+        'results': results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+    print(f"\nSaved results to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
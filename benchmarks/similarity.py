@@ -0,0 +1,70 @@
+"""Top-k query latency of the similarity index at a given size.
+
+    python -m benchmarks.similarity --snippets 1000000 --queries 200
+
+Random unit vectors are written straight into an index in a temporary
+directory (embedding a million real snippets would only time the embedder),
+then queries are timed end to end through ``SimilarityIndex.search``.
+Embedding throughput is measured separately on generated code.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app import create_app
+from app.services.similarity_service import DEFAULT_DIMENSIONS, SimilarityIndex, embed_snippet
+from benchmarks.run import percentile
+from config.config import Config
+
+WRITE_CHUNK_ROWS = 100000
+
+
+def build_index(path, snippets, dimensions, rng):
+    index = SimilarityIndex(path, dimensions)
+    for start in range(0, snippets, WRITE_CHUNK_ROWS):
+        rows = min(WRITE_CHUNK_ROWS, snippets - start)
+        vectors = rng.standard_normal((rows, dimensions)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = np.arange(start + 1, start + rows + 1, dtype=np.int64)
+        index.update(ids, np.zeros(rows, dtype=np.int64), vectors, {'max_snippet_id': start + rows})
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--snippets', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument('--top', type=int, default=200, help='candidates per query (SIMILARITY_CANDIDATES)')
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    app = create_app(type('SimilarityConfig', (Config,), {'TESTING': True, 'METRICS_ENABLED': False}))
+    with app.app_context(), tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        index = build_index(workdir, args.snippets, args.dimensions, rng)
+        print(f"built {len(index)} x {args.dimensions} index in {time.perf_counter() - started:.1f}s")
+
+        latencies = []
+        for _ in range(args.queries):
+            query = rng.standard_normal(args.dimensions).astype(np.float32)
+            query /= np.linalg.norm(query)
+            started = time.perf_counter()
+            index.load()
+            index.search(query, args.top)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(f"query p50 {1000 * percentile(latencies, 0.50):.1f} ms, p95 {1000 * percentile(latencies, 0.95):.1f} ms, "
+              f"p99 {1000 * percentile(latencies, 0.99):.1f} ms")
+
+        code = '\n'.join(f'def handler_{i}(request):\n    return render(request, "page_{i}.html")' for i in range(40))
+        started = time.perf_counter()
+        for i in range(200):
+            embed_snippet(f'Snippet {i}', code, 'Renders a page for each request.', args.dimensions)
+        print(f"embedding {200 / (time.perf_counter() - started):.0f} snippets/s ({len(code)} chars each)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Local stand-ins for GitHub, StackOverflow, Gemini and an SMTP server.
+
+Each stub is a threaded server with a fixed base latency, optional
+jitter and an error rate, so benchmarks never touch the real services.
+"""
+import base64
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GEMINI_PATH = re.compile(r'^/v1beta/models/[^/:]+:(generateContent|streamGenerateContent)')
+DOC_TEXT = (
+    "# Overview\n\nThis code demonstrates a small, self-contained utility.\n\n"
+    "## Usage\n\n```python\nresult = main()\n```\n\n## Notes\n\nNo external dependencies are required.\n"
+)
+
+
+class StubBehaviour:
+    """Latency, jitter and error injection shared by the HTTP and SMTP stubs."""
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def delay_and_roll(self):
+        """Sleep for the configured latency; returns True if this call should fail."""
+        with self.random_lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        return failed
+
+
+class StubServer(StubBehaviour, ThreadingHTTPServer):
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status=500, message='injected upstream error', code='INTERNAL'):
+        self.send_json({'error': {'code': status, 'message': message, 'status': code}}, status=status)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def log_message(self, *args):
+        pass
+
+
+class GitHubHandler(StubHandler):
+    """Search results for /gather plus the endpoints repository_service reads."""
+
+    def do_GET(self):
+        if self.server.delay_and_roll():
+            return self.send_error_json(502)
+        path = self.path.split('?', 1)[0]
+        if path.endswith('/commits/HEAD'):
+            if self.headers.get('If-None-Match') == '"head"':
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                return self.end_headers()
+            body = b'0123456789abcdef0123456789abcdef01234567'
+            self.send_response(200)
+            self.send_header('ETag', '"head"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            return self.wfile.write(body)
+        if '/git/trees/' in path:
+            return self.send_json({'truncated': False, 'tree': [
+                {'path': f'src/module_{i}.py', 'type': 'blob', 'sha': f'{i:040x}', 'size': 1200} for i in range(50)
+            ]})
+        if '/git/blobs/' in path:
+            source = ''.join(f'def step_{i}(value):\n    return value + {i}\n\n\n' for i in range(20))
+            return self.send_json({'encoding': 'base64', 'content': base64.b64encode(source.encode()).decode()})
+        if path.endswith('/readme'):
+            return self.send_json({'content': base64.b64encode(b'# Benchmark repository\n').decode()},
+                                  headers={'ETag': '"readme"'})
+        page = int(re.search(r'page=(\d+)', self.path).group(1)) if 'page=' in self.path else 1
+        return self.send_json({'items': [
+            {'name': f'repo-{page}-{i}', 'html_url': f'https://github.com/bench/repo-{page}-{i}',
+             'language': 'Python', 'stargazers_count': i}
+            for i in range(30)
+        ]})
+
+
+class StackOverflowHandler(StubHandler):
+    def do_GET(self):
+        if self.server.delay_and_roll():
+            return self.send_error_json(502)
+        page = int(re.search(r'page=(\d+)', self.path).group(1)) if 'page=' in self.path else 1
+        return self.send_json({'items': [
+            {'title': f'question {page}-{i}', 'link': f'https://stackoverflow.com/q/{page * 1000 + i}',
+             'body': '<pre><code>print(1)</code></pre>', 'tags': ['python'], 'score': i}
+            for i in range(30)
+        ]})
+
+
+class GeminiHandler(StubHandler):
+    """Speaks the REST shape of generateContent and streamGenerateContent."""
+
+    def do_POST(self):
+        self.read_body()
+        match = GEMINI_PATH.match(self.path)
+        if not match:
+            return self.send_error_json(404, 'not found', 'NOT_FOUND')
+        if self.server.delay_and_roll():
+            return self.send_error_json(503, 'injected upstream error', 'UNAVAILABLE')
+
+        if match.group(1) == 'generateContent':
+            return self.send_json(self._candidate(DOC_TEXT))
+
+        # Streamed as one JSON array, written a chunk at a time
+        chunks = [DOC_TEXT[i:i + 64] for i in range(0, len(DOC_TEXT), 64)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            piece = ('[' if i == 0 else ',') + json.dumps(self._candidate(chunk))
+            self._write_chunk(piece.encode('utf-8'))
+        self._write_chunk(b']')
+        self._write_chunk(b'')
+
+    def _write_chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    @staticmethod
+    def _candidate(text):
+        return {'candidates': [{
+            'content': {'parts': [{'text': text}], 'role': 'model'},
+            'finishReason': 'STOP',
+            'index': 0
+        }]}
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: greets, accepts every message and records it."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        with server.random_lock:
+            server.connections += 1
+        self.reply('220 localhost stub ESMTP')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip('<> '), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip('<> '))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(data_line)
+                if server.delay_and_roll():
+                    self.reply('451 injected upstream error')
+                    continue
+                with server.random_lock:
+                    server.messages.append({'sender': sender, 'recipients': recipients, 'data': b''.join(data)})
+                self.reply('250 OK queued')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPStubServer(StubBehaviour, socketserver.ThreadingTCPServer):
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        super().__init__(SMTPHandler, latency, jitter, error_rate, seed)
+        self.connections = 0
+        self.messages = []
+
+
+def start_stubs(latency=0.0, jitter=0.0, error_rate=0.0, gemini_latency=None, seed=0):
+    """Start every stub; returns ``{'github', 'stackoverflow', 'gemini', 'smtp'}`` servers."""
+    return {
+        'github': StubServer(GitHubHandler, latency, jitter, error_rate, seed).start(),
+        'stackoverflow': StubServer(StackOverflowHandler, latency, jitter, error_rate, seed).start(),
+        'gemini': StubServer(GeminiHandler, latency if gemini_latency is None else gemini_latency,
+                             jitter, error_rate, seed).start(),
+        'smtp': SMTPStubServer(latency, jitter, error_rate, seed).start(),
+    }
@@ -0,0 +1,36 @@
+"""Add indexes for the snippet, documentation and project query paths
+
+Revision ID: 3c9a1e52b7d4
+Revises: 7378b25cbf67
+Create Date: 2024-10-05 11:42:17.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a1e52b7d4'
+down_revision = '7378b25cbf67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_code_snippet_user_id_submitted_created_at', 'code_snippet',
+                    ['user_id', 'is_user_submitted', 'created_at', 'id'], unique=False)
+    op.create_index('ix_code_snippet_user_id_submitted_documented', 'code_snippet',
+                    ['user_id', 'is_user_submitted', 'has_documentation'], unique=False)
+    op.create_index('ix_code_snippet_undocumented', 'code_snippet', ['id'], unique=False,
+                    sqlite_where=sa.text('has_documentation IS NOT 1'),
+                    postgresql_where=sa.text('has_documentation IS NOT true'))
+    op.create_index(op.f('ix_documentation_snippet_id'), 'documentation', ['snippet_id'], unique=False)
+    op.create_index('ix_project_name_user_id', 'project', ['name', 'user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_project_name_user_id', table_name='project')
+    op.drop_index(op.f('ix_documentation_snippet_id'), table_name='documentation')
+    op.drop_index('ix_code_snippet_undocumented', table_name='code_snippet')
+    op.drop_index('ix_code_snippet_user_id_submitted_documented', table_name='code_snippet')
+    op.drop_index('ix_code_snippet_user_id_submitted_created_at', table_name='code_snippet')
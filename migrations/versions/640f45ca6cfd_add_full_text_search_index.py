@@ -0,0 +1,64 @@
+"""Add full-text search index
+
+Revision ID: 640f45ca6cfd
+Revises: f5ae30355821
+Create Date: 2024-10-03 09:42:51.107265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '640f45ca6cfd'
+down_revision = 'f5ae30355821'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other databases keep using the ILIKE fallback.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""CREATE VIRTUAL TABLE code_snippet_fts USING fts5(
+        name_or_title, code, content='code_snippet', content_rowid='id', prefix='2 3'
+    )""")
+    op.execute("""CREATE TRIGGER code_snippet_fts_ai AFTER INSERT ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(rowid, name_or_title, code) VALUES (new.id, new.name_or_title, new.code);
+    END""")
+    op.execute("""CREATE TRIGGER code_snippet_fts_ad AFTER DELETE ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(code_snippet_fts, rowid, name_or_title, code) VALUES ('delete', old.id, old.name_or_title, old.code);
+    END""")
+    op.execute("""CREATE TRIGGER code_snippet_fts_au AFTER UPDATE OF name_or_title, code ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(code_snippet_fts, rowid, name_or_title, code) VALUES ('delete', old.id, old.name_or_title, old.code);
+        INSERT INTO code_snippet_fts(rowid, name_or_title, code) VALUES (new.id, new.name_or_title, new.code);
+    END""")
+
+    op.execute("""CREATE VIRTUAL TABLE documentation_fts USING fts5(
+        content, content='documentation', content_rowid='id', prefix='2 3'
+    )""")
+    op.execute("""CREATE TRIGGER documentation_fts_ai AFTER INSERT ON documentation BEGIN
+        INSERT INTO documentation_fts(rowid, content) VALUES (new.id, new.content);
+    END""")
+    op.execute("""CREATE TRIGGER documentation_fts_ad AFTER DELETE ON documentation BEGIN
+        INSERT INTO documentation_fts(documentation_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""")
+    op.execute("""CREATE TRIGGER documentation_fts_au AFTER UPDATE OF content ON documentation BEGIN
+        INSERT INTO documentation_fts(documentation_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO documentation_fts(rowid, content) VALUES (new.id, new.content);
+    END""")
+
+    op.execute("INSERT INTO code_snippet_fts(code_snippet_fts) VALUES ('rebuild')")
+    op.execute("INSERT INTO documentation_fts(documentation_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for trigger in ('code_snippet_fts_ai', 'code_snippet_fts_ad', 'code_snippet_fts_au',
+                    'documentation_fts_ai', 'documentation_fts_ad', 'documentation_fts_au'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS documentation_fts")
+    op.execute("DROP TABLE IF EXISTS code_snippet_fts")
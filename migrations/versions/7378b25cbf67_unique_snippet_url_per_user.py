@@ -0,0 +1,45 @@
+"""Unique snippet url per user
+
+Revision ID: 7378b25cbf67
+Revises: 640f45ca6cfd
+Create Date: 2024-10-04 14:08:33.561920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7378b25cbf67'
+down_revision = '640f45ca6cfd'
+branch_labels = None
+depends_on = None
+
+
+# Rows that repeat an earlier row's (user_id, url); the lowest id of each group is kept
+DUPLICATES = """
+    SELECT dup.id FROM code_snippet dup
+    JOIN code_snippet keep ON keep.user_id = dup.user_id AND keep.url = dup.url AND keep.id < dup.id
+"""
+
+
+def upgrade():
+    # An empty url carries nothing, and would collide under the unique index
+    op.execute("UPDATE code_snippet SET url = NULL WHERE url = ''")
+
+    # Gathers before this index could store the same url twice for a user
+    op.execute(f"""UPDATE documentation SET snippet_id = (
+        SELECT min(keep.id) FROM code_snippet keep
+        JOIN code_snippet dup ON keep.user_id = dup.user_id AND keep.url = dup.url
+        WHERE dup.id = documentation.snippet_id
+    ) WHERE snippet_id IN ({DUPLICATES})""")
+    op.execute(f"""UPDATE code_snippet SET has_documentation = TRUE
+        WHERE id IN (SELECT snippet_id FROM documentation)
+        AND id IN (SELECT min(id) FROM code_snippet WHERE url IS NOT NULL GROUP BY user_id, url HAVING count(*) > 1)""")
+    op.execute(f"DELETE FROM code_snippet WHERE id IN ({DUPLICATES})")
+
+    op.create_index('ix_code_snippet_user_id_url', 'code_snippet', ['user_id', 'url'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_code_snippet_user_id_url', table_name='code_snippet')
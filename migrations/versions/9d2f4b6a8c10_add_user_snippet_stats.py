@@ -0,0 +1,45 @@
+"""Add user snippet stats
+
+Revision ID: 9d2f4b6a8c10
+Revises: 3c9a1e52b7d4
+Create Date: 2024-10-06 09:21:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f4b6a8c10'
+down_revision = '3c9a1e52b7d4'
+branch_labels = None
+depends_on = None
+
+BACKFILL = """
+    INSERT INTO user_snippet_stats (user_id, is_user_submitted, dimension, value, total, documented)
+    SELECT user_id, COALESCE(is_user_submitted, false), '{dimension}', {value}, COUNT(*),
+           SUM(CASE WHEN has_documentation THEN 1 ELSE 0 END)
+    FROM code_snippet
+    GROUP BY user_id, COALESCE(is_user_submitted, false){group_by}
+"""
+
+
+def upgrade():
+    op.create_table('user_snippet_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('is_user_submitted', sa.Boolean(), nullable=False),
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=100), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('documented', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'is_user_submitted', 'dimension', 'value')
+    )
+    op.execute(BACKFILL.format(dimension='all', value="'all'", group_by=''))
+    for dimension in ('language', 'source'):
+        value = f"COALESCE({dimension}, 'Unknown')"
+        op.execute(BACKFILL.format(dimension=dimension, value=value, group_by=f", {value}"))
+
+
+def downgrade():
+    op.drop_table('user_snippet_stats')
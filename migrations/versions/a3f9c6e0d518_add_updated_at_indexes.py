@@ -0,0 +1,26 @@
+"""Add updated_at indexes for the similarity index refresh
+
+Revision ID: a3f9c6e0d518
+Revises: e6b2f8d31c47
+Create Date: 2024-10-11 09:36:52.771204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f9c6e0d518'
+down_revision = 'e6b2f8d31c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_code_snippet_user_id_updated_at', 'code_snippet', ['user_id', 'updated_at'], unique=False)
+    op.create_index('ix_documentation_user_id_updated_at', 'documentation', ['user_id', 'updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_documentation_user_id_updated_at', table_name='documentation')
+    op.drop_index('ix_code_snippet_user_id_updated_at', table_name='code_snippet')
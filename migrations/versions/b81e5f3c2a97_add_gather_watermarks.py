@@ -0,0 +1,36 @@
+"""Add gather watermarks and subscriptions
+
+Revision ID: b81e5f3c2a97
+Revises: 9d2f4b6a8c10
+Create Date: 2024-10-08 14:02:17.604391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81e5f3c2a97'
+down_revision = '9d2f4b6a8c10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('gather_watermark',
+    sa.Column('source', sa.String(length=50), nullable=False),
+    sa.Column('watermark', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('source')
+    )
+    op.create_table('gather_subscription',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('gather_subscription')
+    op.drop_table('gather_watermark')
@@ -0,0 +1,84 @@
+"""Add user_id to the full-text search index
+
+Revision ID: c52e7d0b9f14
+Revises: a3f9c6e0d518
+Create Date: 2024-10-12 10:15:08.431925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e7d0b9f14'
+down_revision = 'a3f9c6e0d518'
+branch_labels = None
+depends_on = None
+
+TRIGGERS = ('code_snippet_fts_ai', 'code_snippet_fts_ad', 'code_snippet_fts_au',
+            'documentation_fts_ai', 'documentation_fts_ad', 'documentation_fts_au')
+
+
+def drop_search_index():
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS documentation_fts")
+    op.execute("DROP TABLE IF EXISTS code_snippet_fts")
+
+
+def create_search_index(snippet_columns, documentation_columns):
+    old_snippet = ', '.join(f'old.{name}' for name in snippet_columns)
+    new_snippet = ', '.join(f'new.{name}' for name in snippet_columns)
+    old_documentation = ', '.join(f'old.{name}' for name in documentation_columns)
+    new_documentation = ', '.join(f'new.{name}' for name in documentation_columns)
+    snippet_columns = ', '.join(snippet_columns)
+    documentation_columns = ', '.join(documentation_columns)
+
+    op.execute(f"""CREATE VIRTUAL TABLE code_snippet_fts USING fts5(
+        {snippet_columns}, content='code_snippet', content_rowid='id', prefix='2 3'
+    )""")
+    op.execute(f"""CREATE TRIGGER code_snippet_fts_ai AFTER INSERT ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(rowid, {snippet_columns}) VALUES (new.id, {new_snippet});
+    END""")
+    op.execute(f"""CREATE TRIGGER code_snippet_fts_ad AFTER DELETE ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(code_snippet_fts, rowid, {snippet_columns}) VALUES ('delete', old.id, {old_snippet});
+    END""")
+    op.execute(f"""CREATE TRIGGER code_snippet_fts_au AFTER UPDATE OF {snippet_columns} ON code_snippet BEGIN
+        INSERT INTO code_snippet_fts(code_snippet_fts, rowid, {snippet_columns}) VALUES ('delete', old.id, {old_snippet});
+        INSERT INTO code_snippet_fts(rowid, {snippet_columns}) VALUES (new.id, {new_snippet});
+    END""")
+
+    op.execute(f"""CREATE VIRTUAL TABLE documentation_fts USING fts5(
+        {documentation_columns}, content='documentation', content_rowid='id', prefix='2 3'
+    )""")
+    op.execute(f"""CREATE TRIGGER documentation_fts_ai AFTER INSERT ON documentation BEGIN
+        INSERT INTO documentation_fts(rowid, {documentation_columns}) VALUES (new.id, {new_documentation});
+    END""")
+    op.execute(f"""CREATE TRIGGER documentation_fts_ad AFTER DELETE ON documentation BEGIN
+        INSERT INTO documentation_fts(documentation_fts, rowid, {documentation_columns}) VALUES ('delete', old.id, {old_documentation});
+    END""")
+    op.execute(f"""CREATE TRIGGER documentation_fts_au AFTER UPDATE OF {documentation_columns} ON documentation BEGIN
+        INSERT INTO documentation_fts(documentation_fts, rowid, {documentation_columns}) VALUES ('delete', old.id, {old_documentation});
+        INSERT INTO documentation_fts(rowid, {documentation_columns}) VALUES (new.id, {new_documentation});
+    END""")
+
+    op.execute("INSERT INTO code_snippet_fts(code_snippet_fts) VALUES ('rebuild')")
+    op.execute("INSERT INTO documentation_fts(documentation_fts) VALUES ('rebuild')")
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other databases keep using the ILIKE fallback.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    # user_id is indexed so a search only reads the caller's rows
+    drop_search_index()
+    create_search_index(('name_or_title', 'code', 'user_id'), ('content', 'user_id'))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    drop_search_index()
+    create_search_index(('name_or_title', 'code'), ('content',))
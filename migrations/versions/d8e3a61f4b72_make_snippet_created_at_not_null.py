@@ -0,0 +1,47 @@
+"""Make code_snippet.created_at not null
+
+Revision ID: d8e3a61f4b72
+Revises: c52e7d0b9f14
+Create Date: 2024-10-12 14:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8e3a61f4b72'
+down_revision = 'c52e7d0b9f14'
+branch_labels = None
+depends_on = None
+
+
+def snippet_triggers():
+    # SQLite batch mode rebuilds the table, which drops the full-text search triggers on it
+    if op.get_bind().dialect.name != 'sqlite':
+        return []
+    return [sql for (sql,) in op.get_bind().execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'code_snippet'"
+    ))]
+
+
+def upgrade():
+    # Cursor pagination seeks on (created_at, id), which a NULL cannot take part in
+    op.execute("UPDATE code_snippet SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL")
+    triggers = snippet_triggers()
+    with op.batch_alter_table('code_snippet', schema=None) as batch_op:
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               nullable=False)
+    for sql in triggers:
+        op.execute(sql)
+
+
+def downgrade():
+    triggers = snippet_triggers()
+    with op.batch_alter_table('code_snippet', schema=None) as batch_op:
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               nullable=True)
+    for sql in triggers:
+        op.execute(sql)
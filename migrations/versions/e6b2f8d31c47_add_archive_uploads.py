@@ -0,0 +1,54 @@
+"""Add archive uploads
+
+Revision ID: e6b2f8d31c47
+Revises: d4a7c9e1f250
+Create Date: 2024-10-10 16:21:45.302918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b2f8d31c47'
+down_revision = 'd4a7c9e1f250'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archive_upload',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('ignored_files', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_archive_upload_user_id'), 'archive_upload', ['user_id'], unique=False)
+
+    op.create_table('archive_upload_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('upload_id', sa.String(length=64), nullable=False),
+    sa.Column('path', sa.String(length=500), nullable=False),
+    sa.Column('snippet_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('detail', sa.String(length=255), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['snippet_id'], ['code_snippet.id'], ),
+    sa.ForeignKeyConstraint(['upload_id'], ['archive_upload.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_archive_upload_file_snippet_id'), 'archive_upload_file', ['snippet_id'], unique=False)
+    op.create_index(op.f('ix_archive_upload_file_upload_id'), 'archive_upload_file', ['upload_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_archive_upload_file_upload_id'), table_name='archive_upload_file')
+    op.drop_index(op.f('ix_archive_upload_file_snippet_id'), table_name='archive_upload_file')
+    op.drop_table('archive_upload_file')
+    op.drop_index(op.f('ix_archive_upload_user_id'), table_name='archive_upload')
+    op.drop_table('archive_upload')
@@ -0,0 +1,35 @@
+"""Add documentation cache
+
+Revision ID: f5ae30355821
+Revises: fa37e379fcea
+Create Date: 2024-10-02 11:20:14.318402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5ae30355821'
+down_revision = 'fa37e379fcea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('documentation_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_documentation_cache_created_at'), 'documentation_cache', ['created_at'], unique=False)
+    op.create_index(op.f('ix_documentation_cache_expires_at'), 'documentation_cache', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_documentation_cache_expires_at'), table_name='documentation_cache')
+    op.drop_index(op.f('ix_documentation_cache_created_at'), table_name='documentation_cache')
+    op.drop_table('documentation_cache')
@@ -33,4 +33,143 @@ def test_api_key_required(client):
     assert 'Invalid or missing API Key' in json.loads(response.data)['error']
 
     response = client.post('/api/v1/gather', headers={'X-API-Key': 'test_api_key'})
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def _auth_headers(user_id):
+    from app.services.auth_service import generate_tokens
+    access_token, _ = generate_tokens(user_id)
+    return {'Authorization': f'Bearer {access_token}'}
+
+
+def test_cursor_pagination_walks_all_pages(app):
+    from datetime import datetime, timedelta
+    base = datetime(2024, 1, 1)
+    db.session.add_all([
+        CodeSnippet(user_id=1, name_or_title=f'Snippet {i}', url=f'https://example.com/{i}',
+                    created_at=base + timedelta(minutes=i // 2))
+        for i in range(7)
+    ])
+    db.session.commit()
+
+    client = app.test_client()
+    seen, cursor = [], ''
+    while cursor is not None:
+        response = client.get(f'/api/v1/data?per_page=3&cursor={cursor}', headers=_auth_headers(1))
+        assert response.status_code == 200
+        page = json.loads(response.data)['snippets']
+        assert 'total' not in page
+        seen.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+
+    assert seen == sorted(seen, reverse=True) and len(set(seen)) == 7
+
+    response = client.get('/api/v1/search?q=snippet&cursor=&include_total=1', headers=_auth_headers(1))
+    assert json.loads(response.data)['total'] == 7
+
+    response = client.get('/api/v1/data?cursor=not-a-cursor', headers=_auth_headers(1))
+    assert response.status_code == 400
+
+
+def test_async_submit_returns_job(app, monkeypatch):
+    from app.tasks import submit_code_task
+    queued = []
+    monkeypatch.setattr(submit_code_task, 'apply_async', lambda *args, **kwargs: queued.append(kwargs))
+
+    client = app.test_client()
+    response = client.post('/api/v1/submit?async=1', json={'code': 'x = 1', 'projectName': 'Demo'}, headers=_auth_headers(1))
+    assert response.status_code == 202
+    job = json.loads(response.data)
+    assert queued[0]['task_id'] == job['job_id']
+    assert CodeSnippet.query.count() == 0
+
+    response = client.get(job['status_url'], headers=_auth_headers(2))
+    assert response.status_code == 404
+
+
+def test_stream_submit_sends_chunks_and_saves_documentation(app, monkeypatch):
+    from types import SimpleNamespace
+    from app.models.documentation import Documentation
+    from app.services import ai_service, cache_service
+
+    class FakeModel:
+        def generate_content(self, prompt, stream=False):
+            for text in ['Overview\n====', '====\nAdds one', ' to x.\n']:
+                yield SimpleNamespace(text=text)
+
+    cache_service.clear_memory_cache()
+    monkeypatch.setattr(ai_service, 'setup_gemini', lambda: FakeModel())
+    client = app.test_client()
+    response = client.post('/api/v1/submit/stream', json={'code': 'x += 1', 'projectName': 'Demo'}, headers=_auth_headers(1))
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = [block.split('\n', 1) for block in response.get_data(as_text=True).strip().split('\n\n')]
+    chunks = [json.loads(data[len('data: '):])['text'] for event, data in events if event == 'event: chunk']
+    assert ''.join(chunks).strip() == '# Overview\nAdds one to x.'
+    assert events[-1][0] == 'event: done'
+
+    done = json.loads(events[-1][1][len('data: '):])
+    assert Documentation.query.get(done['documentation_id']).content == '# Overview\nAdds one to x.'
+
+
+def test_snippet_lists_leave_out_code_unless_requested(app):
+    from sqlalchemy import event
+    db.session.add(CodeSnippet(user_id=1, name_or_title='Big', url='https://example.com/big', code='x' * 10000))
+    db.session.commit()
+    db.session.expire_all()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        client = app.test_client()
+        response = client.get('/api/v1/data', headers=_auth_headers(1))
+        item = json.loads(response.data)['snippets']['items'][0]
+        assert 'code' not in item and item['name_or_title'] == 'Big'
+        row_queries = [statement for statement in statements if not statement.startswith('SELECT count')]
+        assert row_queries and not any('code_snippet.code' in statement for statement in row_queries)
+
+        response = client.get('/api/v1/data?fields=name_or_title,code', headers=_auth_headers(1))
+        assert json.loads(response.data)['snippets']['items'][0] == {
+            'id': item['id'], 'name_or_title': 'Big', 'code': 'x' * 10000
+        }
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    response = client.get('/api/v1/data?fields=password', headers=_auth_headers(1))
+    assert response.status_code == 400
+
+
+def test_metrics_break_down_request_time(app):
+    import time
+    from app.services import gather_service
+    from app.utils.metrics import reset_metrics, upstream_timer
+
+    def fetch_page(api_url, page):
+        with upstream_timer('github'):
+            time.sleep(0.05)
+        return [{'source': 'GitHub', 'url': f'{api_url}/{page}', 'name_or_title': 'Repo'}]
+
+    app.config.update(GITHUB_API_URL=None, STACKOVERFLOW_API_URL=None, METRICS_URL='https://metrics.example')
+    gather_service.register_source('Metrics', fetch_page, 'METRICS_URL')
+    reset_metrics()
+    try:
+        client = app.test_client()
+        assert client.post('/api/v1/gather', headers=_auth_headers(1)).status_code == 200
+        assert client.get('/api/v1/data', headers=_auth_headers(1)).status_code == 200
+    finally:
+        gather_service.unregister_source('Metrics')
+
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+
+    assert samples['codebase_http_request_duration_seconds_count{endpoint="api.api_gather_data",method="POST",status="200"}'] == 1
+    assert samples['codebase_http_request_upstream_seconds_sum{endpoint="api.api_gather_data",service="github"}'] >= 0.15
+    assert samples['codebase_upstream_request_duration_seconds_count{service="github",outcome="ok"}'] == 3
+    assert samples['codebase_http_request_db_queries_sum{endpoint="api.api_get_data"}'] >= 2
+    assert samples['codebase_http_request_db_seconds_count{endpoint="api.api_get_data"}'] == 1
@@ -0,0 +1,150 @@
+import os
+import re
+
+import pytest
+from sqlalchemy import event, text
+
+from app import create_app, db
+from app.models.api_key import APIKey
+from app.services.auth_service import flush_api_key_usage
+from app.services.documentation_service import save_submission
+from config.config import Config
+
+# Enough rows for ANALYZE to favour the indexes; QUERY_PLAN_SEED_SNIPPETS=1000000 checks production-sized tables
+SEED_SNIPPETS = int(os.environ.get('QUERY_PLAN_SEED_SNIPPETS', 20000))
+SEED_USERS = 1000
+# Scanning a table through an index still reads all of it; only SEARCH narrows to the matching rows
+TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+@pytest.fixture(scope='module')
+def seeded_app(tmp_path_factory):
+    class QueryPlanConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'codebase.db'}"
+
+    app = create_app(QueryPlanConfig)
+    with app.app_context():
+        db.create_all()
+        params = {'count': SEED_SNIPPETS, 'users': SEED_USERS}
+        db.session.execute(text("""
+            INSERT INTO code_snippet (id, user_id, project_id, url, name_or_title, language, stars, source,
+                                      created_at, updated_at, is_user_submitted, has_documentation, is_repo)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :count)
+            SELECT n, n % :users + 1, n % 5000 + 1, 'https://example.com/' || n, 'Snippet ' || n, 'Python',
+                   n % 500, 'github', datetime('2024-01-01', '+' || n || ' seconds'),
+                   datetime('2024-01-01', '+' || n || ' seconds'), n % 2, n % 50 != 0, 0
+            FROM seq
+        """), params)
+        db.session.execute(text("""
+            INSERT INTO documentation (content, user_id, project_id, snippet_id, created_at, updated_at)
+            SELECT 'Docs for snippet ' || id, user_id, project_id, id, created_at, updated_at
+            FROM code_snippet WHERE id % 10 = 1
+        """))
+        db.session.execute(text("""
+            INSERT INTO project (id, name, user_id, created_at)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 5000)
+            SELECT n, 'Project ' || n, n % :users + 1, datetime('2024-01-01') FROM seq
+        """), params)
+        db.session.add(APIKey(key='plan-key', user_id=1))
+        db.session.commit()
+        db.session.execute(text('ANALYZE'))
+        yield app
+        flush_api_key_usage()
+        db.session.remove()
+        db.drop_all()
+
+
+def _auth_headers(user_id):
+    from app.services.auth_service import generate_tokens
+    access_token, _ = generate_tokens(user_id)
+    return {'Authorization': f'Bearer {access_token}'}
+
+
+def _capture_selects(run):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+
+def _plan(statement, parameters):
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+
+def _full_scans(statements, partial_indexes=()):
+    """Plan steps that read a whole table or index; a partial index only holds the rows asked for."""
+    tables = set(db.metadata.tables)
+    scans = []
+    for statement, parameters in statements:
+        for detail in _plan(statement, parameters):
+            match = TABLE_SCAN.match(detail)
+            if match and match.group(1) in tables and match.group(2) not in partial_indexes:
+                scans.append((detail, statement))
+    return scans
+
+
+ROUTES = [
+    ('GET', '/api/v1/data?page=3'),
+    ('GET', '/api/v1/data?cursor=&include_total=1'),
+    ('GET', '/api/v1/user-snippets?page=2&fields=all'),
+    ('GET', '/api/v1/user-snippets?cursor='),
+    ('GET', '/api/v1/dashboard'),
+    ('GET', '/api/v1/dashboard?cursor='),
+    ('GET', '/api/v1/search?q=snippet&language=Python'),
+    ('GET', '/api/v1/search?q=snippet&cursor='),
+    ('GET', '/api/v1/documentation/2001'),
+    ('GET', '/api/v1/export'),
+]
+
+
+@pytest.mark.parametrize('method,url', ROUTES)
+def test_route_queries_use_indexes(seeded_app, method, url):
+    client = seeded_app.test_client()
+    # Streamed responses only run their queries as the body is read
+    statements = _capture_selects(lambda: client.open(url, method=method, headers=_auth_headers(2)).get_data())
+    assert statements
+    assert _full_scans(statements) == []
+
+
+@pytest.mark.parametrize('url', ['/api/v1/data?cursor=', '/api/v1/user-snippets?cursor=', '/api/v1/dashboard?cursor='])
+def test_cursor_pages_read_in_index_order(seeded_app, url):
+    client = seeded_app.test_client()
+    statements = _capture_selects(lambda: client.get(url, headers=_auth_headers(2)))
+    page_queries = [(statement, parameters) for statement, parameters in statements if 'ORDER BY' in statement]
+    assert page_queries
+    for statement, parameters in page_queries:
+        assert not any('TEMP B-TREE' in detail for detail in _plan(statement, parameters))
+
+
+def test_documentation_backlog_query_uses_partial_index(seeded_app, monkeypatch):
+    from app.tasks import generate_documentation_batch_task
+    monkeypatch.setattr(generate_documentation_batch_task, 'delay', lambda ids: type('Task', (), {'id': 't'}))
+    client = seeded_app.test_client()
+    statements = _capture_selects(lambda: client.get('/api/v1/documentation?limit=40', headers={'X-API-Key': 'plan-key'}))
+    assert any('has_documentation IS NOT' in statement for statement, _ in statements)
+    assert _full_scans(statements, partial_indexes=('ix_code_snippet_undocumented',)) == []
+
+
+def test_submission_project_lookup_uses_index(seeded_app):
+    statements = _capture_selects(lambda: save_submission(7, 'Project 7', '# Docs', code='print(1)'))
+    assert any('FROM project' in statement for statement, _ in statements)
+    assert _full_scans(statements) == []
+
+
+def test_gather_store_url_lookup_uses_index(seeded_app):
+    from app.services.snippet_service import store_gathered_snippets
+    items = [{'source': 'GitHub', 'name_or_title': f'Repo {n}', 'url': f'https://example.com/{n}'}
+             for n in (1001, 2001, 3001, 'new-1', 'new-2')]
+    statements = _capture_selects(lambda: store_gathered_snippets(2, items))
+    assert any('FROM code_snippet' in statement for statement, _ in statements)
+    assert _full_scans(statements) == []
@@ -0,0 +1,1028 @@
+import pytest
+
+from app.services import cache_service
+from app.services.cache_service import make_cache_key, get_cached_documentation, store_cached_documentation
+
+
+def test_cache_key_ignores_trailing_whitespace():
+    assert make_cache_key("def f():\r\n    pass   \n\n", 'gemini-pro') == make_cache_key("def f():\n    pass", 'gemini-pro')
+    assert make_cache_key("def f(): pass", 'gemini-pro') != make_cache_key("def f(): pass", 'gemini-1.5')
+
+
+def test_documentation_cache_tiers(app):
+    cache_service.clear_memory_cache()
+    key = make_cache_key("print('hi')", 'gemini-pro')
+    assert get_cached_documentation(key) is None
+
+    store_cached_documentation(key, 'gemini-pro', '# Docs')
+    assert get_cached_documentation(key) == '# Docs'
+
+    cache_service.clear_memory_cache()
+    before = cache_service.get_cache_stats()['persistent_hits']
+    assert get_cached_documentation(key) == '# Docs'
+    assert cache_service.get_cache_stats()['persistent_hits'] == before + 1
+
+    from app.utils.metrics import render_metrics
+    rendered = render_metrics()
+    assert 'codebase_doc_cache_events_total{event="persistent_hits"}' in rendered
+    assert 'codebase_doc_cache_events_total{event="misses"}' in rendered
+    assert 'codebase_doc_cache_memory_entries 1' in rendered
+
+
+def test_build_fts_query_quotes_terms_and_prefixes_last():
+    from app.services.search_service import build_fts_query
+    assert build_fts_query('binary sea') == '"binary" "sea"*'
+    assert build_fts_query('json* "parse" OR') == '"json"* "parse" "OR"*'
+    assert build_fts_query('  ') == ''
+
+
+def test_search_snippets_ranks_code_and_documentation(app):
+    from app import db
+    from app.models import CodeSnippet, Documentation, User
+    from app.services.search_service import search_snippets
+
+    user = User(name='Ada', email='ada@example.com')
+    db.session.add(user)
+    db.session.flush()
+    first = CodeSnippet(user_id=user.id, name_or_title='Binary search', code='def bisect(items, target): pass')
+    second = CodeSnippet(user_id=user.id, name_or_title='Sorting helpers', code='def quicksort(items): pass')
+    other = CodeSnippet(user_id=user.id + 1, name_or_title='Binary search', code='')
+    db.session.add_all([first, second, other])
+    db.session.flush()
+    db.session.add(Documentation(content='Implements a binary partition scheme.', user_id=user.id, snippet_id=second.id))
+    db.session.commit()
+
+    items, total = search_snippets(user.id, 'binar')
+    assert total == 2
+    assert items[0]['id'] == first.id
+    assert '<mark>Binary</mark>' in items[0]['highlights']['name_or_title']
+    assert '<mark>binary</mark>' in items[1]['highlights']['documentation']
+
+    assert items[0]['score'] == 1.0
+
+    first.name_or_title = 'Linear scan'
+    db.session.commit()
+    items, total = search_snippets(user.id, 'binary')
+    assert [item['id'] for item in items] == [second.id]
+
+    # Matched text is escaped before the <mark> tags go in
+    db.session.add(CodeSnippet(user_id=user.id, name_or_title='<script>alert(1)</script> binary', code='<b>binary</b>'))
+    db.session.commit()
+    items, _ = search_snippets(user.id, 'binary')
+    highlights = next(item['highlights'] for item in items if item['id'] not in (first.id, second.id))
+    assert highlights['name_or_title'] == '&lt;script&gt;alert(1)&lt;/script&gt; <mark>binary</mark>'
+    assert highlights['code'] == '&lt;b&gt;<mark>binary</mark>&lt;/b&gt;'
+
+    # Another user's id is not a search term, and their rows never come back
+    items, total = search_snippets(user.id + 1, str(user.id + 1))
+    assert (items, total) == ([], 0)
+
+
+def test_keyset_pagination_clamps_page_size(app):
+    from werkzeug.datastructures import MultiDict
+    from app import db
+    from app.models import CodeSnippet
+    from app.utils.pagination import get_per_page, keyset_paginate
+
+    db.session.add_all([CodeSnippet(user_id=1, name_or_title=f'snippet {i}') for i in range(3)])
+    db.session.commit()
+
+    app.config['MAX_PER_PAGE'] = 2
+    assert [get_per_page(MultiDict(args)) for args in ({}, {'per_page': '0'}, {'per_page': '-5'}, {'per_page': '500'})] == [2, 1, 1, 2]
+
+    query = CodeSnippet.query.filter_by(user_id=1)
+    rows, cursor, _ = keyset_paginate(query, CodeSnippet, None, 0)
+    assert len(rows) == 1 and cursor
+    rows, cursor, _ = keyset_paginate(query, CodeSnippet, cursor, 0)
+    assert len(rows) == 1 and cursor
+
+
+def test_gather_all_fetches_sources_concurrently(app):
+    import time
+    from app.services import gather_service
+
+    def slow_source(delay, label):
+        def fetch_page(api_url, page):
+            time.sleep(delay)
+            return [{'source': label, 'url': f'{api_url}/{page}', 'name_or_title': label}]
+        return fetch_page
+
+    app.config['FAST_URL'] = 'https://fast.example'
+    app.config['SLOW_URL'] = 'https://slow.example'
+    gather_service.register_source('Fast', slow_source(0.1, 'Fast'), 'FAST_URL', max_concurrency=3)
+    gather_service.register_source('Slow', slow_source(0.3, 'Slow'), 'SLOW_URL', max_concurrency=3)
+    gather_service.register_source('Hung', slow_source(5, 'Hung'), 'SLOW_URL', max_concurrency=1)
+    try:
+        started = time.monotonic()
+        results = gather_service.gather_all(['Fast', 'Slow'], pages=3)
+        assert time.monotonic() - started < 0.6
+        assert len(results) == 6
+
+        started = time.monotonic()
+        results = gather_service.gather_all(['Fast', 'Hung'], pages=2, deadline=0.5)
+        assert time.monotonic() - started < 1
+        assert {item['source'] for item in results} == {'Fast'}
+    finally:
+        for name in ('Fast', 'Slow', 'Hung'):
+            gather_service.unregister_source(name)
+
+
+def test_store_gathered_snippets_skips_existing_urls(app, monkeypatch):
+    from app.models import CodeSnippet
+    from app.services import snippet_service
+    from app.services.snippet_service import store_gathered_snippets
+
+    items = [
+        {'source': 'GitHub', 'name_or_title': 'Repo', 'url': 'https://github.com/a/b', 'language': 'Python'},
+        {'source': 'StackOverflow', 'name_or_title': 'Question', 'url': 'https://stackoverflow.com/q/1', 'code': 'x = 1'},
+        {'source': 'StackOverflow', 'name_or_title': 'Question', 'url': 'https://stackoverflow.com/q/1'},
+    ]
+    assert store_gathered_snippets(1, items) == 2
+    assert store_gathered_snippets(1, items) == 0
+    assert store_gathered_snippets(2, items) == 2
+
+    repo = CodeSnippet.query.filter_by(user_id=1, url='https://github.com/a/b').one()
+    assert repo.is_repo and repo.code == repo.url
+    assert CodeSnippet.query.count() == 4
+
+    # Rows that raced in after the lookup are not counted as inserted
+    monkeypatch.setattr(snippet_service, 'find_existing_urls', lambda session, user_id, urls: set())
+    items.append({'source': 'GitHub', 'name_or_title': 'New', 'url': 'https://github.com/a/c'})
+    assert store_gathered_snippets(1, items) == 1
+    assert CodeSnippet.query.count() == 5
+
+    # Dialects without ON CONFLICT skip the clashing rows one SAVEPOINT at a time
+    monkeypatch.setattr(snippet_service, '_on_conflict_do_nothing', lambda table, conflict_columns: None)
+    items.append({'source': 'GitHub', 'name_or_title': 'Newer', 'url': 'https://github.com/a/d'})
+    assert store_gathered_snippets(1, items) == 1
+    assert CodeSnippet.query.count() == 6
+
+
+def test_api_key_usage_is_buffered_and_revocation_invalidates(app):
+    from app import db
+    from app.models import APIKey
+    from app.services.auth_service import authenticate_api_key, flush_api_key_usage, revoke_api_key
+
+    api_key = APIKey(key='k' * 32, user_id=7)
+    db.session.add(api_key)
+    db.session.commit()
+
+    assert authenticate_api_key('k' * 32) == 7
+    assert authenticate_api_key('k' * 32) == 7
+    db.session.refresh(api_key)
+    assert api_key.last_used is None
+
+    assert flush_api_key_usage() == 1
+    db.session.refresh(api_key)
+    assert api_key.last_used is not None
+
+    assert revoke_api_key(7, api_key.id)
+    assert authenticate_api_key('k' * 32) is None
+    assert authenticate_api_key('missing') is None
+
+
+def test_api_key_revocation_reaches_other_processes_through_redis(app, monkeypatch):
+    from app import db
+    from app.models import APIKey
+    from app.services import auth_service
+
+    class FakeRedis:
+        def __init__(self):
+            self.values = {}
+
+        def set(self, key, value, ex=None):
+            self.values[key] = (value, ex)
+
+        def exists(self, key):
+            return int(key in self.values)
+
+    client = FakeRedis()
+    monkeypatch.setattr(auth_service, 'get_redis', lambda: client)
+    api_key = APIKey(key='r' * 32, user_id=8)
+    db.session.add(api_key)
+    db.session.commit()
+    assert auth_service.authenticate_api_key('r' * 32) == 8
+
+    # Another process revokes the key: the row is gone and the marker is published, but this cache still holds it
+    db.session.delete(api_key)
+    db.session.commit()
+    auth_service._publish_revocation('r' * 32)
+    assert 'r' * 32 not in str(client.values)
+    assert list(client.values.values()) == [(1, app.config.get('API_KEY_CACHE_TTL', auth_service.API_KEY_CACHE_TTL) + 1)]
+    assert auth_service.authenticate_api_key('r' * 32) is None
+    auth_service.flush_api_key_usage()
+
+
+def test_batch_task_packs_snippets_and_saves_documentation(app, monkeypatch):
+    import re
+    from app import db
+    from app.models import CodeSnippet, Documentation
+    from app.services import ai_service
+    from app.tasks import generate_documentation_batch_task
+
+    cache_service.clear_memory_cache()
+    snippets = [CodeSnippet(user_id=1, name_or_title=f'Snippet {i}', code=f'x = {i}') for i in range(3)]
+    db.session.add_all(snippets)
+    db.session.commit()
+    db.session.add(Documentation(content='stale', user_id=1, snippet_id=snippets[0].id))
+    db.session.commit()
+
+    prompts = []
+
+    def fake_generate(prompt, post_process=True):
+        prompts.append(prompt)
+        ids = [int(id) for id in re.findall(r'=== SNIPPET (\d+) ===\nName', prompt)]
+        return '\n'.join(f'=== SNIPPET {id} ===\nDocs for {id}' for id in ids)
+
+    monkeypatch.setattr(ai_service, 'generate_documentation_from_prompt', fake_generate)
+    result = generate_documentation_batch_task.run([snippet.id for snippet in snippets])
+
+    assert len(prompts) == 1
+    assert sorted(result['documented']) == [snippet.id for snippet in snippets]
+    assert Documentation.query.count() == 3
+    assert Documentation.query.filter_by(snippet_id=snippets[0].id).one().content == f'Docs for {snippets[0].id}'
+    assert CodeSnippet.query.filter_by(has_documentation=True).count() == 3
+
+
+def test_nested_documentation_pools_share_one_gemini_cap(app, monkeypatch):
+    import threading
+    import time
+    from app.services import ai_service, rate_limit_service
+
+    app.config.update(DOC_BATCH_CONCURRENCY=2, REDIS_URL=None, GEMINI_RATE_LIMIT=6000, GEMINI_BURST=100)
+    rate_limit_service.reset_limiter()
+    ai_service.reset_call_slots()
+    lock = threading.Lock()
+    running = {'now': 0, 'max': 0}
+
+    class FakeModel:
+        def generate_content(self, prompt, stream=False):
+            if stream:
+                return self.stream()
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            time.sleep(0.01)
+            with lock:
+                running['now'] -= 1
+            return prompt
+
+        def stream(self):
+            # With DOC_BATCH_CONCURRENCY=2 and this call holding a slot, only one is left
+            slots = ai_service._get_call_slots()
+            free = 0
+            while slots.acquire(blocking=False):
+                free += 1
+            for _ in range(free):
+                slots.release()
+            running['stream_free_slots'] = free
+            yield type('Chunk', (), {'text': 'Streamed docs\n'})()
+
+    monkeypatch.setattr(ai_service, 'setup_gemini', lambda: FakeModel())
+
+    def level(depth):
+        if depth == 0:
+            return ai_service.generate_content('x')
+        return ai_service.run_in_app_context([lambda: level(depth - 1)] * 2)
+
+    try:
+        level(3)
+        assert running['max'] == 2
+
+        # A streamed call takes a slot from the same cap
+        assert 'Streamed docs' in ''.join(ai_service.stream_documentation_from_prompt('streamed prompt'))
+        assert running['stream_free_slots'] == 1
+    finally:
+        rate_limit_service.reset_limiter()
+        ai_service.reset_call_slots()
+
+
+def test_pack_snippets_respects_token_budget():
+    from app.services.ai_service import pack_snippets
+    items = [{'id': i, 'code': 'x' * size} for i, size in enumerate([400, 400, 4000, 40, 40, 40])]
+    groups = pack_snippets(items, token_budget=300, max_items=2)
+    assert [[item['id'] for item in group] for group in groups] == [[0, 1], [2], [3, 4], [5]]
+
+
+def test_repository_fetcher_uses_conditional_requests(app):
+    import base64
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from app.services import repository_service
+    from app.services.ai_service import fetch_repository_content
+    from app.services.repository_service import clear_repository_state
+
+    requests_seen = []
+
+    class GitHubStub(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            if self.path == '/repos/octo/demo/commits/HEAD':
+                if self.headers.get('If-None-Match') == '"head-1"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self._send(b'abc123', etag='"head-1"')
+            elif self.path == '/repos/octo/demo/git/trees/abc123?recursive=1':
+                self._send(json.dumps({'sha': 't1', 'truncated': False, 'tree': [
+                    {'path': 'src', 'type': 'tree', 'sha': 's0'},
+                    {'path': 'src/app.py', 'type': 'blob', 'sha': 's1', 'size': 10},
+                ]}).encode())
+            elif self.path == '/repos/octo/demo/readme':
+                self._send(json.dumps({'content': base64.b64encode(b'# Demo').decode()}).encode(), etag='"readme-1"')
+            else:
+                self.send_response(404)
+                self.end_headers()
+
+        def _send(self, body, etag=None):
+            self.send_response(200)
+            if etag:
+                self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GitHubStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config['GITHUB_API_BASE'] = f'http://127.0.0.1:{server.server_port}'
+    clear_repository_state()
+    try:
+        with app.app_context():
+            content = fetch_repository_content('https://github.com/octo/demo')
+            assert content['readme'] == '# Demo' and content['sha'] == 'abc123'
+            assert content['file_structure'] == ['src/app.py']
+            assert content['files'] == [{'path': 'src/app.py', 'type': 'blob', 'sha': 's1', 'size': 10}]
+            fetch_repository_content('https://github.com/octo/demo/')
+            assert len(requests_seen) == 3
+
+        with app.app_context():
+            assert fetch_repository_content('https://github.com/octo/demo')['readme'] == '# Demo'
+            assert requests_seen[3:] == ['/repos/octo/demo/commits/HEAD']
+
+        # The per-repository state is an LRU, so a long-lived worker does not grow without bound
+        app.config['REPO_STATE_CACHE_SIZE'] = 1
+        clear_repository_state()
+        with app.app_context():
+            fetch_repository_content('https://github.com/octo/demo')
+            state = repository_service._get_repo_state()
+            state['octo/other'] = {}
+            assert list(state) == ['octo/other']
+    finally:
+        server.shutdown()
+
+
+def test_gemini_limiter_and_circuit_breaker_without_redis(app):
+    from app.services import rate_limit_service
+    from app.services.rate_limit_service import CircuitOpenError, RateLimitExceeded, gemini_call
+
+    app.config.update(REDIS_URL=None, GEMINI_RATE_LIMIT=60, GEMINI_BURST=2,
+                      GEMINI_QUEUE_TIMEOUT=0, GEMINI_BREAKER_THRESHOLD=2, GEMINI_BREAKER_RESET=60)
+    rate_limit_service.reset_limiter()
+    try:
+        for _ in range(2):
+            with gemini_call():
+                pass
+        with pytest.raises(RateLimitExceeded):
+            with gemini_call():
+                pass
+
+        rate_limit_service._get_bucket().tokens = 2
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                with gemini_call():
+                    raise ValueError('503 upstream unavailable')
+        with pytest.raises(CircuitOpenError):
+            with gemini_call():
+                pass
+
+        stats = rate_limit_service.get_limiter_stats()
+        assert stats['circuit_open'] is True
+        assert stats['local'] == {'queued': 0, 'admitted': 4, 'rejected': 1, 'short_circuited': 1, 'failures': 2}
+
+        # A half-open trial held by a stream that is closed mid-answer must not wedge the breaker
+        breaker = rate_limit_service._get_breaker()
+        breaker.opened_until = 0
+        rate_limit_service._get_bucket().tokens = 2
+
+        def stream():
+            with gemini_call():
+                yield 'partial'
+
+        reader = stream()
+        assert next(reader) == 'partial'
+        assert breaker.trial_in_flight is True
+        reader.close()
+        assert breaker.trial_in_flight is False
+        with gemini_call():
+            pass
+        assert breaker.failures == 0
+    finally:
+        rate_limit_service.reset_limiter()
+
+
+def test_user_stats_follow_gather_submit_and_documentation(app):
+    from app import db
+    from app.models.code_snippet import CodeSnippet
+    from app.services.documentation_service import save_snippet_documentation, save_submission
+    from app.services.snippet_service import store_gathered_snippets
+    from app.services.stats_service import get_user_stats, rebuild_user_stats
+
+    store_gathered_snippets(1, [
+        {'url': 'https://stackoverflow.com/q/1', 'source': 'StackOverflow', 'language': 'Python'},
+        {'url': 'https://stackoverflow.com/q/2', 'source': 'StackOverflow', 'language': 'Go'},
+    ])
+    store_gathered_snippets(1, [{'url': 'https://stackoverflow.com/q/1', 'source': 'StackOverflow', 'language': 'Python'}])
+    save_submission(1, 'Demo', '# Docs', code='print(1)')
+    save_submission(1, 'Demo', '# Docs', code='print(2)')
+    save_snippet_documentation(CodeSnippet.query.filter_by(url='https://stackoverflow.com/q/2').one(), '# Go docs')
+
+    assert get_user_stats(1) == {
+        'total': 2, 'documented': 2,
+        'languages': {'Unknown': {'total': 2, 'documented': 2}},
+        'sources': {'Unknown': {'total': 2, 'documented': 2}}
+    }
+    gathered = get_user_stats(1, is_user_submitted=False)
+    assert (gathered['total'], gathered['documented']) == (2, 1)
+    assert gathered['languages'] == {'Go': {'total': 1, 'documented': 1}, 'Python': {'total': 1, 'documented': 0}}
+
+    rebuild_user_stats(db.session)
+    db.session.commit()
+    assert get_user_stats(1, is_user_submitted=False) == gathered
+
+
+def test_documented_count_moves_once_when_two_workers_race(app):
+    from sqlalchemy.orm import Session
+    from app import db
+    from app.models import CodeSnippet
+    from app.services.stats_service import get_user_stats, mark_snippets_documented, record_snippets_added
+
+    snippet = CodeSnippet(user_id=1, name_or_title='demo', is_user_submitted=True, has_documentation=False)
+    db.session.add(snippet)
+    db.session.flush()
+    record_snippets_added(db.session, 1, [snippet])
+    db.session.commit()
+
+    # Both workers loaded the snippet while it was still undocumented
+    with Session(db.engine) as first, Session(db.engine) as second:
+        first_copy, second_copy = first.get(CodeSnippet, snippet.id), second.get(CodeSnippet, snippet.id)
+        assert not first_copy.has_documentation and not second_copy.has_documentation
+        assert mark_snippets_documented(first, [first_copy]) == [first_copy]
+        first.commit()
+        assert mark_snippets_documented(second, [second_copy]) == []
+        second.commit()
+
+    assert get_user_stats(1)['documented'] == 1
+
+
+def test_error_documentation_is_not_saved(app, monkeypatch):
+    import pytest
+    from app import db
+    from app.models import CodeSnippet, Documentation
+    from app.services import documentation_service
+    from app.tasks import generate_snippet_documentation_task, submit_code_task
+
+    monkeypatch.setattr(documentation_service, 'generate_documentation', lambda data: 'Error: Gemini is unavailable')
+    snippet = CodeSnippet(user_id=1, code='print(1)', name_or_title='demo', has_documentation=False)
+    db.session.add(snippet)
+    db.session.commit()
+
+    with pytest.raises(documentation_service.DocumentationUnavailable):
+        documentation_service.document_snippet(snippet)
+    with pytest.raises(documentation_service.DocumentationUnavailable):
+        generate_snippet_documentation_task.run(1, snippet.id)
+    with pytest.raises(documentation_service.DocumentationUnavailable):
+        submit_code_task.run(1, 'Demo', code='print(2)')
+
+    assert db.session.get(CodeSnippet, snippet.id).has_documentation is False
+    assert Documentation.query.count() == 0
+    assert CodeSnippet.query.count() == 1
+
+
+def test_large_code_is_documented_in_cached_chunks(app, monkeypatch):
+    from types import SimpleNamespace
+    from app.services import ai_service
+    from app.services.chunking_service import chunk_code
+
+    code = 'import os\n\n' + ''.join(
+        f'def function_{i}(value):\n    """Step {i}."""\n    return value * {i} + len(os.sep)\n\n\n' for i in range(12)
+    )
+    chunks = chunk_code(code, 'Python', token_budget=60)
+    assert len(chunks) > 2
+    assert ''.join(chunk['text'] for chunk in chunks) == code
+    assert all(chunk['text'].startswith(('import', 'def')) for chunk in chunks)
+
+    cache_service.clear_memory_cache()
+    app.config['DOC_CHUNK_TOKEN_BUDGET'] = 60
+    prompts = []
+
+    def fake_generate_content(prompt, **kwargs):
+        prompts.append(prompt)
+        return SimpleNamespace(text=f'Documentation {len(prompts)}')
+
+    monkeypatch.setattr(ai_service, 'generate_content', fake_generate_content)
+    data = {'name_or_title': 'Steps', 'language': 'Python', 'code': code}
+    assert not ai_service.generate_documentation(data).startswith('Error')
+    assert len(prompts) == len(chunks) + 1
+    assert '=== PART 1 ===' in prompts[-1]
+
+    prompts.clear()
+    edited = code.replace('return value * 7 +', 'return value * 70 +')
+    ai_service.generate_documentation(dict(data, code=edited))
+    edited_chunks = {chunk['hash'] for chunk in chunk_code(edited, 'Python', token_budget=60)}
+    new_chunks = edited_chunks - {chunk['hash'] for chunk in chunks}
+    assert 1 <= len(new_chunks) <= 2
+    assert len(prompts) == len(new_chunks) + 1
+    assert any('value * 70' in prompt for prompt in prompts[:-1])
+
+
+def test_incremental_gather_fetches_deltas_for_subscribers(app, monkeypatch):
+    from urllib.parse import parse_qs, urlsplit
+    from app import db
+    from app.models import CodeSnippet, GatherSubscription, GatherWatermark
+    from app.services import github_service, stackoverflow_service
+    import httpx
+    from app.services.gather_service import run_incremental_gather
+    from app.services.github_service import gather_data_from_github
+
+    calls = []
+
+    class FakeResponse:
+        def __init__(self, items):
+            self.items = items
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {'items': self.items}
+
+    def fake_get(service, url, params=None):
+        if service == 'stackoverflow':
+            return fake_stackoverflow_get(url, params)
+        calls.append(('GitHub', url, params))
+        query = parse_qs(urlsplit(url).query)['q'][0]
+        pushed = [
+            (1, '2024-10-01T00:00:00Z'), (2, '2024-10-02T00:00:00Z'), (3, '2024-10-03T00:00:00Z')
+        ]
+        since, until = query.split('pushed:')[1].split('..')
+        return FakeResponse([
+            {'name': f'repo{i}', 'html_url': f'https://github.com/o/repo{i}', 'pushed_at': stamp}
+            for i, stamp in pushed if since <= stamp <= until
+        ])
+
+    def fake_stackoverflow_get(url, params=None):
+        calls.append(('StackOverflow', url, params))
+        return FakeResponse([
+            {'title': f'q{i}', 'link': f'https://stackoverflow.com/q/{i}', 'tags': ['python'], 'last_activity_date': stamp}
+            for i, stamp in [(1, 1727830000), (2, 1727900000)] if params['min'] <= stamp <= params['max']
+        ])
+
+    monkeypatch.setattr(github_service, 'http_get', fake_get)
+    monkeypatch.setattr(stackoverflow_service, 'http_get', fake_get)
+
+    assert run_incremental_gather()['fetched'] == {}
+    assert calls == []
+
+    db.session.add_all([GatherSubscription(user_id=1), GatherSubscription(user_id=2)])
+    db.session.add(GatherWatermark(source='GitHub', watermark=1727827200))  # 2024-10-02
+    db.session.commit()
+
+    result = run_incremental_gather(now=1727913600)
+    assert result['fetched'] == {'GitHub': 2, 'StackOverflow': 2}
+    assert result['stored'] == {1: 4, 2: 4}
+    github_url, github_params = calls[0][1], calls[0][2]
+    assert 'pushed:2024-10-02T00:00:00Z..2024-10-03T00:00:00Z' in parse_qs(urlsplit(github_url).query)['q'][0]
+    assert github_params['per_page'] == 100
+    assert calls[1][2]['min'] == 1727913600 - 24 * 60 * 60
+    assert calls[1][2]['max'] == 1727913600
+    assert calls[1][2]['sort'] == 'activity'
+    assert {row.source: row.watermark for row in GatherWatermark.query} == {
+        'GitHub': 1727913600, 'StackOverflow': 1727913600
+    }
+
+    calls.clear()
+    result = run_incremental_gather(now=1728000000)
+    assert result['fetched'] == {'GitHub': 1, 'StackOverflow': 0}
+    assert result['stored'] == {1: 0, 2: 0}
+    assert CodeSnippet.query.filter_by(user_id=2).count() == 4
+
+    # An upstream outage must not read as an empty window and move the watermarks past it
+    def unavailable(service, url, params=None):
+        request = httpx.Request('GET', url)
+        raise httpx.HTTPStatusError('503 Service Unavailable', request=request,
+                                    response=httpx.Response(503, request=request))
+
+    monkeypatch.setattr(github_service, 'http_get', unavailable)
+    monkeypatch.setattr(stackoverflow_service, 'http_get', unavailable)
+    result = run_incremental_gather(now=1728100000)
+    assert result['fetched'] == {'GitHub': 0, 'StackOverflow': 0}
+    assert {row.source: row.watermark for row in GatherWatermark.query} == {
+        'GitHub': 1728000000, 'StackOverflow': 1728000000
+    }
+    assert gather_data_from_github('https://api.github.com/search/repositories') == []
+
+
+def test_incremental_gather_keeps_watermark_behind_a_cut_off_window(app):
+    from app.services import gather_service
+
+    app.config.update(GATHER_INCREMENTAL_PAGE_SIZE=2, GATHER_INCREMENTAL_MAX_PAGES=2, GATHER_INCREMENTAL_MAX_WINDOWS=2)
+    stamps = [100, 101, 102, 130, 150, 160, 170, 180]
+    urls = {f'https://example.com/{stamp}' for stamp in stamps}
+    requested = []
+
+    def fetch_page(api_url, page, since=None, until=None, per_page=None, raise_errors=False):
+        requested.append((since, until, page))
+        window = [stamp for stamp in stamps if since <= stamp <= until]
+        return [{'url': f'https://example.com/{stamp}'} for stamp in window[(page - 1) * per_page:page * per_page]]
+
+    source = gather_service.GatherSource('Fake', fetch_page, 'FAKE_URL', 1, True)
+    app.config['FAKE_URL'] = 'https://example.com/api'
+
+    # [100, 200] and [100, 150] both need more than two pages of two, and the run stops there
+    items, watermark = gather_service.gather_since(source, 100, 200)
+    assert requested == [(100, 200, 1), (100, 200, 2), (100, 150, 1), (100, 150, 2)]
+    assert watermark == 100
+    assert len(items) == 8 and {item['url'] for item in items} < urls
+
+    # With a third window [100, 125] fits, and later runs walk on to the end without skipping anything
+    app.config['GATHER_INCREMENTAL_MAX_WINDOWS'] = 3
+    items, watermark = gather_service.gather_since(source, 100, 200)
+    assert watermark == 125
+    seen = {item['url'] for item in items}
+    items, watermark = gather_service.gather_since(source, watermark, 200)
+    seen.update(item['url'] for item in items)
+    assert watermark == 200
+    assert seen == urls
+
+
+def test_password_hashing_pool_admission_and_rehash_on_login(app):
+    import threading
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import User
+    from app.services import password_service
+    from app.services.auth_service import authenticate_user
+
+    password_service.reset_hashing_pool()
+    app.config.update(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=0)
+    try:
+        user = User(name='Ada', email='ada@example.com', password_hash=generate_password_hash('secret', 'pbkdf2:sha256:2000'))
+        db.session.add(user)
+        db.session.commit()
+
+        assert authenticate_user('ada@example.com', 'wrong') is None
+        assert authenticate_user('ada@example.com', 'secret').id == user.id
+        assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+        assert password_service.get_hashing_stats()['rehashed'] == 1
+        assert authenticate_user('ada@example.com', 'secret').id == user.id
+        assert password_service.get_hashing_stats()['rehashed'] == 1
+
+        release = threading.Event()
+
+        def hold_slot():
+            with app.app_context():
+                password_service._run(release.wait)
+
+        blocker = threading.Thread(target=hold_slot)
+        blocker.start()
+        try:
+            for _ in range(100):
+                if password_service._slots._value == 0:
+                    break
+                threading.Event().wait(0.01)
+            with pytest.raises(password_service.PasswordHashingBusy):
+                user.check_password('secret')
+            assert password_service.get_hashing_stats()['rejected'] == 1
+        finally:
+            release.set()
+            blocker.join()
+        assert user.check_password('secret')
+    finally:
+        password_service.reset_hashing_pool()
+
+
+def test_queued_email_reuses_one_smtp_session(app):
+    import socket
+    from benchmarks.stubs import SMTPStubServer
+    from app.services import email_service
+    from app.services.email_service import EmailDeliveryError, build_message, send_emails
+    from app.tasks import send_emails_task
+
+    smtp = SMTPStubServer().start()
+    state = app.extensions['mail']
+    state.server, state.port, state.suppress = '127.0.0.1', smtp.port, False
+    try:
+        messages = [build_message(f'Hello {i}', [f'user{i}@example.com'], 'Body') for i in range(3)]
+        assert send_emails_task.apply(args=[messages]).get() == {'sent': 3}
+        assert send_emails_task.apply(args=[messages[:1]]).get() == {'sent': 1}
+        assert smtp.connections == 1
+        assert [message['recipients'] for message in smtp.messages] == [
+            ['user0@example.com'], ['user1@example.com'], ['user2@example.com'], ['user0@example.com']
+        ]
+
+        # A session the server dropped is replaced transparently
+        email_service._connection.host.sock.shutdown(socket.SHUT_RDWR)
+        assert send_emails(messages[:2]) == 2
+        assert smtp.connections == 2
+
+        email_service.close_connection()
+        smtp.stop()
+        with pytest.raises(EmailDeliveryError) as error:
+            send_emails(messages)
+        assert error.value.unsent == messages
+    finally:
+        email_service.close_connection()
+        smtp.server_close()
+
+
+def test_http_client_reuses_connections_retries_and_limits_size(app):
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from app.utils import http_client
+
+    hits = {'/flaky': 0}
+
+    class Upstream(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == '/flaky':
+                hits['/flaky'] += 1
+                if hits['/flaky'] < 3:
+                    return self._send(b'busy', 503, {'Retry-After': '0'})
+            self._send(b'x' * 5000 if self.path == '/large' else b'ok')
+
+        def _send(self, body, status=200, headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    host = f'127.0.0.1:{server.server_port}'
+    http_client.close_http_client()
+    app.config.update(HTTP_RETRY_BACKOFF=0.01, HTTP_MAX_RESPONSE_BYTES=1000)
+    try:
+        for _ in range(3):
+            assert http_client.http_get('test', f'{base}/ok').text == 'ok'
+        assert http_client.http_get('test', f'{base}/flaky').text == 'ok'
+        assert hits['/flaky'] == 3
+        assert http_client.get_http_stats()['hosts'][host]['connections'] == 1
+
+        with pytest.raises(http_client.ResponseTooLarge):
+            http_client.http_get('test', f'{base}/large')
+        stats = http_client.get_http_stats()['hosts'][host]
+        assert stats['requests'] == 7
+        assert stats['retries'] == 2
+        assert stats['errors'] == 3
+    finally:
+        http_client.close_http_client()
+        server.shutdown()
+
+
+def test_sqlite_profile_enables_wal_and_serializes_writers(tmp_path):
+    import threading
+    from sqlalchemy import text
+    from sqlalchemy.pool import QueuePool
+    from app import create_app, db
+    from app.models import CodeSnippet
+    from tests.conftest import TestConfig
+
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'profile.db'}"
+        SQLITE_BUSY_TIMEOUT = 100
+        DB_SERIALIZE_WRITES = True
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        assert isinstance(db.engine.pool, QueuePool)
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == 100
+        assert db.session.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+
+        db.session.add(CodeSnippet(user_id=1, name_or_title='first'))
+        db.session.flush()
+        order = []
+
+        def second_writer():
+            with app.app_context():
+                db.session.add(CodeSnippet(user_id=2, name_or_title='second'))
+                db.session.commit()
+                order.append('second')
+
+        writer = threading.Thread(target=second_writer)
+        writer.start()
+        # Queued behind the open transaction rather than failing after the 100ms busy timeout
+        writer.join(0.3)
+        # Readers are not held up by the open write transaction
+        with db.engine.connect() as connection:
+            assert connection.execute(text('SELECT COUNT(*) FROM code_snippet')).scalar() == 0
+        order.append('first')
+        db.session.commit()
+        writer.join()
+        assert order == ['first', 'second']
+        assert CodeSnippet.query.count() == 2
+        db.session.remove()
+        db.drop_all()
+
+
+def test_export_streams_ndjson_and_import_round_trips(app):
+    import io
+    import json
+    from app import db
+    from app.models.code_snippet import CodeSnippet
+    from app.models.documentation import Documentation, Project
+    from app.services.documentation_service import save_submission
+    from app.services.snippet_service import store_gathered_snippets
+    from app.services.stats_service import get_user_stats
+    from app.services.transfer_service import InvalidImport, export_user_data, import_user_data, iter_ndjson
+
+    store_gathered_snippets(1, [
+        {'url': f'https://stackoverflow.com/q/{i}', 'source': 'StackOverflow', 'language': 'Python', 'code': f'x = {i}'}
+        for i in range(3)
+    ])
+    save_submission(1, 'Demo', '# Docs', code='print(1)')
+    save_submission(1, 'Demo', '# More docs', code='print(2)')
+
+    lines = list(export_user_data(1, batch_size=2))
+    records = [json.loads(line) for line in lines]
+    assert all(line.endswith(b'\n') for line in lines) and len(records) == 5
+    assert records[0]['code'] == 'x = 0' and records[0]['documentation'] == []
+    assert records[3]['project'] == 'Demo' and records[3]['documentation'][0]['content'] == '# Docs'
+
+    summary = import_user_data(2, iter_ndjson(io.BytesIO(b''.join(lines))), chunk_size=2)
+    assert summary == {'snippets': 5, 'documentation': 2, 'skipped': 0}
+    project = Project.query.filter_by(user_id=2).one()
+    docs = Documentation.query.filter_by(user_id=2).order_by(Documentation.id).all()
+    assert [doc.content for doc in docs] == ['# Docs', '# More docs']
+    assert [db.session.get(CodeSnippet, doc.snippet_id).code for doc in docs] == ['print(1)', 'print(2)']
+    assert all(doc.project_id == project.id for doc in docs)
+    assert get_user_stats(2) == get_user_stats(1)
+    assert get_user_stats(2, is_user_submitted=False)['total'] == 3
+
+    again = import_user_data(2, iter_ndjson(io.BytesIO(lines[0] + lines[1])), chunk_size=1)
+    assert again == {'snippets': 0, 'documentation': 0, 'skipped': 2}
+    with pytest.raises(InvalidImport) as error:
+        import_user_data(2, iter_ndjson(io.BytesIO(lines[3] + b'\n' + b'not json\n')), chunk_size=1)
+    assert error.value.line_number == 3 and error.value.imported == {'snippets': 1, 'documentation': 1, 'skipped': 0}
+    for bad in ({'url': []}, {'code': {'x': 1}}, {'project': []}, {'stars': '5'}, {'stars': True}):
+        with pytest.raises(InvalidImport) as error:
+            import_user_data(2, [(1, {'type': 'snippet', 'name_or_title': 'Bad', **bad})])
+        assert error.value.line_number == 1
+
+
+def test_archive_upload_extracts_source_files_and_tracks_progress(app, monkeypatch):
+    import io
+    import re
+    import tarfile
+    import zipfile
+    from app import db
+    from app.models import ArchiveUpload, CodeSnippet, Project
+    from app.services import ai_service, archive_service
+    from app.services.stats_service import get_user_stats
+    from app.tasks import document_archive_batch_task
+
+    cache_service.clear_memory_cache()
+    app.config.update(DOC_BATCH_SIZE=2, ARCHIVE_MAX_FILE_BYTES=1000, ARCHIVE_MAX_FILES=3)
+
+    def fake_generate(prompt, post_process=True):
+        ids = [int(id) for id in re.findall(r'=== SNIPPET (\d+) ===\nName', prompt)]
+        return '\n'.join(f'=== SNIPPET {id} ===\nDocs for {id}' for id in ids)
+
+    monkeypatch.setattr(ai_service, 'generate_documentation_from_prompt', fake_generate)
+    monkeypatch.setattr(document_archive_batch_task, 'delay', lambda *args: document_archive_batch_task.run(*args))
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('demo/big.py', 'x = 1\n' * 500)
+        archive.writestr('demo/blob.py', b'\x00\xff\x00')
+        archive.writestr('demo/app.py', 'def main():\n    return 1\n')
+        archive.writestr('demo/util.go', 'package util\n')
+        archive.writestr('demo/lib/helpers.js', 'export const x = 1\n')
+        archive.writestr('demo/README.md', '# Demo')
+        archive.writestr('demo/node_modules/dep/index.js', 'module.exports = 1')
+        archive.writestr('demo/extra.py', 'y = 2\n')
+    buffer.seek(0)
+
+    snippet_ids = archive_service.store_archive('1-zip', 1, 'Demo', buffer, 'demo.zip')
+    assert len(snippet_ids) == 3
+    progress = archive_service.get_archive_progress(db.session.get(ArchiveUpload, '1-zip'))
+    assert progress['status'] == 'processing'
+    assert progress['counts'] == {'pending': 3, 'documented': 0, 'failed': 0, 'skipped': 3, 'ignored': 2}
+    assert {file['path']: file['detail'] for file in progress['files'] if file['status'] == 'skipped'} == {
+        'demo/big.py': 'larger than 1000 bytes', 'demo/blob.py': 'not UTF-8 text',
+        'demo/extra.py': 'over the 3 file limit'
+    }
+    assert db.session.get(CodeSnippet, snippet_ids[0]).language == 'Python'
+    assert get_user_stats(1)['total'] == 3
+
+    assert archive_service.queue_archive_documentation('1-zip', snippet_ids) == 2
+    progress = archive_service.get_archive_progress(db.session.get(ArchiveUpload, '1-zip'))
+    assert progress['status'] == 'done' and progress['counts']['documented'] == 3
+    assert CodeSnippet.query.filter_by(has_documentation=True).count() == 3
+
+    # Tarballs are read front to back, so a non-seekable stream works too
+    tar_buffer = io.BytesIO()
+    with tarfile.open(fileobj=tar_buffer, mode='w:gz') as archive:
+        data = b'fn main() {}\n'
+        info = tarfile.TarInfo('src/main.rs')
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+
+    class Unseekable(io.RawIOBase):
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, target):
+            chunk = self.data.read(len(target))
+            target[:len(chunk)] = chunk
+            return len(chunk)
+
+    assert len(archive_service.store_archive('1-tar', 1, 'Demo', Unseekable(tar_buffer.getvalue()))) == 1
+    assert Project.query.filter_by(user_id=1).count() == 1
+    with pytest.raises(archive_service.InvalidArchive):
+        archive_service.store_archive('1-bad', 1, 'Other', io.BytesIO(b'not an archive'))
+    assert db.session.get(ArchiveUpload, '1-bad') is None
+    assert Project.query.filter_by(name='Other').count() == 0
+
+
+def test_similarity_index_finds_related_snippets_and_updates_incrementally(app, tmp_path):
+    from app import db
+    from app.models import CodeSnippet
+    from app.services.documentation_service import save_snippet_documentation
+    from app.services import similarity_service
+    from app.services.similarity_service import get_similarity_index, refresh_similarity_index, similar_snippets
+
+    app.config.update(SIMILARITY_INDEX_DIR=str(tmp_path), SIMILARITY_DIMENSIONS=128)
+    codes = {
+        'fetch': 'def fetch_json(url):\n    response = requests.get(url, timeout=10)\n    return response.json()\n',
+        'download': 'def download_json(endpoint):\n    resp = requests.get(endpoint, timeout=5)\n    return resp.json()\n',
+        'sort': 'def bubble_sort(items):\n    for i in range(len(items)):\n        for j in range(len(items) - i - 1):\n'
+                '            if items[j] > items[j + 1]:\n                items[j], items[j + 1] = items[j + 1], items[j]\n',
+        'css': '.button { color: red; margin: 0 auto; }',
+    }
+    snippets = {name: CodeSnippet(user_id=1, name_or_title=name, code=code, language='Python') for name, code in codes.items()}
+    db.session.add_all(list(snippets.values()) + [CodeSnippet(user_id=2, name_or_title='other', code=codes['fetch'])])
+    db.session.commit()
+
+    items, total = similar_snippets(1, snippet_id=snippets['fetch'].id)
+    assert items[0]['id'] == snippets['download'].id and snippets['fetch'].id not in [item['id'] for item in items]
+    assert total == 3 and 'other' not in [item['name_or_title'] for item in items]
+    items, _ = similar_snippets(1, text='sort a list by swapping items', language='Python')
+    assert items[0]['id'] == snippets['sort'].id
+    with pytest.raises(LookupError):
+        similar_snippets(1, snippet_id=snippets['fetch'].id + 100)
+
+    index = get_similarity_index(1)
+    assert len(index) == 4
+    refresh_similarity_index(1)
+    assert len(index) == 4
+
+    # New snippets and new documentation are appended; the superseded row is ignored
+    db.session.add(CodeSnippet(user_id=1, name_or_title='post', code='def post_json(url, body):\n    return requests.post(url, json=body).json()\n'))
+    db.session.commit()
+    save_snippet_documentation(snippets['css'], 'Fetches JSON over HTTP with requests.get and returns the decoded body.')
+    refresh_similarity_index(1)
+    assert len(index) == 6 and int(index.state.live.sum()) == 5
+    items, _ = similar_snippets(1, snippet_id=snippets['fetch'].id)
+    assert snippets['css'].id in [item['id'] for item in items[:3]]
+
+    # Another process sees the same files; a full rebuild drops the superseded rows
+    similarity_service.clear_similarity_indexes()
+    assert len(index) == 0
+    reopened = get_similarity_index(1)
+    reopened.load()
+    assert len(reopened) == 6 and int(reopened.state.live.sum()) == 5
+    assert len(refresh_similarity_index(1, full=True)) == 5
+
+    # A deleted snippet gets a dead row and stops coming back as a candidate
+    db.session.delete(snippets['download'])
+    db.session.commit()
+    refresh_similarity_index(1)
+    assert int(reopened.state.live.sum()) == 4
+    assert snippets['download'].id not in [id for id, _ in reopened.search(reopened.vector_for(snippets['fetch'].id), 10)]
+    similarity_service.clear_similarity_indexes()
+    assert int(refresh_similarity_index(1).state.live.sum()) == 4
+
+    # Open indexes are bounded, and an evicted one lets go of its memory maps
+    app.config['SIMILARITY_OPEN_INDEXES'] = 1
+    similarity_service.clear_similarity_indexes()
+    first = refresh_similarity_index(1)
+    assert len(first)
+    refresh_similarity_index(2)
+    assert len(first) == 0 and get_similarity_index(1) is not first